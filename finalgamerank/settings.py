@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import importlib.util
 import os
 from pathlib import Path
 
@@ -44,13 +45,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "gamerank.middleware.PrecompressedStaticMiddleware",  # Collected static files when DEBUG is off
+    "gamerank.middleware.CompressionMiddleware",  # br/zstd/gzip for pages and JSON
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",  # Added for i18n
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "gamerank.middleware.ProfilerMiddleware",  # ?_profile=1 for staff users
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "gamerank.middleware.DatabaseBusyMiddleware",  # 503 instead of 500 on "database is locked"
 ]
 
 ROOT_URLCONF = "finalgamerank.urls"
@@ -74,6 +79,24 @@ TEMPLATES = [
     },
 ]
 
+# Jinja2 versions of the fragments rendered once per card or comment, in
+# gamerank/jinja2/ (see gamerank/fragments.py). Optional: without the jinja2
+# package every fragment is rendered by the Django engine.
+if importlib.util.find_spec("jinja2"):
+    TEMPLATES.append({
+        "NAME": "jinja2",
+        "BACKEND": "django.template.backends.jinja2.Jinja2",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {"environment": "gamerank.jinja2_env.environment"},
+    })
+
+JINJA2_FRAGMENTS = [
+    "gamerank/includes/game_card.html",
+    "gamerank/includes/comment_item.html",
+    "gamerank/includes/stars.html",
+]
+
 WSGI_APPLICATION = "finalgamerank.wsgi.application"
 
 
@@ -84,10 +107,74 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Transactions take the write lock when they start, so a transaction
+            # that reads and then writes waits for other writers instead of
+            # failing with "database is locked"
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The local-memory cache is per process: with several workers use a shared
+# backend instead, e.g. django.core.cache.backends.redis.RedisCache.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gamerank",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# Compression of pages and JSON responses (see gamerank/compression.py)
+COMPRESSION_ENCODINGS = ["br", "zstd", "gzip"]  # server preference; br and zstd need their packages
+COMPRESSION_LEVELS = {"br": 5, "zstd": 3, "gzip": 6}
+COMPRESSION_MIN_SIZE = 512  # bytes; smaller bodies are sent as they are
+COMPRESSION_MAX_RANDOM_BYTES = 100  # random padding of gzip and zstd bodies against BREACH, 0 disables it
+COMPRESSION_CONTENT_TYPES = {
+    "text/html", "text/plain", "text/css", "text/javascript", "application/javascript",
+    "application/json", "application/xml", "text/xml", "image/svg+xml",
+}
+
+# Full-page cache for anonymous visitors (see gamerank/pagecache.py)
+PAGE_CACHE_TIMEOUT = 300  # seconds; the footer counters can lag this much
+PAGE_CACHE_LOCK_TIMEOUT = 10  # max seconds a request waits for another one to render the page
+PAGE_CACHE_SYNC_WAIT = 0.2  # max seconds a sync view waits (holding a worker) before rendering the page itself
+PAGE_CACHE_STALE_TIMEOUT = 3600  # seconds the previous version of a page is served while another request renders it
+
+# Rate limits of the write views, per user (per IP for anonymous visitors),
+# as "<tokens>/<s|m|h> burst <bucket size>" (see gamerank/ratelimit.py).
+# Disable them when running the loadtest command with few accounts.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_CACHE = "default"
+RATE_LIMITS = {
+    "comment": "6/m burst 10",
+    "vote": "60/m burst 30",
+    "follow": "30/m burst 20",
+    "game_detail": "20/m burst 10",  # comments, ratings and follows of the classic page
+    "games_api": "30/m burst 20",
+}
+
+
+# Sessions and authentication
+# Sessions are read from the cache and only written to the database when they
+# change; "django.contrib.sessions.backends.signed_cookies" avoids the database
+# entirely. The logged-in user is cached by gamerank.auth.CachedModelBackend.
+# With several workers, use a shared cache (Redis) so invalidations reach all of them.
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+AUTHENTICATION_BACKENDS = ["gamerank.auth.CachedModelBackend"]
+AUTH_USER_CACHE_TIMEOUT = 300  # seconds, 0 disables the user cache
+
+# Cached set of the games followed by each user (see gamerank/utils.py)
+FOLLOWED_GAMES_CACHE_TIMEOUT = 24 * 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -137,6 +224,78 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic fingerprints the files, subsets the Font Awesome webfonts to the
+# icons used in the templates and writes .gz/.br variants (see gamerank/staticfiles.py)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "gamerank.staticfiles.PrecompressedManifestStaticFilesStorage",
+    },
+}
+
+FONTAWESOME_SUBSET = True
+FONTAWESOME_EXTRA_ICONS = []  # Icons not written literally in the templates
+
+
+# Thumbnail cache
+# Resized local copies of the external game thumbnails (see gamerank/thumbnails.py)
+
+THUMBNAIL_CACHE_DIR = BASE_DIR / "var" / "thumbnails"
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+THUMBNAIL_WIDTHS = (200, 400, 640)
+THUMBNAIL_ALLOWED_HOSTS = ["www.freetogame.com", "www.mmobomb.com"]
+THUMBNAIL_MAX_SOURCE_BYTES = 10 * 1024 * 1024  # Larger originals are not downloaded
+
+
+# Background tasks (see gamerank/taskqueue.py, run them with `manage.py run_tasks`)
+
+TASKS_POLL_INTERVAL = 1  # seconds between checks for new tasks
+TASKS_RETRY_DELAY = 30  # seconds before the first retry, doubled on every attempt
+TASKS_HEARTBEAT_INTERVAL = 30  # seconds between the heartbeats of the running tasks
+TASKS_STALE_TIMEOUT = 300  # running tasks without a heartbeat for this long are considered lost
+TASKS_KEEP_DAYS = 7  # finished tasks are deleted after this many days
+
+# The 24h and 7 day leaderboards are recomputed by the compact_leaderboards task,
+# which reschedules itself (see gamerank/leaderboards.py)
+LEADERBOARD_COMPACT_INTERVAL = 600  # seconds
+
+# Deleted users and games are purged in batches (see gamerank/purge.py)
+PURGE_BATCH_SIZE = 1000
+PURGE_BATCH_PAUSE = 0.05  # seconds between batches, so requests can write
+
+# Per-request profiles for staff users (see gamerank/profiler.py)
+PROFILER_ENABLED = True
+PROFILER_DIR = BASE_DIR / "var" / "profiles"
+PROFILER_MAX_BYTES = 50 * 1024 * 1024  # the oldest profiles are deleted beyond this
+PROFILER_INTERVAL = 0.001  # seconds between stack samples
+
+# Feed of updates on the followed games (see gamerank/feed.py)
+FEED_FANOUT_MAX_FOLLOWERS = 1000  # games with more followers are read from the activity log
+FEED_FANOUT_BATCH_SIZE = 500  # inboxes written per transaction
+FEED_PAGE_SIZE = 30
+
+# Rating history of the games (see gamerank/history.py)
+RATING_HISTORY_DELAY = 60  # seconds between a rating and the rollup of its event
+RATING_HISTORY_BATCH_SIZE = 2000  # events rolled up per transaction
+RATING_EVENTS_RETENTION_DAYS = 30  # raw events kept after being rolled up
+RATING_HISTORY_DAILY_DAYS = 365  # daily buckets kept; weekly ones are kept forever
+
+# Online snapshots of the database (see gamerank/backups.py, `manage.py snapshot_db`)
+BACKUP_DIR = BASE_DIR / "var" / "backups"
+BACKUP_PAGES_PER_STEP = 256  # pages copied while holding the read lock (1 MiB with 4 KiB pages)
+BACKUP_STEP_PAUSE = 0.02  # seconds between steps, so writers get the database
+BACKUP_MAX_RESTARTS = 20  # copies restarted by concurrent writes before copying in one step (never in WAL mode)
+BACKUP_CHUNK_SIZE = 256 * 1024  # unchanged chunks are shared between snapshots
+BACKUP_KEEP_HOURLY = 24  # latest snapshots kept
+BACKUP_KEEP_DAILY = 7  # plus the newest one of each of these last days
+BACKUP_INTERVAL = 3600  # seconds between the snapshots taken by the snapshot_database task
+
+# Local copies of the external game APIs, refreshed by the refresh_games_api task
+GAMES_API_DIR = BASE_DIR / "var" / "games_api"
+GAMES_API_MAX_AGE = 6 * 3600
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -145,3 +304,16 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = '/login/'
+
+
+# Templates are compiled and URL patterns resolved when a process starts, not
+# on its first requests (see gamerank/warmup.py, measure with `manage.py startup_profile`)
+STARTUP_WARMUP = True
+
+
+# Live updates (Server-Sent Events)
+# Events are fanned out in-process unless a Redis-compatible server is configured,
+# e.g. "redis://localhost:6379/0", which is needed when running several workers.
+
+LIVE_UPDATES_REDIS_URL = None
+LIVE_UPDATES_KEEPALIVE = 15  # seconds between keep-alive comments
@@ -1,12 +1,237 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import OperationalError, ProgrammingError, connection
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-from gamerank.models import Game, Comment, Rating, Follow, UserSettings, CommentVote
+from gamerank.purge import schedule_game_deletion, schedule_user_deletion
+from gamerank.models import (
+    Game, Comment, Rating, Follow, UserSettings, CommentVote, ActivityEvent, LeaderboardEntry,
+    RatingHistogram, Task, GameAlias,
+)
 
-# Register your models here.
+# Tables smaller than this are counted exactly
+ESTIMATE_THRESHOLD = 10000
 
-admin.site.register(Game)
-admin.site.register(Comment)
-admin.site.register(Rating)
-admin.site.register(Follow)
-admin.site.register(UserSettings)
-admin.site.register(CommentVote)
+
+def estimated_row_count(model):
+    """
+    Returns the planner's estimate of the number of rows of a table, or None
+    if the database has no statistics for it (run ANALYZE to create them).
+    """
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+    except (OperationalError, ProgrammingError):
+        pass
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the table statistics instead of COUNT(*) for unfiltered
+    changelists of big tables. Filtered lists are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def count_subquery(model, field, **filters):
+    """
+    Correlated COUNT subquery, so that several counters can be annotated
+    without joining (and multiplying) the related tables.
+    """
+    return Subquery(
+        model.objects
+        .filter(**{field: OuterRef('pk')}, **filters)
+        .order_by()
+        .values(field)
+        .annotate(n=Count('*'))
+        .values('n'),
+        output_field=IntegerField(),
+    )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class ScheduledDeletionMixin:
+    """
+    Hides the deleted objects and purges their related rows in the background
+    (see purge.py) instead of deleting everything in the request. The
+    confirmation page lists only the selected objects, without collecting
+    every related row.
+    """
+    schedule_deletion = None
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        self.schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.schedule_deletion(obj)
+
+
+@admin.register(Game)
+class GameAdmin(ScheduledDeletionMixin, LargeTableAdmin):
+    list_display = ('game_id', 'title', 'genre', 'platform', 'num_ratings', 'num_comments', 'num_followers')
+    list_filter = ('genre', 'platform')
+    search_fields = ('=game_id', '^title')
+    schedule_deletion = staticmethod(schedule_game_deletion)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            num_ratings=count_subquery(Rating, 'game'),
+            num_comments=count_subquery(Comment, 'game'),
+            num_followers=count_subquery(Follow, 'game'),
+        )
+
+    @admin.display(ordering='num_ratings', description='Ratings')
+    def num_ratings(self, obj):
+        return obj.num_ratings or 0
+
+    @admin.display(ordering='num_comments', description='Comments')
+    def num_comments(self, obj):
+        return obj.num_comments or 0
+
+    @admin.display(ordering='num_followers', description='Followers')
+    def num_followers(self, obj):
+        return obj.num_followers or 0
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'game', 'short_text', 'date', 'num_likes', 'num_dislikes')
+    list_select_related = ('user', 'game')
+    raw_id_fields = ('user', 'game')
+    search_fields = ('=user__username', '=game__game_id')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            likes=count_subquery(CommentVote, 'comment', type='like'),
+            dislikes=count_subquery(CommentVote, 'comment', type='dislike'),
+        )
+
+    @admin.display(description='Text')
+    def short_text(self, obj):
+        return obj.text if len(obj.text) <= 60 else obj.text[:57] + '...'
+
+    @admin.display(ordering='likes', description='Likes')
+    def num_likes(self, obj):
+        return obj.likes or 0
+
+    @admin.display(ordering='dislikes', description='Dislikes')
+    def num_dislikes(self, obj):
+        return obj.dislikes or 0
+
+
+@admin.register(Rating)
+class RatingAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'game', 'vote')
+    list_select_related = ('user', 'game')
+    list_filter = ('vote',)
+    raw_id_fields = ('user', 'game')
+    search_fields = ('=user__username', '=game__game_id')
+
+
+@admin.register(Follow)
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'game', 'date')
+    list_select_related = ('user', 'game')
+    raw_id_fields = ('user', 'game')
+    search_fields = ('=user__username', '=game__game_id')
+
+
+@admin.register(CommentVote)
+class CommentVoteAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'comment_id', 'type')
+    list_select_related = ('user',)
+    list_filter = ('type',)
+    raw_id_fields = ('user', 'comment')
+    search_fields = ('=user__username', '=comment__id')
+
+
+@admin.register(UserSettings)
+class UserSettingsAdmin(LargeTableAdmin):
+    list_display = ('user', 'alias', 'font_type', 'text_size')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username', '^alias')
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(LargeTableAdmin):
+    list_display = ('id', 'kind', 'user', 'game', 'value', 'date')
+    list_select_related = ('user', 'game')
+    list_filter = ('kind',)
+    raw_id_fields = ('user', 'game')
+    search_fields = ('=user__username', '=game__game_id')
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(LargeTableAdmin):
+    list_display = ('board', 'scope', 'key', 'count_day', 'count_week', 'count_all')
+    list_filter = ('board',)
+    search_fields = ('=key', '^scope')
+
+
+@admin.register(RatingHistogram)
+class RatingHistogramAdmin(LargeTableAdmin):
+    list_display = ('game', 'votes_0', 'votes_1', 'votes_2', 'votes_3', 'votes_4', 'votes_5')
+    list_select_related = ('game',)
+    raw_id_fields = ('game',)
+    search_fields = ('=game__game_id',)
+
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'status', 'progress', 'progress_message', 'attempts', 'run_at', 'finished')
+    list_filter = ('status', 'name')
+    search_fields = ('=id', '=dedup_key')
+    readonly_fields = ('attempts', 'progress', 'progress_message', 'result', 'last_error', 'worker',
+                       'created', 'started', 'heartbeat', 'finished')
+    actions = ['retry_now']
+
+    @admin.action(description='Run the selected tasks again now')
+    def retry_now(self, request, queryset):
+        count = queryset.exclude(status='running').update(status='pending', run_at=timezone.now(), attempts=0)
+        self.message_user(request, f'{count} tasks queued again.')
+
+
+@admin.register(GameAlias)
+class GameAliasAdmin(LargeTableAdmin):
+    list_display = ('source', 'source_id', 'title', 'canonical_id')
+    list_filter = ('source',)
+    search_fields = ('=canonical_id', '=source_id', '^title')
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class GamerankUserAdmin(ScheduledDeletionMixin, UserAdmin):
+    schedule_deletion = staticmethod(schedule_user_deletion)
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class GamerankConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gamerank"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if getattr(settings, "STARTUP_WARMUP", False):
+            from .warmup import warm_up
+
+            warm_up()
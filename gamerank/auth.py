@@ -0,0 +1,44 @@
+"""
+Authentication backend that keeps the logged-in User (with its UserSettings)
+in the cache, so authenticated requests do not query auth_user on every hit.
+
+The entry is deleted whenever the user or their settings change (see
+signals.py); code that changes them with QuerySet.update() must call
+invalidate_user(). AUTH_USER_CACHE_TIMEOUT = 0 disables the cache.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def _user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+
+    def _load_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            return UserModel._default_manager.select_related('usersettings').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+
+    def get_user(self, user_id):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+
+        user = cache.get(_user_key(user_id))
+        if user is None:
+            user = self._load_user(user_id)
+            if user is None:
+                return None
+            cache.set(_user_key(user_id), user, timeout)
+        return user if self.user_can_authenticate(user) else None
+
@@ -0,0 +1,313 @@
+"""
+Online snapshots of the SQLite database, taken while the site is running.
+
+The database is copied with SQLite's online backup API, BACKUP_PAGES_PER_STEP
+pages at a time with a pause between steps.
+
+  - In WAL mode (journal_mode=WAL, e.g. with the "init_command" option of
+    DATABASES) the copy runs inside one read transaction: it copies a
+    consistent snapshot and writers never wait for it.
+  - In the default rollback journal mode the copy only holds the read lock
+    during a step, so writers wait at most one step instead of the whole
+    copy. A write between two steps makes SQLite restart the copy; after
+    BACKUP_MAX_RESTARTS restarts the rest is copied in a single step so that
+    a busy site cannot postpone the snapshot forever.
+
+Snapshots are stored incrementally: the copy is split into chunks of
+BACKUP_CHUNK_SIZE bytes, each one gzip-compressed and stored once under its
+SHA-256 (BACKUP_DIR/chunks/). A snapshot is a manifest listing its chunks
+(BACKUP_DIR/snapshots/<id>.json), so pages unchanged since the previous
+snapshot take no space. Rotation keeps the last BACKUP_KEEP_HOURLY snapshots
+plus the newest one of each of the last BACKUP_KEEP_DAILY days, then deletes
+the chunks no manifest uses.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def database_path(alias="default"):
+    return Path(connections[alias].settings_dict["NAME"])
+
+
+def backup_dir():
+    return Path(settings.BACKUP_DIR)
+
+
+def _snapshots_dir():
+    return backup_dir() / "snapshots"
+
+
+def _chunk_path(digest):
+    return backup_dir() / "chunks" / digest[:2] / f"{digest}.gz"
+
+
+def copy_database(source_path, target_path, pages=None, pause=None, max_restarts=None):
+    """
+    Copies a live database with the online backup API and returns the timings:
+    {'seconds', 'steps', 'max_step', 'restarts', 'single_step', 'wal'}.
+    """
+    pages = pages or settings.BACKUP_PAGES_PER_STEP
+    pause = settings.BACKUP_STEP_PAUSE if pause is None else pause
+    max_restarts = settings.BACKUP_MAX_RESTARTS if max_restarts is None else max_restarts
+
+    stats = {"steps": 0, "max_step": 0.0, "restarts": 0, "single_step": False, "wal": False}
+    last = {"time": time.perf_counter(), "remaining": None}
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        step = now - last["time"] - (pause if stats["steps"] else 0)
+        stats["steps"] += 1
+        stats["max_step"] = max(stats["max_step"], step)
+        if last["remaining"] is not None and remaining > last["remaining"]:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise _TooManyRestarts()
+        last.update(time=now, remaining=remaining)
+
+    start = time.perf_counter()
+    source = sqlite3.connect(
+        f"{Path(source_path).resolve().as_uri()}?mode=ro", uri=True, timeout=30, isolation_level=None,
+    )
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            # Every step reads this snapshot, so commits of other connections do not restart the copy
+            stats["wal"] = True
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=progress, sleep=pause)
+            except _TooManyRestarts:
+                # Writers wait for the whole copy this time, like a plain copy would make them
+                stats["single_step"] = True
+                step_start = time.perf_counter()
+                source.backup(target, pages=-1)
+                stats["max_step"] = max(stats["max_step"], time.perf_counter() - step_start)
+            result = target.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+    if result != "ok":
+        raise BackupError(f"The copy of {source_path} is corrupt: {result}")
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def _store_chunks(path):
+    """
+    Stores the chunks of a file that are not stored yet. Returns (chunk
+    digests, SHA-256 of the file, bytes of the new compressed chunks).
+    """
+    chunks = []
+    file_hash = hashlib.sha256()
+    new_bytes = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(settings.BACKUP_CHUNK_SIZE)
+            if not data:
+                break
+            file_hash.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            chunks.append(digest)
+
+            chunk_path = _chunk_path(digest)
+            if chunk_path.exists():
+                continue
+            chunk_path.parent.mkdir(parents=True, exist_ok=True)
+            compressed = gzip.compress(data, compresslevel=6, mtime=0)
+            tmp_path = chunk_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(compressed)
+            os.replace(tmp_path, chunk_path)
+            new_bytes += len(compressed)
+    return chunks, file_hash.hexdigest(), new_bytes
+
+
+def snapshot(pages=None, pause=None, alias="default", protect=()):
+    """
+    Takes a snapshot of the database and rotates the old ones, except those
+    in `protect` (snapshot ids). Returns its manifest.
+    """
+    source_path = database_path(alias)
+    if not source_path.exists():
+        raise BackupError(f"{source_path} does not exist")
+
+    created = datetime.now(dt_timezone.utc)
+    tmp_dir = backup_dir() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, copy_path = tempfile.mkstemp(dir=tmp_dir, suffix=".sqlite3")
+    os.close(fd)
+    try:
+        copy_stats = copy_database(source_path, copy_path, pages=pages, pause=pause)
+
+        store_start = time.perf_counter()
+        chunks, sha256, new_bytes = _store_chunks(copy_path)
+        store_seconds = time.perf_counter() - store_start
+        size = os.path.getsize(copy_path)
+    finally:
+        os.remove(copy_path)
+
+    manifest = {
+        "id": created.strftime("%Y%m%dT%H%M%SZ"),
+        "created": created.isoformat(),
+        "database": str(source_path),
+        "size": size,
+        "sha256": sha256,
+        "chunk_size": settings.BACKUP_CHUNK_SIZE,
+        "chunks": chunks,
+        "new_bytes": new_bytes,
+        "timings": {**copy_stats, "store_seconds": store_seconds},
+    }
+    _snapshots_dir().mkdir(parents=True, exist_ok=True)
+    path = _snapshots_dir() / f"{manifest['id']}.json"
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp_path, path)
+
+    rotate(protect=protect)
+    return manifest
+
+
+def list_snapshots():
+    """
+    Returns the manifests of the stored snapshots, oldest first.
+    """
+    manifests = []
+    for path in sorted(_snapshots_dir().glob("*.json")):
+        try:
+            manifests.append(json.loads(path.read_text()))
+        except (OSError, ValueError) as e:
+            print(f"❌ Error reading snapshot {path.name}:", e)
+    return manifests
+
+
+def get_snapshot(snapshot_id="latest"):
+    manifests = list_snapshots()
+    if not manifests:
+        raise BackupError("There are no snapshots")
+    if snapshot_id == "latest":
+        return manifests[-1]
+    for manifest in manifests:
+        if manifest["id"] == snapshot_id:
+            return manifest
+    raise BackupError(f"Unknown snapshot: {snapshot_id}")
+
+
+def rotate(keep_hourly=None, keep_daily=None, protect=()):
+    """
+    Deletes the snapshots outside the retention, except those in `protect`
+    (snapshot ids), and the chunks no snapshot uses. Returns (deleted
+    snapshots, deleted chunks).
+    """
+    keep_hourly = settings.BACKUP_KEEP_HOURLY if keep_hourly is None else keep_hourly
+    keep_daily = settings.BACKUP_KEEP_DAILY if keep_daily is None else keep_daily
+
+    manifests = list_snapshots()
+    keep = {m["id"] for m in manifests[-keep_hourly:]} if keep_hourly else set()
+    newest_of_day = {}
+    for manifest in manifests:
+        newest_of_day[manifest["id"][:8]] = manifest["id"]
+    keep.update(sorted(newest_of_day.values())[-keep_daily:] if keep_daily else [])
+    keep.update(protect)
+
+    deleted = 0
+    used = set()
+    for manifest in manifests:
+        if manifest["id"] in keep:
+            used.update(manifest["chunks"])
+        else:
+            (_snapshots_dir() / f"{manifest['id']}.json").unlink(missing_ok=True)
+            deleted += 1
+
+    deleted_chunks = 0
+    if deleted:
+        for chunk_path in (backup_dir() / "chunks").glob("*/*.gz"):
+            if chunk_path.name[:-3] not in used:
+                chunk_path.unlink(missing_ok=True)
+                deleted_chunks += 1
+    return deleted, deleted_chunks
+
+
+def stored_bytes():
+    return sum(path.stat().st_size for path in (backup_dir() / "chunks").glob("*/*.gz"))
+
+
+def check_chunk(digest):
+    """
+    Returns the data of a chunk after checking it against its SHA-256.
+    """
+    try:
+        data = gzip.decompress(_chunk_path(digest).read_bytes())
+    except (OSError, EOFError) as e:
+        raise BackupError(f"Chunk {digest} is missing or damaged: {e}")
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise BackupError(f"Chunk {digest} is corrupt")
+    return data
+
+
+def assemble(manifest, target_path):
+    """
+    Writes the database of a snapshot to target_path and checks it against
+    the checksums of the manifest.
+    """
+    file_hash = hashlib.sha256()
+    with open(target_path, "wb") as f:
+        for digest in manifest["chunks"]:
+            data = check_chunk(digest)
+            file_hash.update(data)
+            f.write(data)
+
+    if file_hash.hexdigest() != manifest["sha256"]:
+        raise BackupError(f"Snapshot {manifest['id']} does not match its checksum")
+
+
+def restore(manifest, target_path=None, alias="default"):
+    """
+    Restores a snapshot into target_path, or into the live database (with the
+    backup API, so open connections see the restored data). Returns the seconds taken.
+    """
+    start = time.perf_counter()
+    tmp_dir = backup_dir() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, restored_path = tempfile.mkstemp(dir=tmp_dir, suffix=".sqlite3")
+    os.close(fd)
+    try:
+        assemble(manifest, restored_path)
+        if target_path is not None:
+            shutil.move(restored_path, target_path)
+            return time.perf_counter() - start
+
+        source = sqlite3.connect(restored_path)
+        try:
+            target = sqlite3.connect(database_path(alias), timeout=60)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    finally:
+        if os.path.exists(restored_path):
+            os.remove(restored_path)
+    return time.perf_counter() - start
@@ -0,0 +1,194 @@
+"""
+Compression of dynamic responses (HTML pages, JSON) with brotli, zstd or
+gzip, whichever the client accepts first in COMPRESSION_ENCODINGS. Used by
+gamerank.middleware.CompressionMiddleware.
+
+brotli and zstd need the brotli and zstandard packages; without them only
+gzip is offered. The levels (COMPRESSION_LEVELS) are the fast ones, these
+bodies are compressed on every response: brotli 11 is ~50x slower than 5
+for a few % less. A zlib or brotli compressor costs a couple of
+microseconds to create, so each response gets its own (copying a prepared
+one is slower); zstd contexts are more expensive and are reused, one per
+thread.
+
+Streaming responses are compressed chunk by chunk, flushing after each
+chunk so that the client receives it at once.
+
+Against BREACH (guessing a secret of a page from the compressed length of
+responses that reflect attacker input), gzip and zstd bodies get up to
+COMPRESSION_MAX_RANDOM_BYTES of random-length padding, as Django's
+GZipMiddleware does: a random file name in the gzip header, a skippable
+frame before the zstd one. Brotli has no room for padding, so
+CompressionMiddleware does not use it for pages that carry a CSRF token.
+"""
+import gzip
+import secrets
+import struct
+import threading
+import zlib
+
+from django.conf import settings
+from django.utils.crypto import get_random_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_local = threading.local()
+
+# Magic number of the first zstd skippable frame (RFC 8878, 3.1.2)
+ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+
+
+def available_encodings(padded_only=False):
+    available = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return [
+        encoding for encoding in settings.COMPRESSION_ENCODINGS
+        if available.get(encoding) and (encoding in PADDERS or not padded_only)
+    ]
+
+
+def parse_accept_encoding(header):
+    """
+    Returns {coding: q} for an Accept-Encoding header ("gzip, br;q=0.9").
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header, padded_only=False):
+    """
+    Returns the first encoding of COMPRESSION_ENCODINGS that the client
+    accepts (q > 0, "*" included), or None. With padded_only, only the
+    encodings that get random padding.
+    """
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    for encoding in available_encodings(padded_only):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def _level(encoding):
+    return settings.COMPRESSION_LEVELS[encoding]
+
+
+def _zstd_compressor():
+    compressor = getattr(_local, "zstd", None)
+    if compressor is None:
+        compressor = _local.zstd = zstandard.ZstdCompressor(level=_level("zstd"))
+    return compressor
+
+
+def _padding_length():
+    return secrets.randbelow(settings.COMPRESSION_MAX_RANDOM_BYTES) + 1
+
+
+def _pad_gzip(data):
+    # zlib writes a 10 byte header without flags; FNAME adds a zero-terminated name after it
+    name = get_random_string(_padding_length()).encode() + b"\0"
+    return data[:3] + bytes([gzip.FNAME]) + data[4:10] + name + data[10:]
+
+
+def _pad_zstd(data):
+    length = _padding_length()
+    return struct.pack("<II", ZSTD_SKIPPABLE_MAGIC, length) + bytes(length) + data
+
+
+PADDERS = {"gzip": _pad_gzip, "zstd": _pad_zstd}
+
+
+def pad(data, encoding):
+    """
+    Adds the random padding to the start of a compressed body (the whole
+    body, or the first chunk of a stream), if the encoding has room for it.
+    """
+    if not settings.COMPRESSION_MAX_RANDOM_BYTES or encoding not in PADDERS:
+        return data
+    return PADDERS[encoding](data)
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=_level("br"))
+    if encoding == "zstd":
+        return pad(_zstd_compressor().compress(data), encoding)
+    return pad(zlib.compress(data, _level("gzip"), wbits=31), encoding)  # 31: with the gzip header
+
+
+class StreamCompressor:
+    """
+    Incremental compressor: compress(chunk) returns the bytes to send for
+    that chunk (flushed), finish() the end of the stream.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.started = False
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=_level("br"))
+        elif encoding == "zstd":
+            # A new context: the per-thread one may be used by another response meanwhile
+            self.compressor = zstandard.ZstdCompressor(level=_level("zstd")).compressobj()
+        else:
+            self.compressor = zlib.compressobj(_level("gzip"), zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        if not chunk:
+            return b""
+        if self.encoding == "br":
+            return self.compressor.process(chunk) + self.compressor.flush()
+        if self.encoding == "zstd":
+            return self._start(self.compressor.compress(chunk) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+        return self._start(self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self):
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self._start(self.compressor.flush())
+
+    def _start(self, data):
+        # The padding goes before the first bytes of the stream (the gzip header)
+        if self.started or not data:
+            return data
+        self.started = True
+        return pad(data, self.encoding)
+
+
+def compress_stream(chunks, encoding):
+    stream = StreamCompressor(encoding)
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    stream = StreamCompressor(encoding)
+    async for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
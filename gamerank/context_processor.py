@@ -46,7 +46,8 @@ def user_settings(request):
     """
     if request.user.is_authenticated:
         try:
-            config = UserSettings.objects.get(user=request.user)
+            # Loaded with the user (see auth.CachedModelBackend), no extra query
+            config = request.user.usersettings
         except UserSettings.DoesNotExist:
             config = None
         return {'user_config': config}
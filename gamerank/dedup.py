@@ -0,0 +1,285 @@
+"""
+Entity resolution of the games of every source (the Game table, FreeToGame
+and MMOBomb): finds the entries that are the same game even if their titles
+differ in case, spacing, punctuation or accents.
+
+Comparing every pair would be O(n²), so entries are first grouped by
+MinHash LSH on the character trigrams of their normalized title (blocking):
+only entries that share a bucket are compared, on title, developer and
+release date. Matches share a canonical id, stored in GameAlias, which the
+importer and the games API read:
+
+  - the canonical id of a game present in the Game table is its game_id,
+  - otherwise it is "<source>:<id>" of the first entry seen.
+"""
+import random
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+
+from .models import Game, GameAlias
+
+SHINGLE_SIZE = 3
+NUM_HASHES = 32
+BANDS = 8  # of NUM_HASHES // BANDS rows: pairs above ~0.6 trigram similarity become candidates
+MATCH_THRESHOLD = 0.8
+MIN_TITLE_SIMILARITY = 0.5
+
+# The sources often disagree on the developer (some list the publisher), less on the date
+WEIGHTS = {'title': 0.6, 'developer': 0.15, 'release_date': 0.25}
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240501)  # Fixed seed: signatures must be stable between runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+NOISE_WORDS = {'the'}
+NUMBER_WORDS = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9', 'x': '10'}
+
+
+def normalize_title(title):
+    """
+    'The Lord of the Rings™: Online ' -> 'lord of rings online'
+    """
+    text = re.sub(r'[™®©]', '', title or '')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace('&', ' and ')
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    words = [NUMBER_WORDS.get(word, word) for word in text.split() if word not in NOISE_WORDS]
+    return ' '.join(words)
+
+
+def _numbers(normalized):
+    # "Path of Exile" and "Path of Exile 2" are different games
+    return [word for word in normalized.split() if word.isdigit()]
+
+
+def shingles(normalized):
+    padded = f" {normalized} "
+    if len(padded) <= SHINGLE_SIZE:
+        return {padded}
+    return {padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set):
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature):
+    rows = NUM_HASHES // BANDS
+    return [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(BANDS)]
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _parse_date(value):
+    if isinstance(value, date) or value is None:
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class Entry:
+    __slots__ = (
+        'source', 'source_id', 'title', 'developer', 'release_date',
+        'normalized', 'shingles', 'bands', 'canonical_id',
+    )
+
+    def __init__(self, source, source_id, title, developer='', release_date=None, canonical_id=None):
+        self.source = source
+        self.source_id = str(source_id)
+        self.title = (title or '').strip()
+        self.developer = (developer or '').strip()
+        self.release_date = _parse_date(release_date)
+        self.normalized = normalize_title(self.title)
+        self.shingles = shingles(self.normalized)
+        self.bands = band_keys(minhash(self.shingles))
+        self.canonical_id = canonical_id
+
+    @property
+    def key(self):
+        return (self.source, self.source_id)
+
+
+def similarity(a, b):
+    """
+    Weighted similarity (0-1) of two entries. Developer and release date only
+    count when both entries have them.
+    """
+    if _numbers(a.normalized) != _numbers(b.normalized):
+        return 0.0
+    title = 1.0 if a.normalized == b.normalized else _jaccard(a.shingles, b.shingles)
+    if title < MIN_TITLE_SIMILARITY:
+        return 0.0
+
+    scores = {'title': title}
+    if a.developer and b.developer:
+        scores['developer'] = _jaccard(
+            set(normalize_title(a.developer).split()), set(normalize_title(b.developer).split()),
+        )
+    if a.release_date and b.release_date:
+        if a.release_date == b.release_date:
+            scores['release_date'] = 1.0
+        else:
+            scores['release_date'] = 0.5 if a.release_date.year == b.release_date.year else 0.0
+
+    total_weight = sum(WEIGHTS[field] for field in scores)
+    return sum(WEIGHTS[field] * score for field, score in scores.items()) / total_weight
+
+
+class DedupIndex:
+    """
+    Blocking index of the entries seen so far. add() returns the canonical
+    id of a new entry: the one of its best match, or a new one.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.buckets = defaultdict(list)
+        self.clusters = defaultdict(list)
+        self.changed = {}
+
+    @classmethod
+    def from_db(cls):
+        index = cls()
+        for alias in GameAlias.objects.all().iterator():
+            index._insert(Entry(
+                alias.source, alias.source_id, alias.title, alias.developer, alias.release_date,
+                canonical_id=alias.canonical_id,
+            ))
+        return index
+
+    def _insert(self, entry):
+        self.entries[entry.key] = entry
+        self.clusters[entry.canonical_id].append(entry)
+        for key in entry.bands:
+            self.buckets[key].append(entry)
+
+    def candidates(self, entry):
+        found = {}
+        for key in entry.bands:
+            for other in self.buckets.get(key, ()):
+                if other.key != entry.key:
+                    found[other.key] = other
+        return found.values()
+
+    def match(self, entry):
+        """
+        Returns the best matching entry already in the index, or None.
+        """
+        best, best_rank = None, None
+        for other in self.candidates(entry):
+            score = similarity(entry, other)
+            if score < MATCH_THRESHOLD:
+                continue
+            # Highest score first, local games on ties
+            rank = (score, other.source == 'local')
+            if best is None or rank > best_rank:
+                best, best_rank = other, rank
+        return best
+
+    def add(self, entry):
+        known = self.entries.get(entry.key)
+        if known is not None:
+            return known.canonical_id
+
+        best = self.match(entry)
+        if best is None:
+            entry.canonical_id = entry.source_id if entry.source == 'local' else f"{entry.source}:{entry.source_id}"
+        else:
+            entry.canonical_id = best.canonical_id
+            cluster = self.clusters[best.canonical_id]
+            if entry.source == 'local' and not any(e.source == 'local' for e in cluster):
+                # First local game of a group only seen in the APIs: its game_id becomes the canonical id
+                self._rename(best.canonical_id, entry.source_id)
+                entry.canonical_id = entry.source_id
+
+        self._insert(entry)
+        self.changed[entry.key] = entry
+        return entry.canonical_id
+
+    def _rename(self, old_id, new_id):
+        for e in self.clusters.pop(old_id):
+            e.canonical_id = new_id
+            self.clusters[new_id].append(e)
+            self.changed[e.key] = e
+
+    def save(self):
+        """
+        Stores the entries added or changed since the index was loaded.
+        """
+        GameAlias.objects.bulk_create(
+            [
+                GameAlias(
+                    source=e.source, source_id=e.source_id, canonical_id=e.canonical_id,
+                    title=e.title[:200], developer=e.developer[:200], release_date=e.release_date,
+                )
+                for e in self.changed.values()
+            ],
+            update_conflicts=True,
+            unique_fields=['source', 'source_id'],
+            update_fields=['canonical_id', 'title', 'developer', 'release_date'],
+            batch_size=500,
+        )
+        saved = len(self.changed)
+        self.changed = {}
+        return saved
+
+
+def local_entries():
+    games = Game.objects.values_list('game_id', 'title', 'developer', 'release_date')
+    return [Entry('local', *row) for row in games.iterator()]
+
+
+def api_entries(source, games):
+    return [
+        Entry(source, g.get('id'), g.get('title'), g.get('developer'), g.get('release_date'))
+        for g in games if g.get('id') is not None and g.get('title')
+    ]
+
+
+def update_aliases(entries):
+    """
+    Resolves the entries not seen before against the stored aliases.
+    Returns the number of new or changed aliases.
+    """
+    index = DedupIndex.from_db()
+    for entry in entries:
+        index.add(entry)
+    return index.save()
+
+
+def rebuild_aliases(api_games):
+    """
+    Resolves every entry from scratch: local games first (so they become the
+    canonical ids), then each API source. api_games is {source: [games]}.
+    Returns (entries, canonical ids).
+    """
+    index = DedupIndex()
+    for entry in local_entries():
+        index.add(entry)
+    for source, games in api_games.items():
+        for entry in api_entries(source, games):
+            index.add(entry)
+
+    with transaction.atomic():
+        GameAlias.objects.all().delete()
+        index.save()
+    return len(index.entries), len({e.canonical_id for e in index.entries.values()})
+
+
+def canonical_ids(sources):
+    """
+    Returns {(source, source_id): canonical_id} for every stored entry of the sources.
+    """
+    rows = GameAlias.objects.filter(source__in=sources).values_list('source', 'source_id', 'canonical_id')
+    return {(source, source_id): canonical_id for source, source_id, canonical_id in rows}
@@ -0,0 +1,118 @@
+"""
+"Updates on games you follow": the new comments and ratings on the games a
+user follows, newest first.
+
+Fan-out on write: when a comment or rating is saved, the fan_out_activity
+task copies a reference to its ActivityEvent into the FeedItem inbox of
+every follower of the game (in batches of FEED_FANOUT_BATCH_SIZE), so
+reading a feed is a range scan of one user's inbox.
+
+Games with more than FEED_FANOUT_MAX_FOLLOWERS followers (the 'followed'
+leaderboard counter) are not fanned out, which would write thousands of
+rows per comment: the feed reads their events from the activity log
+instead (fan-out on read) and merges both, newest first. A game crossing
+the limit may repeat an event (dropped by id) or miss the ones written while
+it was on the other side.
+
+Pages use keyset pagination on the event id (?before=<id>).
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ActivityEvent, FeedItem, Follow, LeaderboardEntry
+from .utils import get_followed_games_ids
+
+FEED_KINDS = ('comment', 'rating')
+
+
+def follower_count(game_id):
+    entry = LeaderboardEntry.objects.filter(board='followed', scope='all', key=str(game_id)).first()
+    return entry.count_all if entry else 0
+
+
+def hot_games(game_ids):
+    """
+    Returns the games of `game_ids` with too many followers to fan out.
+    """
+    hot = (
+        LeaderboardEntry.objects
+        .filter(board='followed', scope='all', count_all__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('key', flat=True)
+    )
+    game_ids = set(game_ids)
+    return [int(key) for key in hot if int(key) in game_ids]
+
+
+def schedule_fan_out(event):
+    from .taskqueue import enqueue
+
+    try:
+        enqueue('fan_out_activity', kwargs={'event_id': event.pk})
+    except Exception as e:
+        print("❌ Error enqueueing the feed fan-out:", e)
+
+
+def fan_out(event_id):
+    """
+    Adds an event to the inbox of every follower of its game but its
+    author. Returns the number of inboxes, or None if the game is hot.
+    """
+    event = ActivityEvent.objects.filter(pk=event_id).values('game_id', 'user_id').first()
+    if event is None:
+        return 0
+    if follower_count(event['game_id']) > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return None
+
+    followers = (
+        Follow.objects.filter(game_id=event['game_id']).exclude(user_id=event['user_id'])
+        .order_by('user_id').values_list('user_id', flat=True)
+    )
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    added = 0
+    last_user_id = 0
+    while True:
+        # Keyset batches on the user id, each one its own short transaction
+        user_ids = list(followers.filter(user_id__gt=last_user_id)[:batch_size])
+        if not user_ids:
+            return added
+        with transaction.atomic():
+            FeedItem.objects.bulk_create(
+                [FeedItem(user_id=user_id, event_id=event_id) for user_id in user_ids],
+                ignore_conflicts=True,
+            )
+        added += len(user_ids)
+        last_user_id = user_ids[-1]
+
+
+def updates(user, before=None, limit=30):
+    """
+    Returns (events, next_before): the events of the user's feed older than
+    the event `before` (newest first), and the cursor of the next page.
+    """
+    inbox = FeedItem.objects.filter(user=user)
+    if before:
+        inbox = inbox.filter(event_id__lt=before)
+    event_ids = set(inbox.order_by('-event_id').values_list('event_id', flat=True)[:limit + 1])
+
+    hot = hot_games(get_followed_games_ids(user).ids)
+    if hot:
+        # Only the activity since the user followed each game, as the inbox would have
+        since = Q()
+        for game_id, date in Follow.objects.filter(user=user, game_id__in=hot).values_list('game_id', 'date'):
+            since |= Q(game_id=game_id, date__gte=date)
+        recent = ActivityEvent.objects.filter(since, kind__in=FEED_KINDS).exclude(user=user)
+        if before:
+            recent = recent.filter(id__lt=before)
+        event_ids.update(recent.order_by('-id').values_list('id', flat=True)[:limit + 1])
+
+    page_ids = sorted(event_ids, reverse=True)[:limit + 1]
+    next_before = page_ids[limit - 1] if len(page_ids) > limit else None
+
+    events = (
+        ActivityEvent.objects
+        .filter(id__in=page_ids[:limit], user__is_active=True, game__deleted_at__isnull=True)
+        .select_related('user', 'game')
+        .order_by('-id')
+    )
+    return list(events), next_before
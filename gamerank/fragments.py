@@ -0,0 +1,37 @@
+"""
+Fragments rendered many times per page (one per game card or comment), which
+can be rendered by Jinja2 instead of the Django template engine.
+
+A fragment is rendered by Jinja2 when its name is in JINJA2_FRAGMENTS and
+the "jinja2" engine is configured (it needs the jinja2 package); its Jinja2
+version lives under gamerank/jinja2/ with the same name. Otherwise the Django
+template of gamerank/templates/ is used, as {% include %} would.
+
+From a Django template use {% fragment "gamerank/includes/game_card.html" game=game %}.
+A Jinja2 fragment only sees the variables passed to it plus user and
+csrf_token, and includes the Jinja2 version of its own includes.
+"""
+from django.conf import settings
+from django.template import engines
+
+# Variables of the page passed to every Jinja2 fragment
+SHARED_VARIABLES = ("user", "csrf_token")
+
+
+def uses_jinja2(template_name):
+    return template_name in settings.JINJA2_FRAGMENTS and "jinja2" in engines.templates
+
+
+def get_fragment(template_name):
+    """
+    Returns the template (of the Django or the Jinja2 backend) for a fragment.
+    """
+    engine = engines["jinja2"] if uses_jinja2(template_name) else engines["django"]
+    return engine.get_template(template_name)
+
+
+def render_fragment(template_name, context):
+    """
+    Renders a fragment with a dict context, like render_to_string() without a request.
+    """
+    return get_fragment(template_name).render(context)
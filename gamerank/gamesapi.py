@@ -0,0 +1,75 @@
+"""
+Local copies of the external game APIs (FreeToGame and MMOBomb).
+
+Requests never wait for the upstream APIs: they read the copy refreshed by
+the refresh_games_api task (in GAMES_API_DIR), or the backup shipped in
+data/ until the first refresh. A stale or missing copy enqueues a refresh.
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+
+GAME_SOURCES = {
+    "freetogame": ("https://www.freetogame.com/api/games", "freetogame_games_backup.json"),
+    "mmobomb": ("https://www.mmobomb.com/api1/games", "mmobomb_games_backup.json"),
+}
+
+
+def _copy_path(source):
+    return os.path.join(settings.GAMES_API_DIR, f"{source}.json")
+
+
+def fetch_source(source):
+    """
+    Downloads the games of one source and stores them as its local copy.
+    Returns the number of games.
+    """
+    import requests  # Heavy and only needed by the refresh task
+
+    api_url, _ = GAME_SOURCES[source]
+    response = requests.get(api_url, timeout=30)
+    response.raise_for_status()
+    games = response.json()
+
+    os.makedirs(settings.GAMES_API_DIR, exist_ok=True)
+    path = _copy_path(source)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(games, f)
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+    return len(games)
+
+
+def is_stale(source):
+    try:
+        age = time.time() - os.path.getmtime(_copy_path(source))
+    except OSError:
+        return True
+    return age > settings.GAMES_API_MAX_AGE
+
+
+def load_source(source, refresh=True):
+    """
+    Returns the list of games of one source from its local copy, falling back
+    to the backup in data/. Enqueues a refresh if the copy is stale.
+    """
+    if refresh and is_stale(source):
+        from .taskqueue import enqueue
+
+        try:
+            enqueue("refresh_games_api", dedup_key="refresh_games_api")
+        except Exception as e:
+            print("❌ Error enqueueing the games API refresh:", e)
+
+    _, backup_filename = GAME_SOURCES[source]
+    for path in (_copy_path(source), os.path.join(settings.BASE_DIR, "data", backup_filename)):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"❌ Error reading {path}:", e)
+    return []
@@ -0,0 +1,175 @@
+"""
+Rating history of every game, as daily and weekly buckets.
+
+Every rating write records a RatingEvent (see signals.py), and enqueues the
+rollup_rating_history task, which runs RATING_HISTORY_DELAY seconds later
+and adds the new events to the RatingRollup buckets of their day and week.
+Only the events not rolled up yet are read (a partial index keeps them
+apart), so a run costs the same however long the history is.
+
+Compaction deletes the raw events older than RATING_EVENTS_RETENTION_DAYS
+and the daily buckets older than RATING_HISTORY_DAILY_DAYS; the weekly
+buckets are kept forever.
+
+The ratings made before the history existed have no date: they are the
+starting point of the series (the histogram minus every bucket).
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import VOTE_VALUES, RatingEvent, RatingHistogram, RatingRollup
+
+PERIODS = ('day', 'week')
+
+
+def record(game_id, vote, delta=1):
+    """
+    Records a rating change and makes sure a rollup is scheduled.
+    """
+    RatingEvent.objects.create(game_id=game_id, vote=vote, delta=delta)
+    transaction.on_commit(schedule_rollup)
+
+
+def record_many(changes):
+    """
+    Records {(game_id, vote): delta} at once, for ratings changed in bulk.
+    """
+    RatingEvent.objects.bulk_create(
+        [RatingEvent(game_id=game_id, vote=vote, delta=delta) for (game_id, vote), delta in changes.items() if delta],
+        batch_size=500,
+    )
+    transaction.on_commit(schedule_rollup)
+
+
+def schedule_rollup():
+    from .taskqueue import enqueue
+
+    # One task per interval: a task already running may have read the pending
+    # events before this one was committed
+    delay = settings.RATING_HISTORY_DELAY
+    slot = int(time.time()) // delay
+    try:
+        enqueue('rollup_rating_history', dedup_key=f'rollup_rating_history:{slot}', delay=delay)
+    except Exception as e:
+        print("❌ Error enqueueing the rating history rollup:", e)
+
+
+def bucket_start(period, day):
+    return day - timedelta(days=day.weekday()) if period == 'week' else day
+
+
+def rollup(batch_size=None):
+    """
+    Adds the pending events to their buckets, a batch at a time, each batch
+    in its own transaction. Returns the number of events rolled up.
+    """
+    batch_size = batch_size or settings.RATING_HISTORY_BATCH_SIZE
+    rolled_up = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                RatingEvent.objects.filter(rolled_up=False).order_by('id')
+                .values_list('id', 'game_id', 'vote', 'delta', 'date')[:batch_size]
+            )
+            if not events:
+                return rolled_up
+
+            tz = timezone.get_current_timezone()  # timezone.localdate() looks it up on every call
+            changes = defaultdict(lambda: [0] * len(VOTE_VALUES))
+            for _, game_id, vote, delta, date in events:
+                day = date.astimezone(tz).date()
+                for period in PERIODS:
+                    changes[(game_id, period, bucket_start(period, day))][vote] += delta
+            _add_to_buckets(changes)
+
+            RatingEvent.objects.filter(id__in=[event[0] for event in events]).update(rolled_up=True)
+            rolled_up += len(events)
+
+
+def _add_to_buckets(changes):
+    """
+    Adds {(game_id, period, start): [delta of each vote]} to the buckets,
+    creating the missing ones.
+    """
+    game_ids = {game_id for game_id, _, _ in changes}
+    starts = {start for _, _, start in changes}
+    existing = {
+        (bucket.game_id, bucket.period, bucket.start): bucket
+        for bucket in RatingRollup.objects.filter(game_id__in=game_ids, start__in=starts)
+    }
+
+    buckets = []
+    for key, deltas in changes.items():
+        game_id, period, start = key
+        bucket = existing.get(key) or RatingRollup(game_id=game_id, period=period, start=start)
+        for vote, delta in zip(VOTE_VALUES, deltas):
+            setattr(bucket, f'votes_{vote}', getattr(bucket, f'votes_{vote}') + delta)
+        bucket.count += sum(deltas)
+        bucket.sum += sum(vote * delta for vote, delta in zip(VOTE_VALUES, deltas))
+        buckets.append(bucket)
+
+    # Read and written in the same transaction, which takes the write lock when
+    # it starts (transaction_mode IMMEDIATE), so two rollups never interleave
+    RatingRollup.objects.bulk_create(
+        buckets,
+        update_conflicts=True,
+        unique_fields=['game', 'period', 'start'],
+        update_fields=['count', 'sum', *[f'votes_{vote}' for vote in VOTE_VALUES]],
+        batch_size=500,
+    )
+
+
+def compact(now=None):
+    """
+    Deletes the rolled-up events and the daily buckets past their retention.
+    Returns (events deleted, daily buckets deleted).
+    """
+    now = now or timezone.now()
+    events, _ = RatingEvent.objects.filter(
+        rolled_up=True, date__lt=now - timedelta(days=settings.RATING_EVENTS_RETENTION_DAYS),
+    ).delete()
+    buckets, _ = RatingRollup.objects.filter(
+        period='day', start__lt=timezone.localdate(now) - timedelta(days=settings.RATING_HISTORY_DAILY_DAYS),
+    ).delete()
+    return events, buckets
+
+
+def series(game, period='day', since=None):
+    """
+    Returns the buckets of a game in order, each with its changes and the
+    totals at its end: [{'start', 'count', 'sum', 'votes', 'total', 'average'}].
+    `game` must have its histogram loaded (select_related('histogram')).
+    """
+    queryset = RatingRollup.objects.filter(game=game, period=period).order_by('start').values_list(
+        'start', 'count', 'sum', *[f'votes_{vote}' for vote in VOTE_VALUES],
+    )
+    rows = list(queryset)
+
+    # The totals before the first bucket: today's histogram minus every change since
+    try:
+        counts = game.histogram.counts()
+    except RatingHistogram.DoesNotExist:
+        counts = [0] * len(VOTE_VALUES)
+    total = sum(counts) - sum(row[1] for row in rows)
+    total_sum = sum(vote * count for vote, count in zip(VOTE_VALUES, counts)) - sum(row[2] for row in rows)
+
+    points = []
+    for start, count, votes_sum, *votes in rows:
+        total += count
+        total_sum += votes_sum
+        if since and start < since:
+            continue
+        points.append({
+            'start': start.isoformat(),
+            'count': count,
+            'sum': votes_sum,
+            'votes': votes,
+            'total': total,
+            'average': round(total_sum / total, 2) if total else None,
+        })
+    return points
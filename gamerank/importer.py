@@ -0,0 +1,71 @@
+"""
+Import of the games of the course XML (listado1.xml, LIS1- prefix).
+Used by the load_games command and by the load_games background task.
+"""
+import xml.etree.ElementTree as ET
+
+import requests
+
+from .dedup import Entry
+from .models import Game
+
+GAMES_XML_URL = "https://gitlab.eif.urjc.es/cursosweb/2024-2025/final-gamerank/-/raw/main/listado1.xml"
+GAME_ID_PREFIX = "LIS1-"
+
+
+def download_games_xml(url=GAMES_XML_URL):
+    """
+    Downloads the XML and returns the list of <game> elements.
+    """
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return ET.fromstring(response.content).findall('game')
+
+
+def import_game(game_elem, index, dedup_index=None):
+    """
+    Creates the game of one <game> element if it does not exist yet.
+    With a dedup.DedupIndex, a game that matches another local game (e.g. the
+    same title with different spacing) is not created again.
+    Returns (game, created, error), error being set if the release date is
+    invalid or the game is a duplicate.
+    """
+    xml_id = game_elem.find('id').text.strip() if game_elem.find('id') is not None else str(index)
+    game_id = GAME_ID_PREFIX + xml_id
+
+    if dedup_index is not None:
+        canonical_id = dedup_index.add(Entry(
+            'local', game_id,
+            game_elem.findtext('title', ''),
+            game_elem.findtext('developer', ''),
+            game_elem.findtext('release_date', ''),
+        ))
+        if canonical_id != game_id:
+            duplicate = Game.all_objects.filter(game_id=canonical_id).first()
+            if duplicate is not None:
+                return duplicate, False, f"{game_id} is a duplicate of {canonical_id}"
+
+    # all_objects: a game being deleted must not be created again with the same id
+    game, created = Game.all_objects.get_or_create(
+        game_id=game_id,
+        defaults={
+            'title': game_elem.findtext('title', '').strip(),
+            'platform': game_elem.findtext('platform', '').strip(),
+            'genre': game_elem.findtext('genre', '').strip(),
+            'developer': game_elem.findtext('developer', '').strip(),
+            'publisher': game_elem.findtext('publisher', '').strip(),
+            'short_description': game_elem.findtext('short_description', '').strip(),
+            'thumbnail': game_elem.findtext('thumbnail', '').strip(),
+            'game_url': game_elem.findtext('game_url', '').strip(),
+        }
+    )
+
+    date_str = game_elem.findtext('release_date', '').strip()
+    if date_str:
+        try:
+            game.release_date = date_str  # Expected format: 'YYYY-MM-DD'
+            game.save()
+        except Exception as e:
+            return game, created, f"Invalid date for {game_id}: {e}"
+
+    return game, created, None
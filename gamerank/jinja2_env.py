@@ -0,0 +1,74 @@
+"""
+Jinja2 environment of the hot fragments (see gamerank/fragments.py).
+
+The filters and helpers mirror the Django template ones used by the
+fragments, and values are printed as Django prints them: numbers and dates
+localized, aware datetimes in the current time zone.
+"""
+import datetime
+import functools
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import defaultfilters
+from django.urls import get_script_prefix, reverse
+from django.utils.formats import localize
+from django.utils.html import format_html
+from django.utils.timezone import template_localtime
+from jinja2 import Environment
+
+from .templatetags.gamerank_extras import thumbnail_url
+
+LOCALIZED_TYPES = (int, float, Decimal, datetime.date, datetime.time)
+
+
+@functools.lru_cache(maxsize=4096)
+def _reverse(script_prefix, viewname, args):
+    return reverse(viewname, args=args or None)
+
+
+def url(viewname, *args):
+    """
+    {{ url('game_detail', game.game_id) }}, like {% url 'game_detail' game.game_id %}.
+    The URLs of the cards are the same on every page, so they are cached
+    (the URL patterns do not depend on the language).
+    """
+    return _reverse(get_script_prefix(), viewname, args)
+
+
+def csrf_field(csrf_token):
+    """
+    {{ csrf_field(csrf_token) }}, like {% csrf_token %}: nothing without a token.
+    """
+    if not csrf_token or csrf_token == "NOTPROVIDED":
+        return ""
+    return format_html('<input type="hidden" name="csrfmiddlewaretoken" value="{}">', csrf_token)
+
+
+def date(value, arg=None):
+    return defaultfilters.date(template_localtime(value), arg)
+
+
+def finalize(value):
+    if isinstance(value, int) and not settings.USE_THOUSAND_SEPARATOR:
+        return value  # What localize() returns for ids and counters, only slower
+    if isinstance(value, LOCALIZED_TYPES):
+        return localize(template_localtime(value))
+    return value
+
+
+def environment(**options):
+    env = Environment(finalize=finalize, **options)
+    env.globals.update({
+        "url": url,
+        "static": staticfiles_storage.url,
+        "csrf_field": csrf_field,
+    })
+    env.filters.update({
+        "localize": localize,
+        "thumbnail_url": thumbnail_url,
+        "floatformat": defaultfilters.floatformat,
+        "date": date,
+    })
+    return env
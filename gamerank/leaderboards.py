@@ -0,0 +1,222 @@
+"""
+Leaderboards (most rated, most followed, most discussed and top commenters)
+kept as incremental counters, so they never need a GROUP BY on a page hit.
+
+Every write updates one LeaderboardEntry row per scope ('all', the genre and
+the platform of the game). The rolling windows (last 24h / last 7 days) are
+recomputed from the activity log by the compact_leaderboards task every
+LEADERBOARD_COMPACT_INTERVAL seconds: each run enqueues the next one, and
+`manage.py run_tasks` starts the chain again when it starts and every hour,
+in case a run failed. `manage.py compact_leaderboards` does it at once.
+"""
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import ActivityEvent, Comment, Follow, Game, LeaderboardEntry, Rating
+
+WINDOWS = {
+    'day': 'count_day',
+    'week': 'count_week',
+    'all': 'count_all',
+}
+
+# Activity kind -> leaderboards it counts for
+KIND_BOARDS = {
+    'rating': ['rated'],
+    'follow': ['followed'],
+    'comment': ['discussed', 'commenters'],
+}
+
+
+def game_scopes(genre, platform):
+    return ['all', f'genre:{genre}', f'platform:{platform}']
+
+
+def _board_key(board, game_id, user_id):
+    return str(user_id) if board == 'commenters' else str(game_id)
+
+
+def record(kind, game_id, user_id, delta=1):
+    """
+    Updates the counters of every leaderboard affected by an action.
+    New actions (delta > 0) also count for the rolling windows; removals
+    only change the all-time counter, the windows count recent activity.
+    """
+    # all_objects: the purge of a game scheduled for deletion discounts its scopes too
+    genre, platform = Game.all_objects.filter(pk=game_id).values_list('genre', 'platform').first() or ('', '')
+    rows = [
+        (board, scope, _board_key(board, game_id, user_id))
+        for board in KIND_BOARDS[kind]
+        for scope in game_scopes(genre, platform)
+    ]
+    window_delta = max(delta, 0)
+    _upsert(rows, delta, window_delta)
+
+
+def _upsert(rows, delta, window_delta):
+    """
+    Adds delta to count_all and window_delta to the windows of the
+    (board, scope, key) rows, creating the missing ones, in one statement.
+    bulk_create(update_conflicts=True) can only overwrite the columns with
+    the inserted values, not add to them, hence the SQL (SQLite >= 3.24
+    and PostgreSQL both support it).
+    """
+    table = connection.ops.quote_name(LeaderboardEntry._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+    params = []
+    for board, scope, key in rows:
+        params += [board, scope, key, max(delta, 0), window_delta, window_delta]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ("board", "scope", "key", "count_all", "count_day", "count_week") '
+            f'VALUES {values} ON CONFLICT ("board", "scope", "key") DO UPDATE SET '
+            f'"count_all" = "count_all" + %s, "count_day" = "count_day" + %s, "count_week" = "count_week" + %s',
+            params + [delta, window_delta, window_delta],
+        )
+
+
+def discount(board, counts):
+    """
+    Subtracts {(scope, key): n} from the all-time counters of a leaderboard,
+    for rows deleted in bulk (without the per-row signals).
+    """
+    # One UPDATE per scope and amount, which is usually the same for many keys
+    groups = defaultdict(list)
+    for (scope, key), n in counts.items():
+        groups[(scope, n)].append(key)
+    for (scope, n), keys in groups.items():
+        LeaderboardEntry.objects.filter(board=board, scope=scope, key__in=keys).update(count_all=F('count_all') - n)
+
+
+def top(board, window='all', scope='all', limit=10):
+    """
+    Returns a list of (object, count) for the first `limit` entries of a
+    leaderboard, read in order from the (board, scope, count) index.
+    The objects are Games, or Users for the 'commenters' board.
+
+    The counters of the games scheduled for deletion (and deactivated users)
+    stay until they are purged, and they are skipped: the next entries are
+    read to fill the list.
+    """
+    field = WINDOWS.get(window, 'count_all')
+    entries = (
+        LeaderboardEntry.objects
+        .filter(board=board, scope=scope, **{f'{field}__gt': 0})
+        .order_by(f'-{field}', 'key')
+        .values_list('key', field)
+    )
+    # The keys are the primary keys of the users or games
+    visible = User.objects.filter(is_active=True) if board == 'commenters' else Game.objects.all()
+
+    results = []
+    offset = 0
+    while len(results) < limit:
+        page = list(entries[offset:offset + limit])
+        objects = visible.in_bulk([int(key) for key, _ in page])
+        results += [(objects[int(key)], count) for key, count in page if int(key) in objects]
+        if len(page) < limit:
+            break
+        offset += limit
+    return results[:limit]
+
+
+def compact(now=None):
+    """
+    Recomputes the 24h and 7 day counters from the activity log (a range scan
+    on the indexed date) so that old activity drops out of the windows.
+    """
+    now = now or timezone.now()
+    windows = {
+        'count_day': now - timedelta(days=1),
+        'count_week': now - timedelta(days=7),
+    }
+
+    counts = {field: Counter() for field in windows}
+    recent = (
+        ActivityEvent.objects
+        .filter(date__gte=windows['count_week'])
+        .values_list('kind', 'game_id', 'user_id', 'game__genre', 'game__platform', 'date')
+    )
+    for kind, game_id, user_id, genre, platform, date in recent.iterator():
+        for board in KIND_BOARDS[kind]:
+            key = _board_key(board, game_id, user_id)
+            for scope in game_scopes(genre, platform):
+                for field, since in windows.items():
+                    if date >= since:
+                        counts[field][(board, scope, key)] += 1
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(count_day__gt=0).update(count_day=0)
+        LeaderboardEntry.objects.filter(count_week__gt=0).update(count_week=0)
+
+        keys = set(counts['count_week'])
+        LeaderboardEntry.objects.bulk_create(
+            [
+                LeaderboardEntry(
+                    board=board, scope=scope, key=key,
+                    count_day=counts['count_day'][(board, scope, key)],
+                    count_week=counts['count_week'][(board, scope, key)],
+                )
+                for board, scope, key in keys
+            ],
+            update_conflicts=True,
+            unique_fields=['board', 'scope', 'key'],
+            update_fields=['count_day', 'count_week'],
+            batch_size=500,
+        )
+
+    return len(keys)
+
+
+def schedule_compaction():
+    """
+    Enqueues the compaction at the start of the next interval. The dedup key
+    of that interval makes it a no-op if it is already scheduled.
+    """
+    from .taskqueue import enqueue
+
+    interval = settings.LEADERBOARD_COMPACT_INTERVAL
+    slot = int(time.time()) // interval + 1
+    return enqueue(
+        'compact_leaderboards',
+        dedup_key=f'compact_leaderboards:{slot}',
+        run_at=datetime.fromtimestamp(slot * interval, tz=dt_timezone.utc),
+    )
+
+
+def rebuild():
+    """
+    Recomputes every all-time counter from the Rating, Follow and Comment
+    tables, then the rolling windows. Used to backfill existing data.
+    """
+    totals = Counter()
+    sources = [
+        ('rated', Rating.objects.values('game_id', 'game__genre', 'game__platform'), 'game_id'),
+        ('followed', Follow.objects.values('game_id', 'game__genre', 'game__platform'), 'game_id'),
+        ('discussed', Comment.objects.values('game_id', 'game__genre', 'game__platform'), 'game_id'),
+        ('commenters', Comment.objects.values('user_id', 'game__genre', 'game__platform'), 'user_id'),
+    ]
+    for board, queryset, key_field in sources:
+        for row in queryset.annotate(n=Count('id')):
+            for scope in game_scopes(row['game__genre'], row['game__platform']):
+                totals[(board, scope, str(row[key_field]))] += row['n']
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(
+            [
+                LeaderboardEntry(board=board, scope=scope, key=key, count_all=n)
+                for (board, scope, key), n in totals.items()
+            ],
+            batch_size=500,
+        )
+
+    compact()
+    return len(totals)
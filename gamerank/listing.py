@@ -0,0 +1,83 @@
+"""
+Game cards of the listing pages (home, rated games, followed games).
+
+A listing only needs a few columns of each game, so instead of Game
+instances (every column, including the description, plus the histogram
+instance and the model state) the rows are read with values_list() and
+turned into GameCard objects, which have __slots__ and nothing else. The
+score and number of votes come from the histogram annotations of
+with_rating_stats(), and the per-user fields (followed, my_vote) are set
+when the card is built.
+
+scripts/bench_listing.py compares both for a large catalog.
+"""
+from django.db.models import F
+
+from .models import Game
+
+# Columns shown by gamerank/includes/game_card.html, and the id to mark the followed games
+CARD_FIELDS = ('id', 'game_id', 'title', 'genre', 'platform', 'thumbnail')
+
+
+class GameCard:
+    __slots__ = (*CARD_FIELDS, 'score', 'num_votes', 'my_vote', 'followed')
+
+    def __init__(self, id, game_id, title, genre, platform, thumbnail, score, num_votes, my_vote=None, followed=False):
+        self.id = id
+        self.game_id = game_id
+        self.title = title
+        self.genre = genre
+        self.platform = platform
+        self.thumbnail = thumbnail
+        self.score = score
+        self.num_votes = num_votes
+        self.my_vote = my_vote
+        self.followed = followed
+
+    def __repr__(self):
+        return f"<GameCard {self.game_id}>"
+
+    # Same names as the Game methods, for the templates that fall back to them
+    def average_rating(self):
+        return self.score
+
+    def total_votes(self):
+        return self.num_votes
+
+
+def _cards(queryset, followed_ids, *extra):
+    """
+    Builds the cards of a queryset annotated by with_rating_stats(), reading
+    only the card columns (plus the `extra` annotations, passed on in order).
+    """
+    rows = queryset.values_list(*CARD_FIELDS, 'score', 'num_votes', *extra)
+    return [GameCard(*row, followed=row[0] in followed_ids) for row in rows]
+
+
+def home_cards(order_by, followed_ids=()):
+    return _cards(Game.objects.with_rating_stats().order_by(*order_by), followed_ids)
+
+
+def rated_cards(user, followed_ids=()):
+    """
+    Cards of the games rated by a user, with their vote, highest vote first.
+    """
+    queryset = (
+        Game.objects.with_rating_stats()
+        .filter(rating__user=user)
+        .annotate(my_vote=F('rating__vote'))  # From the join of the filter above
+        .order_by('-my_vote', 'game_id')
+    )
+    return _cards(queryset, followed_ids, 'my_vote')
+
+
+def followed_cards(user, followed_ids=()):
+    """
+    Cards of the games followed by a user, best rated first.
+    """
+    queryset = (
+        Game.objects.with_rating_stats()
+        .filter(follow__user=user)
+        .order_by(F('score').desc(nulls_last=True), 'game_id')
+    )
+    return _cards(queryset, followed_ids)
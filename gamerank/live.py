@@ -0,0 +1,181 @@
+"""
+Live updates for the comments of a game (Server-Sent Events).
+
+When a comment is posted or voted, a small HTML fragment is published on the
+channel of its game, and every open stream of that game receives only that
+fragment instead of re-requesting the whole comment list.
+
+By default the events are fanned out in-process, which is enough for a single
+server process. Setting LIVE_UPDATES_REDIS_URL uses Redis (or any server that
+speaks its pub/sub protocol) so that all the worker processes share the events.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.template.loader import render_to_string
+
+from .fragments import render_fragment
+
+QUEUE_SIZE = 100
+
+_broker = None
+_broker_guard = threading.Lock()
+
+
+class InProcessBroker:
+    """
+    Fan-out to the streams open in this process. Each stream has its own
+    asyncio queue; publishing is thread safe so sync views can publish too.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put_dropping_oldest, queue, message)
+            except RuntimeError:
+                pass  # The loop of that stream is already closed
+
+    async def subscribe(self, channel, timeout):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[channel].add(entry)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(entry[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker:
+    """
+    Fan-out through Redis pub/sub, shared by every process using the same server.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self._url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(f"gamerank:{channel}", json.dumps(message))
+
+    async def subscribe(self, channel, timeout):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self._url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(f"gamerank:{channel}")
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                yield json.loads(message["data"]) if message else None
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def _put_dropping_oldest(queue, message):
+    # A slow client loses its oldest events instead of blocking the publisher
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+def get_broker():
+    global _broker
+    with _broker_guard:
+        if _broker is None:
+            url = getattr(settings, "LIVE_UPDATES_REDIS_URL", None)
+            _broker = RedisBroker(url) if url else InProcessBroker()
+        return _broker
+
+
+def is_supported(request):
+    """
+    The streams are async generators that stay open: only an ASGI server
+    sends them as they go. Under WSGI Django would consume the whole
+    (endless) stream before sending anything, holding a worker thread.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def game_channel(game_id):
+    return f"game:{game_id}"
+
+
+def subscribe(game_id, timeout=None):
+    """
+    Async iterator over the events of a game. Yields None every `timeout`
+    seconds without events, so the caller can send keep-alives.
+    """
+    timeout = timeout or settings.LIVE_UPDATES_KEEPALIVE
+    return get_broker().subscribe(game_channel(game_id), timeout)
+
+
+def publish(game_id, event, html, author_id=None):
+    get_broker().publish(game_channel(game_id), {
+        "event": event,
+        "data": html,
+        "author": author_id,
+    })
+
+
+def publish_comment(comment):
+    """
+    Publishes a newly created comment. The fragment is the same for every
+    viewer: the vote form gets its CSRF token from the HTMX request headers.
+    """
+    comment.num_likes = 0
+    comment.num_dislikes = 0
+    html = render_fragment("gamerank/includes/comment_item.html", {
+        "comment": comment,
+        "user": comment.user,
+        "csrf_token": "NOTPROVIDED",
+    })
+    publish(comment.game_id, "comment", html, author_id=comment.user_id)
+
+
+def publish_votes(comment, num_likes, num_dislikes):
+    """
+    Publishes the new like/dislike counters of a comment as out-of-band swaps.
+    """
+    html = render_to_string("gamerank/includes/comment_votes_oob.html", {
+        "comment": comment,
+        "num_likes": num_likes,
+        "num_dislikes": num_dislikes,
+    })
+    publish(comment.game_id, "vote", html)
+
+
+# For the async views: the Redis client blocks on the network, so publishing
+# (and rendering the fragment) runs in a worker thread. Not thread-sensitive:
+# no ORM work, and it must not queue behind the queries on the shared thread.
+apublish_comment = sync_to_async(publish_comment, thread_sensitive=False)
+apublish_votes = sync_to_async(publish_votes, thread_sensitive=False)
+
+
+def format_event(event, data):
+    """
+    Formats one SSE message; every line of the payload needs its own data field.
+    """
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {event}\n{lines}\n"
@@ -0,0 +1,342 @@
+"""
+Mixed-workload load generator used by `manage.py loadtest`.
+
+Every virtual user keeps one keep-alive HTTP/1.1 connection and its own
+cookies (session and CSRF), logs in through the normal login form and then
+runs actions picked at random according to a traffic mix:
+
+    MIXES['default'] = {'home': 45, 'game_detail': 35, ..., 'rate': 3}
+
+A mix is the name of one of MIXES, a list like "home=80,comment=20", or the
+dotted path of a dict with the same shape ("myproject.mixes:CHECKOUT").
+Actions are coroutines taking the VirtualUser; new ones can be added to
+ACTIONS.
+"""
+import asyncio
+import importlib
+import random
+import re
+import time
+import urllib.parse
+from collections import defaultdict
+
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+OK_STATUSES = {200, 204, 301, 302, 304}
+
+
+class HttpClient:
+    """
+    Minimal HTTP/1.1 client over one keep-alive connection, with a cookie jar.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None, headers=None):
+        """
+        Returns (status, headers, body). Reconnects once if the server closed
+        the keep-alive connection.
+        """
+        for attempt in (1, 2):
+            try:
+                return await self._request(method, path, data, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt == 2:
+                    raise
+
+    async def _request(self, method, path, data, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        body = urllib.parse.urlencode(data).encode() if data is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if data is not None:
+            lines += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                self._store_cookie(value)
+            response_headers[name] = value
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                chunks.append(await self.reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            content = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            content = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, content
+
+    def _store_cookie(self, header):
+        pair, _, attributes = header.partition(";")
+        name, _, value = pair.strip().partition("=")
+        if "max-age=0" in attributes.lower() or not value.strip('"'):
+            self.cookies.pop(name, None)
+        else:
+            self.cookies[name] = value
+
+
+class VirtualUser:
+
+    def __init__(self, client, username, password, data, rng):
+        self.client = client
+        self.username = username
+        self.password = password
+        self.data = data  # {'games': [...], 'comments': [...]}
+        self.rng = rng
+
+    def game(self):
+        return self.rng.choice(self.data["games"])
+
+    async def get(self, path, htmx=False):
+        headers = {"HX-Request": "true"} if htmx else None
+        return await self.client.request("GET", path, headers=headers)
+
+    async def post(self, path, data, htmx=False):
+        headers = {
+            "X-CSRFToken": self.client.cookies.get("csrftoken", ""),
+            "Referer": f"http://{self.client.host}:{self.client.port}{path}",
+        }
+        if htmx:
+            headers["HX-Request"] = "true"
+        return await self.client.request("POST", path, data=data, headers=headers)
+
+    async def login(self):
+        self.client.cookies.clear()
+        status, headers, body = await self.get("/login/")
+        token = CSRF_INPUT_RE.search(body)
+        if token is None:
+            return status, headers, body
+        status, headers, body = await self.post("/login/", {
+            "username": self.username,
+            "password": self.password,
+            "csrfmiddlewaretoken": token.group(1).decode(),
+        })
+        # A wrong password renders the form again instead of redirecting
+        return (401 if status == 200 else status), headers, body
+
+
+async def home(user):
+    return await user.get("/")
+
+
+async def game_detail(user):
+    return await user.get(f"/game/{user.game()}/")
+
+
+async def comments(user):
+    return await user.get(f"/game/{user.game()}/htmx/comments/", htmx=True)
+
+
+async def leaderboards(user):
+    return await user.get("/leaderboards/")
+
+
+async def rate(user):
+    return await user.post(f"/game/{user.game()}/", {"vote": user.rng.randint(0, 5)})
+
+
+async def comment(user):
+    return await user.post(
+        f"/game/{user.game()}/htmx/comment/",
+        {"comment_text": f"Load test comment {user.rng.randint(0, 10**6)}"},
+        htmx=True,
+    )
+
+
+async def vote(user):
+    if not user.data["comments"]:
+        return await comments(user)
+    comment_id = user.rng.choice(user.data["comments"])
+    vote_type = user.rng.choice(("like", "dislike"))
+    return await user.post(f"/comment/{comment_id}/vote_htmx/", {"vote_type": vote_type}, htmx=True)
+
+
+async def follow(user):
+    action = user.rng.choice(("follow", "unfollow"))
+    return await user.post(f"/game/{user.game()}/htmx/follow/", {"action": action}, htmx=True)
+
+
+async def login(user):
+    return await user.login()
+
+
+ACTIONS = {
+    "home": home,
+    "game_detail": game_detail,
+    "comments": comments,
+    "leaderboards": leaderboards,
+    "rate": rate,
+    "comment": comment,
+    "vote": vote,
+    "follow": follow,
+    "login": login,
+}
+
+MIXES = {
+    # 90% reads, 10% writes (including logins)
+    "default": {
+        "home": 40, "game_detail": 35, "comments": 10, "leaderboards": 5,
+        "rate": 3, "comment": 3, "vote": 2, "follow": 1, "login": 1,
+    },
+    "read": {"home": 45, "game_detail": 40, "comments": 10, "leaderboards": 5},
+    "write": {"game_detail": 20, "comments": 20, "rate": 15, "comment": 20, "vote": 15, "follow": 10},
+}
+
+
+def parse_mix(value):
+    """
+    Returns {action: weight} from a mix name, "action=weight,..." or "module:ATTRIBUTE".
+    """
+    if value in MIXES:
+        mix = MIXES[value]
+    elif ":" in value:
+        module, _, attribute = value.partition(":")
+        mix = getattr(importlib.import_module(module), attribute)
+    else:
+        mix = {}
+        for part in value.split(","):
+            name, _, weight = part.partition("=")
+            mix[name.strip()] = float(weight or 1)
+
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"Unknown actions: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Stats:
+    """
+    Results of every request, by action and by reporting interval.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.samples = []  # (seconds since start, action, latency, ok, locked)
+
+    def record(self, action, latency, ok, locked):
+        self.samples.append((time.perf_counter() - self.start, action, latency, ok, locked))
+
+    @staticmethod
+    def summarize(samples, duration):
+        latencies = [s[2] for s in samples]
+        errors = sum(1 for s in samples if not s[3])
+        return {
+            "requests": len(samples),
+            "rps": len(samples) / duration if duration else 0.0,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "errors": errors,
+            "error_rate": 100 * errors / len(samples) if samples else 0.0,
+            "locked": sum(1 for s in samples if s[4]),
+        }
+
+    def window(self, since, until):
+        return self.summarize([s for s in self.samples if since <= s[0] < until], until - since)
+
+    def by_action(self, duration):
+        groups = defaultdict(list)
+        for sample in self.samples:
+            groups[sample[1]].append(sample)
+        return {action: self.summarize(samples, duration) for action, samples in sorted(groups.items())}
+
+
+def is_lock_error(status, headers, body):
+    return (status == 503 and "x-database-busy" in headers) or (status == 500 and b"database is locked" in body)
+
+
+async def run_user(user, mix, stats, deadline, think_time):
+    actions = list(mix)
+    weights = [mix[name] for name in actions]
+
+    try:
+        name = "login"  # Every user logs in first
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status, headers, body = await ACTIONS[name](user)
+                ok = status in OK_STATUSES
+                locked = is_lock_error(status, headers, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+                await user.client.close()
+                ok = locked = False
+            stats.record(name, time.perf_counter() - start, ok, locked)
+            if think_time:
+                await asyncio.sleep(user.rng.expovariate(1 / think_time))
+            name = user.rng.choices(actions, weights)[0]
+    finally:
+        await user.client.close()
+
+
+async def run(base_url, accounts, data, mix, concurrency, duration, ramp_up=0.0, think_time=0.0,
+              interval=5.0, on_interval=None, seed=None):
+    """
+    Runs `concurrency` virtual users for `duration` seconds and returns the Stats.
+    accounts is a list of (username, password), shared round-robin.
+    on_interval(start, end, summary) is called every `interval` seconds.
+    """
+    parsed = urllib.parse.urlparse(base_url)
+    host, port = parsed.hostname, parsed.port or 80
+    stats = Stats()
+    deadline = stats.start + ramp_up + duration
+    rng = random.Random(seed)
+
+    async def start_user(n):
+        await asyncio.sleep(ramp_up * n / concurrency)
+        username, password = accounts[n % len(accounts)]
+        user = VirtualUser(HttpClient(host, port), username, password, data, random.Random(rng.random()))
+        await run_user(user, mix, stats, deadline, think_time)
+
+    async def report():
+        since = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            until = time.perf_counter() - stats.start
+            if on_interval:
+                on_interval(since, until, stats.window(since, until))
+            since = until
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(*(start_user(n) for n in range(concurrency)))
+    finally:
+        reporter.cancel()
+    return stats
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from gamerank import leaderboards
+
+
+class Command(BaseCommand):
+    help = "Recomputes the 24h/7d leaderboard counters from the activity log (run periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Also recompute the all-time counters from the Rating/Follow/Comment tables",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            count = leaderboards.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Leaderboards rebuilt: {count} counters."))
+        else:
+            count = leaderboards.compact()
+            self.stdout.write(self.style.SUCCESS(f"Leaderboards compacted: {count} active counters."))
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gamerank.taskqueue import TaskError, enqueue
+
+
+class Command(BaseCommand):
+    help = "Adds a background task to the queue (e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="Task name, e.g. load_games or warm_thumbnails")
+        parser.add_argument("--kwargs", default="{}", help="Task arguments as a JSON object")
+        parser.add_argument("--dedup-key", default=None, help="Skip if an active task has this key")
+        parser.add_argument("--delay", type=int, default=0, help="Seconds to wait before running it")
+        parser.add_argument("--max-attempts", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            kwargs = json.loads(options["kwargs"])
+        except ValueError as e:
+            raise CommandError(f"Invalid --kwargs: {e}")
+
+        try:
+            task = enqueue(
+                options["name"],
+                kwargs=kwargs,
+                dedup_key=options["dedup_key"],
+                delay=options["delay"],
+                max_attempts=options["max_attempts"],
+            )
+        except TaskError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"Task queued: {task} (runs at {task.run_at:%Y-%m-%d %H:%M:%S})"))
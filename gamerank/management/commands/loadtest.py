@@ -0,0 +1,112 @@
+import asyncio
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from gamerank import loadtest
+from gamerank.models import Comment, Game, UserSettings
+
+# Created by create_default_users
+DEFAULT_ACCOUNTS = [("testuser", "test123"), ("gamer1", "gamer123"), ("gamer2", "gamer123")]
+
+
+class Command(BaseCommand):
+    help = "Drives a running server with concurrent logged-in users and reports throughput, latency and errors"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running server")
+        parser.add_argument("--concurrency", type=int, default=20, help="Number of virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds of load after the ramp-up")
+        parser.add_argument("--ramp-up", type=float, default=0, help="Seconds to start every virtual user")
+        parser.add_argument(
+            "--mix", default="default",
+            help=f"Traffic mix: {', '.join(loadtest.MIXES)}, 'action=weight,...' or 'module:ATTRIBUTE' "
+                 f"(actions: {', '.join(loadtest.ACTIONS)})",
+        )
+        parser.add_argument(
+            "--users", type=int, default=0,
+            help="Also create and use this many loadtest<n> users (besides the default users)",
+        )
+        parser.add_argument("--password", default="loadtest123", help="Password of the generated users")
+        parser.add_argument("--think", type=float, default=0, help="Mean pause in seconds between the actions of a user")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds between progress lines")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options["mix"])
+        except (ValueError, ImportError, AttributeError) as e:
+            raise CommandError(f"Invalid mix: {e}")
+
+        games = list(Game.objects.values_list("game_id", flat=True))
+        if not games:
+            raise CommandError("There are no games, run load_games first.")
+        data = {
+            "games": games,
+            "comments": list(Comment.objects.order_by("-id").values_list("id", flat=True)[:1000]),
+        }
+
+        accounts = [a for a in DEFAULT_ACCOUNTS if User.objects.filter(username=a[0], is_active=True).exists()]
+        accounts += self.create_users(options["users"], options["password"])
+        if not accounts:
+            raise CommandError("There are no users to log in with, run create_default_users or pass --users.")
+
+        self.stdout.write(self.style.WARNING(
+            f"Running {options['concurrency']} users ({len(accounts)} accounts) against {options['url']} "
+            f"for {options['duration']:g} s, mix: {mix}"
+        ))
+        self.stdout.write(f"{'time':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'locked':>7}")
+
+        stats = asyncio.run(loadtest.run(
+            options["url"], accounts, data, mix,
+            concurrency=max(1, options["concurrency"]),
+            duration=options["duration"],
+            ramp_up=options["ramp_up"],
+            think_time=options["think"],
+            interval=options["interval"],
+            on_interval=self.write_interval,
+            seed=options["seed"],
+        ))
+
+        elapsed = options["ramp_up"] + options["duration"]
+        self.stdout.write(f"\n{'action':>12} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'locked':>7}")
+        for action, summary in stats.by_action(elapsed).items():
+            self.stdout.write(f"{action:>12} {self.format_row(summary, requests=True)}")
+        total = stats.summarize(stats.samples, elapsed)
+        self.stdout.write(f"{'total':>12} {self.format_row(total, requests=True)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Process finished! {total['requests']} requests, {total['rps']:.1f} req/s, "
+            f"{total['error_rate']:.2f}% errors, {total['locked']} database lock errors."
+        ))
+
+    def create_users(self, count, password):
+        usernames = [f"loadtest{n}" for n in range(1, count + 1)]
+        existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        missing = [name for name in usernames if name not in existing]
+        if missing:
+            # Hashing once: hashing thousands of passwords would take minutes
+            hashed = make_password(password)
+            User.objects.bulk_create(User(username=name, password=hashed) for name in missing)
+            UserSettings.objects.bulk_create(
+                [UserSettings(user=user) for user in User.objects.filter(username__in=missing)],
+                ignore_conflicts=True,
+            )
+            self.stdout.write(self.style.SUCCESS(f"✓ Created {len(missing)} load test users"))
+        return [(name, password) for name in usernames]
+
+    @staticmethod
+    def format_row(summary, requests=False):
+        row = f"{summary['requests']:>9} " if requests else ""
+        return (
+            row + f"{summary['rps']:>8.1f} {summary['p50']:>8.1f} {summary['p95']:>8.1f} {summary['p99']:>8.1f} "
+            f"{summary['errors']:>7} {summary['locked']:>7}"
+        )
+
+    def write_interval(self, since, until, summary):
+        line = f"{since:5.0f}-{until:<5.0f} {self.format_row(summary)}"
+        if summary["errors"]:
+            self.stdout.write(self.style.WARNING(line))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from gamerank.models import RatingHistogram
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-game rating histograms from the Rating table"
+
+    def handle(self, *args, **kwargs):
+        count = RatingHistogram.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Process finished! Histograms rebuilt for {count} games."))
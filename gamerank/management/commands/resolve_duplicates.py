@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gamerank.dedup import rebuild_aliases
+from gamerank.gamesapi import GAME_SOURCES, load_source
+
+
+class Command(BaseCommand):
+    help = "Recomputes the canonical ids of the games of every source (local games and APIs)"
+
+    def handle(self, *args, **kwargs):
+        api_games = {source: load_source(source, refresh=False) for source in GAME_SOURCES}
+        entries, canonical = rebuild_aliases(api_games)
+        self.stdout.write(self.style.SUCCESS(
+            f"Process finished! {entries} entries resolved to {canonical} distinct games."
+        ))
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from gamerank import backups
+
+
+class Command(BaseCommand):
+    help = "Restores a database snapshot taken by snapshot_db, into the live database or into another file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("snapshot", nargs="?", default="latest", help="Snapshot id (default: latest)")
+        parser.add_argument("--output", default=None, help="Write the database to this file instead of the live one")
+        parser.add_argument("--noinput", "--no-input", action="store_false", dest="interactive")
+        parser.add_argument(
+            "--no-snapshot", action="store_true",
+            help="Do not snapshot the live database before overwriting it",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            manifest = backups.get_snapshot(options["snapshot"])
+        except backups.BackupError as e:
+            raise CommandError(str(e))
+
+        output = options["output"]
+        if output is None:
+            if options["interactive"]:
+                answer = input(
+                    f"This replaces every row of {backups.database_path()} with snapshot {manifest['id']} "
+                    f"({manifest['created']}). Type 'yes' to continue: "
+                )
+                if answer != "yes":
+                    raise CommandError("Restore cancelled.")
+            if not options["no_snapshot"]:
+                # Its rotation must not delete the snapshot being restored
+                current = backups.snapshot(protect=[manifest["id"]])
+                self.stdout.write(self.style.WARNING(f"Current database saved as snapshot {current['id']}"))
+
+        try:
+            seconds = backups.restore(manifest, target_path=output)
+        except (backups.BackupError, OSError) as e:
+            raise CommandError(f"Restore failed: {e}")
+
+        if output is None:
+            # Cached pages, users and followed games belong to the replaced data
+            cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Process finished! Snapshot {manifest['id']} restored into {output or backups.database_path()} "
+            f"in {seconds:.2f} s (checksums verified)."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gamerank import history
+
+
+class Command(BaseCommand):
+    help = "Rolls the new rating events up into the daily/weekly history and compacts the old ones"
+
+    def handle(self, *args, **options):
+        rolled_up = history.rollup()
+        events, buckets = history.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f"Process finished! {rolled_up} events rolled up, {events} old events and {buckets} daily buckets deleted."
+        ))
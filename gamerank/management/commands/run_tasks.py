@@ -0,0 +1,103 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from gamerank import leaderboards, taskqueue
+
+PURGE_INTERVAL = 3600
+
+
+def _init_process():
+    # Each process opens its own database connections
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Runs the background tasks of the queue in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count() or 1,
+            help="Number of tasks run at the same time (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit when there are no due tasks left instead of waiting for new ones",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=None,
+            help="Seconds between checks for new tasks (default: TASKS_POLL_INTERVAL)",
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        poll_interval = options["poll_interval"] or settings.TASKS_POLL_INTERVAL
+        worker = taskqueue.worker_name()
+
+        requeued = taskqueue.requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"{requeued} stale tasks given back to the queue."))
+
+        leaderboards.schedule_compaction()
+        self.stdout.write(self.style.WARNING(f"Worker {worker} running with {processes} processes..."))
+
+        # Forked processes must not share the connections of this one
+        connections.close_all()
+
+        running = {}
+        done = failed = 0
+        last_purge = last_heartbeat = 0
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_process) as pool:
+            try:
+                while True:
+                    if running and time.monotonic() - last_heartbeat > settings.TASKS_HEARTBEAT_INTERVAL:
+                        taskqueue.heartbeat(worker, [task.pk for task in running.values()])
+                        last_heartbeat = time.monotonic()
+
+                    if time.monotonic() - last_purge > PURGE_INTERVAL:
+                        # Only the tasks of dead workers: the live ones keep beating
+                        taskqueue.requeue_stale()
+                        taskqueue.purge_finished()
+                        # The compaction reschedules itself; this restarts it after a failed run
+                        leaderboards.schedule_compaction()
+                        last_purge = time.monotonic()
+
+                    free = processes - len(running)
+                    if free:
+                        for task in taskqueue.claim(worker, free):
+                            self.stdout.write(f"- Started: {task}")
+                            running[pool.submit(taskqueue.execute, task.pk)] = task
+
+                    if not running:
+                        if options["once"]:
+                            break
+                        time.sleep(poll_interval)
+                        continue
+
+                    finished, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        task = running.pop(future)
+                        try:
+                            status = future.result()
+                        except Exception as e:
+                            # The process died or the task could not be sent to it
+                            status = taskqueue.fail(task, repr(e))
+
+                        if status == "done":
+                            done += 1
+                            self.stdout.write(self.style.SUCCESS(f"- Done: {task.name} #{task.pk}"))
+                        elif status == "pending":
+                            self.stdout.write(self.style.WARNING(f"- Will retry: {task.name} #{task.pk}"))
+                        else:
+                            failed += 1
+                            self.stdout.write(self.style.ERROR(f"- Failed: {task.name} #{task.pk}"))
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING("Stopping, waiting for the running tasks..."))
+
+        self.stdout.write(self.style.SUCCESS(f"Process finished! {done} tasks done, {failed} failed."))
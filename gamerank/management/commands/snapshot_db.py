@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gamerank import backups
+
+
+def format_size(nbytes):
+    for unit in ("B", "KiB", "MiB"):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GiB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Takes an online snapshot of the database without blocking the site (see gamerank/backups.py). "
+        "Run it hourly from cron, or enqueue the snapshot_database task once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=None, help="Pages per step (default: BACKUP_PAGES_PER_STEP)")
+        parser.add_argument("--pause", type=float, default=None, help="Seconds between steps (default: BACKUP_STEP_PAUSE)")
+        parser.add_argument("--report", action="store_true", help="Only list the stored snapshots and their timings")
+        parser.add_argument("--verify", action="store_true", help="Also check that every stored snapshot can be restored")
+
+    def handle(self, *args, **options):
+        if not options["report"]:
+            try:
+                manifest = backups.snapshot(pages=options["pages"], pause=options["pause"])
+            except (backups.BackupError, OSError) as e:
+                raise CommandError(f"Snapshot failed: {e}")
+            timings = manifest["timings"]
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Snapshot {manifest['id']}: {format_size(manifest['size'])} copied in {timings['seconds']:.2f} s "
+                f"({timings['steps']} steps, longest {timings['max_step'] * 1000:.1f} ms), "
+                f"{format_size(manifest['new_bytes'])} of new chunks"
+            ))
+
+        if options["verify"]:
+            self.verify()
+        self.report()
+
+    def verify(self):
+        for manifest in backups.list_snapshots():
+            try:
+                for digest in manifest["chunks"]:
+                    backups.check_chunk(digest)
+            except backups.BackupError as e:
+                self.stdout.write(self.style.ERROR(f"✗ {manifest['id']}: {e}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✓ {manifest['id']}: {len(manifest['chunks'])} chunks ok"))
+
+    def report(self):
+        manifests = backups.list_snapshots()
+        self.stdout.write(
+            f"\n{'snapshot':18} {'size':>10} {'new':>10} {'copy s':>7} {'steps':>6} "
+            f"{'max step ms':>11} {'restarts':>8} {'store s':>7}"
+        )
+        for manifest in manifests:
+            timings = manifest["timings"]
+            restarts = f"{timings['restarts']}{'*' if timings['single_step'] else ''}"
+            self.stdout.write(
+                f"{manifest['id']:18} {format_size(manifest['size']):>10} {format_size(manifest['new_bytes']):>10} "
+                f"{timings['seconds']:>7.2f} {timings['steps']:>6} {timings['max_step'] * 1000:>11.1f} "
+                f"{restarts:>8} {timings['store_seconds']:>7.2f}"
+            )
+        stored = backups.stored_bytes()
+        total = sum(manifest["size"] for manifest in manifests)
+        self.stdout.write(self.style.SUCCESS(
+            f"Process finished! {len(manifests)} snapshots ({format_size(total)} of databases) "
+            f"stored in {format_size(stored)}."
+        ))
+        if any(manifest["timings"]["single_step"] for manifest in manifests):
+            self.stdout.write("* restarted too often by concurrent writes, finished in a single step")
@@ -0,0 +1,125 @@
+import json
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Pages anonymous visitors can see
+DEFAULT_PATHS = ["/", "/activity/", "/leaderboards/"]
+
+# Run in a fresh interpreter under -X importtime, like a newly started worker
+CHILD_SCRIPT = """
+import json, time
+started = time.time()
+start = time.perf_counter()
+
+import django
+from django.conf import settings
+settings.STARTUP_WARMUP = {warmup}
+django.setup()
+timings = {{"started": started, "setup": time.perf_counter() - start}}
+
+from django.test import Client
+client = Client(HTTP_HOST="localhost")
+requests = []
+for path in {paths}:
+    for attempt in ("first", "second"):
+        request_start = time.perf_counter()
+        status = client.get(path).status_code
+        requests.append([path, attempt, status, time.perf_counter() - request_start])
+    timings.setdefault("first_response", time.perf_counter() - start)
+timings["requests"] = requests
+print("STARTUP_PROFILE " + json.dumps(timings))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Returns [(module, self seconds, cumulative seconds, depth)] from the output of -X importtime.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Measures the import time of each module and the time to the first response of a new process"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--paths", nargs="+", default=None,
+            help=f"Pages requested after the start (default: {' '.join(DEFAULT_PATHS)})",
+        )
+        parser.add_argument("--top", type=int, default=15, help="Number of modules listed")
+        parser.add_argument("--runs", type=int, default=3, help="Runs of each configuration (the median is reported)")
+        parser.add_argument("--compare", action="store_true", help="Also measure without STARTUP_WARMUP")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or DEFAULT_PATHS
+        configurations = [True, False] if options["compare"] else [settings.STARTUP_WARMUP]
+        results = {}
+        for warmup in configurations:
+            runs = sorted(
+                (self.run_child(warmup, paths) for _ in range(max(1, options["runs"]))),
+                key=lambda run: run["first_response"],
+            )
+            results[warmup] = runs[len(runs) // 2]
+
+        profile = results[configurations[0]]
+        self.write_imports(profile["imports"], options["top"])
+
+        for warmup, run in results.items():
+            self.stdout.write(self.style.WARNING(f"\nStartup with STARTUP_WARMUP = {warmup}"))
+            self.stdout.write(f"  interpreter start    {run['interpreter'] * 1000:8.1f} ms")
+            self.stdout.write(f"  django.setup()       {run['setup'] * 1000:8.1f} ms")
+            for path, attempt, status, seconds in run["requests"]:
+                self.stdout.write(f"  {attempt:6} GET {path:40} {status}  {seconds * 1000:8.1f} ms")
+            self.stdout.write(f"  first response after {run['first_response'] * 1000:8.1f} ms")
+            self.stdout.write(f"  process total        {run['total'] * 1000:8.1f} ms")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Process finished! First response {profile['first_response'] * 1000:.1f} ms after the start "
+            f"({profile['interpreter'] * 1000:.1f} ms interpreter, {profile['setup'] * 1000:.1f} ms setup)."
+        ))
+
+    def run_child(self, warmup, paths):
+        script = CHILD_SCRIPT.format(warmup=warmup, paths=repr(paths))
+        spawned = time.time()
+        child = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        total = time.time() - spawned
+
+        lines = [line for line in child.stdout.splitlines() if line.startswith("STARTUP_PROFILE ")]
+        if child.returncode or not lines:
+            raise CommandError(f"The profiled process failed:\n{child.stderr[-2000:]}")
+
+        run = json.loads(lines[-1].split(" ", 1)[1])
+        run["imports"] = parse_importtime(child.stderr)
+        run["total"] = total
+        # Until the first line of the script: interpreter start and site imports
+        run["interpreter"] = run["started"] - spawned
+        run["first_response"] += run["interpreter"]
+        return run
+
+    def write_imports(self, modules, top):
+        packages = {}
+        for name, _, cumulative, depth in modules:
+            if depth == 0:
+                package = name.split(".")[0]
+                packages[package] = packages.get(package, 0.0) + cumulative
+        self.stdout.write(self.style.WARNING("Import time by top-level package (cumulative)"))
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {package:40} {seconds * 1000:8.1f} ms")
+
+        self.stdout.write(self.style.WARNING("\nSlowest modules (own time, without their imports)"))
+        for name, own, cumulative, _ in sorted(modules, key=lambda m: -m[1])[:top]:
+            self.stdout.write(f"  {name:40} {own * 1000:8.1f} ms   ({cumulative * 1000:.1f} ms with imports)")
@@ -0,0 +1,59 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gamerank.models import Game
+from gamerank.thumbnails import get_thumbnail, is_allowed_source, evict_if_needed, ThumbnailError
+
+
+class Command(BaseCommand):
+    help = "Downloads and resizes every game thumbnail into the local cache (run after load_games)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Number of parallel downloads")
+        parser.add_argument(
+            "--widths", type=int, nargs="+", default=None,
+            help="Widths to generate (default: THUMBNAIL_WIDTHS)",
+        )
+        parser.add_argument(
+            "--include-api", action="store_true",
+            help="Also warm the thumbnails of the games in the data/ API backups",
+        )
+
+    def handle(self, *args, **options):
+        urls = set(Game.objects.exclude(thumbnail="").values_list("thumbnail", flat=True))
+
+        if options["include_api"]:
+            for filename in ("freetogame_games_backup.json", "mmobomb_games_backup.json"):
+                path = os.path.join(settings.BASE_DIR, "data", filename)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        urls.update(g.get("thumbnail", "") for g in json.load(f))
+                except (OSError, ValueError) as e:
+                    self.stdout.write(self.style.WARNING(f"Could not read {filename}: {e}"))
+
+        urls = sorted(u for u in urls if is_allowed_source(u))
+        widths = [w for w in (options["widths"] or settings.THUMBNAIL_WIDTHS) if w in settings.THUMBNAIL_WIDTHS]
+        jobs = [(url, width, fmt) for url in urls for width in widths for fmt in ("webp", "jpeg")]
+
+        self.stdout.write(self.style.WARNING(
+            f"Warming {len(jobs)} thumbnails ({len(urls)} images) with {options['workers']} workers..."
+        ))
+
+        done = 0
+        errors = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            futures = {pool.submit(get_thumbnail, *job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except ThumbnailError as e:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(str(e)))
+
+        evict_if_needed()
+        self.stdout.write(self.style.SUCCESS(f"Process finished! {done} thumbnails cached, {errors} errors."))
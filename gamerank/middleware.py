@@ -0,0 +1,221 @@
+import mimetypes
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import OperationalError
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import compression, profiler
+
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+
+
+class SyncAndAsyncMiddleware(ABC):
+    """
+    Base of the middleware that wrap the view (not MiddlewareMixin hooks):
+    runs in the mode of the rest of the chain, like Django's own middleware,
+    so that under ASGI the async views are not run through async_to_sync.
+    Subclasses implement call() for WSGI and __acall__() for ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.call(request)
+
+    @abstractmethod
+    def call(self, request):
+        """
+        Handles the request when the rest of the chain is sync.
+        """
+
+    @abstractmethod
+    async def __acall__(self, request):
+        """
+        Handles the request when the rest of the chain is async.
+        """
+
+
+class PrecompressedStaticMiddleware(SyncAndAsyncMiddleware):
+    """
+    Serves the files collected in STATIC_ROOT when DEBUG is off.
+    Picks the .br or .gz variant written by collectstatic according to
+    Accept-Encoding, and marks the hashed (fingerprinted) files as immutable.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = "/" + settings.STATIC_URL.lstrip("/")
+
+    def call(self, request):
+        return self.static_response(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Only a stat() and an open(): the file itself is sent by the server
+        return self.static_response(request) or await self.get_response(request)
+
+    def static_response(self, request):
+        """
+        Returns the response for a collected static file, or None.
+        """
+        if settings.DEBUG or not request.path.startswith(self.prefix):
+            return None
+
+        name = request.path[len(self.prefix):]
+        try:
+            path = Path(safe_join(settings.STATIC_ROOT, name))
+        except SuspiciousFileOperation:
+            return None
+        if not path.is_file():
+            return None
+
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        encoding = None
+
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            variant = path.with_name(path.name + suffix)
+            if candidate in accept_encoding and variant.is_file():
+                path, encoding = variant, candidate
+                break
+
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        del response["Content-Disposition"]
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Vary"] = "Accept-Encoding"
+
+        if HASHED_NAME_RE.search(name):
+            response["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response["Cache-Control"] = "public, max-age=3600"
+        return response
+
+
+class DatabaseBusyMiddleware(MiddlewareMixin):
+    """
+    Answers 503 with Retry-After instead of a 500 error page when SQLite
+    gives up waiting for the write lock ("database is locked"). The
+    X-Database-Busy header lets load tests count these errors.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, OperationalError) or "locked" not in str(exception):
+            return None
+        print("❌ Database busy:", request.method, request.path)
+        response = HttpResponse("The server is busy, please try again.", status=503, content_type="text/plain")
+        response["Retry-After"] = "1"
+        response["X-Database-Busy"] = "1"
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses the HTML, JSON and other text responses with brotli, zstd or
+    gzip according to Accept-Encoding (see gamerank/compression.py).
+    Streaming responses are compressed as they are sent. Bodies shorter than
+    COMPRESSION_MIN_SIZE, already encoded ones and the types not listed in
+    COMPRESSION_CONTENT_TYPES (images, fonts, event streams...) are sent as
+    they are. Pages that carry a CSRF token are only compressed with the
+    encodings that get random padding against BREACH (not brotli).
+    """
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        encoding = compression.choose_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", ""),
+            # Set by get_token() (and left, False, once the cookie is sent): the body may contain the token
+            padded_only="CSRF_COOKIE_NEEDS_UPDATE" in request.META,
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compression.acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            compressed = compression.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The compressed body is not byte-for-byte the one a strong ETag names
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+
+class ProfilerMiddleware(SyncAndAsyncMiddleware):
+    """
+    Profiles the requests of staff users that ask for it with ?_profile=1 or
+    an X-Profile header (see gamerank/profiler.py). The response gets the
+    URL of the speedscope file in X-Profile-Url and the totals in
+    Server-Timing. Other requests only pay a lookup in the query string and
+    the headers; with PROFILER_ENABLED off the middleware is not loaded.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        profiler.enable()
+
+    def call(self, request):
+        if not profiler.is_requested(request) or not request.user.is_staff:
+            return self.get_response(request)
+
+        with profiler.RequestProfile(request) as profile:
+            response = self.get_response(request)
+        return self.add_profile(profile, response)
+
+    async def __acall__(self, request):
+        if not profiler.is_requested(request) or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+
+        with profiler.RequestProfile(request, is_async=True) as profile:
+            response = await self.get_response(request)
+        return self.add_profile(profile, response)
+
+    def add_profile(self, profile, response):
+        try:
+            name = profile.save()
+        except OSError as e:
+            print("❌ Error saving the profile:", e)
+            return response
+
+        response["X-Profile-Url"] = reverse("profile_file", args=[name])
+        response["Server-Timing"] = (
+            f'total;dur={profile.seconds * 1000:.1f}, '
+            f'sql;dur={profile.sql_seconds * 1000:.1f};desc="{len(profile.recorder.queries)} queries"'
+        )
+        return response
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("rating", "Rating"),
+                            ("comment", "Comment"),
+                            ("follow", "Follow"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("value", models.IntegerField(blank=True, null=True)),
+                ("date", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="gamerank.game"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LeaderboardEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "board",
+                    models.CharField(
+                        choices=[
+                            ("rated", "Most rated"),
+                            ("followed", "Most followed"),
+                            ("discussed", "Most discussed"),
+                            ("commenters", "Top commenters"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("scope", models.CharField(default="all", max_length=120)),
+                ("key", models.CharField(max_length=100)),
+                ("count_day", models.IntegerField(default=0)),
+                ("count_week", models.IntegerField(default=0)),
+                ("count_all", models.IntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["board", "scope", "-count_day"],
+                        name="leaderboard_day_idx",
+                    ),
+                    models.Index(
+                        fields=["board", "scope", "-count_week"],
+                        name="leaderboard_week_idx",
+                    ),
+                    models.Index(
+                        fields=["board", "scope", "-count_all"],
+                        name="leaderboard_all_idx",
+                    ),
+                ],
+                "unique_together": {("board", "scope", "key")},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0002_leaderboards_activity"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="date",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="genre",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="platform",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="title",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_histograms(apps, schema_editor):
+    Rating = apps.get_model("gamerank", "Rating")
+    RatingHistogram = apps.get_model("gamerank", "RatingHistogram")
+
+    histograms = {}
+    counts = Rating.objects.order_by().values("game_id", "vote").annotate(n=Count("id"))
+    for row in counts:
+        histogram = histograms.setdefault(row["game_id"], RatingHistogram(game_id=row["game_id"]))
+        setattr(histogram, f"votes_{row['vote']}", row["n"])
+    RatingHistogram.objects.bulk_create(histograms.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0003_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RatingHistogram",
+            fields=[
+                (
+                    "game",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="histogram",
+                        serialize=False,
+                        to="gamerank.game",
+                    ),
+                ),
+                ("votes_0", models.IntegerField(default=0)),
+                ("votes_1", models.IntegerField(default=0)),
+                ("votes_2", models.IntegerField(default=0)),
+                ("votes_3", models.IntegerField(default=0)),
+                ("votes_4", models.IntegerField(default=0)),
+                ("votes_5", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0005_task_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
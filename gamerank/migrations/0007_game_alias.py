@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0006_game_soft_delete"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GameAlias",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=20)),
+                ("source_id", models.CharField(max_length=100)),
+                ("canonical_id", models.CharField(db_index=True, max_length=120)),
+                ("title", models.CharField(max_length=200)),
+                ("developer", models.CharField(blank=True, max_length=200)),
+                ("release_date", models.DateField(blank=True, null=True)),
+            ],
+            options={
+                "unique_together": {("source", "source_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0007_game_alias"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RatingEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("vote", models.SmallIntegerField()),
+                ("delta", models.SmallIntegerField(default=1)),
+                ("date", models.DateTimeField(default=django.utils.timezone.now)),
+                ("rolled_up", models.BooleanField(default=False)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="gamerank.game"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("rolled_up", False)),
+                        fields=["id"],
+                        name="ratingevent_pending_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("rolled_up", True)),
+                        fields=["date"],
+                        name="ratingevent_compact_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="RatingRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("day", "Day"), ("week", "Week")], max_length=4
+                    ),
+                ),
+                ("start", models.DateField()),
+                ("count", models.IntegerField(default=0)),
+                ("sum", models.IntegerField(default=0)),
+                ("votes_0", models.IntegerField(default=0)),
+                ("votes_1", models.IntegerField(default=0)),
+                ("votes_2", models.IntegerField(default=0)),
+                ("votes_3", models.IntegerField(default=0)),
+                ("votes_4", models.IntegerField(default=0)),
+                ("votes_5", models.IntegerField(default=0)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="gamerank.game"
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("game", "period", "start")},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:20
+#
+# Integer keys for Game, step 1 of 3: the new columns, empty. 0011 fills them
+# in chunks and 0012 makes them the keys.
+
+from django.db import migrations, models
+
+# Tables with a foreign key to Game (RatingHistogram is rebuilt by 0012)
+GAME_CHILDREN = ["comment", "rating", "ratingevent", "ratingrollup", "follow", "activityevent"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0009_feed_items"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="new_id",
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name="new_game",
+                field=models.BigIntegerField(null=True),
+            )
+            for model_name in GAME_CHILDREN
+        ],
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:20
+#
+# Integer keys for Game, step 2 of 3: numbers the games and copies the number
+# to every row that points to them. Each chunk is its own transaction, so the
+# site keeps writing meanwhile and an interrupted run resumes where it
+# stopped. Also moves the game counters of the leaderboards and the pending
+# purge_game tasks to the new keys. Nothing fills the new columns of the rows
+# written meanwhile: 0012 catches them up first, inside its transaction.
+
+from django.db import migrations, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+CHUNK_SIZE = 2000
+GAME_CHILDREN = ["comment", "rating", "ratingevent", "ratingrollup", "follow", "activityevent"]
+GAME_BOARDS = ["rated", "followed", "discussed"]
+
+
+def number_games(apps, schema_editor):
+    Game = apps.get_model("gamerank", "Game")
+    next_id = (Game.objects.aggregate(Max("new_id"))["new_id__max"] or 0) + 1
+    while True:
+        slugs = list(
+            Game.objects.filter(new_id__isnull=True).order_by("game_id").values_list("game_id", flat=True)[:CHUNK_SIZE]
+        )
+        if not slugs:
+            return
+        with transaction.atomic():
+            Game.objects.bulk_update(
+                [Game(game_id=slug, new_id=next_id + n) for n, slug in enumerate(slugs)], ["new_id"], batch_size=500
+            )
+        next_id += len(slugs)
+
+
+def link_rows(apps, schema_editor):
+    Game = apps.get_model("gamerank", "Game")
+    new_id = Game.objects.filter(game_id=OuterRef("game_id")).values("new_id")[:1]
+    for model_name in GAME_CHILDREN:
+        model = apps.get_model("gamerank", model_name)
+        rows = model.objects.order_by("pk")
+        last_pk = None
+        while True:
+            # Keyset chunks on the primary key, one UPDATE ... WHERE id BETWEEN each
+            chunk = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list("pk", flat=True)[:CHUNK_SIZE])
+            if not pks:
+                break
+            with transaction.atomic():
+                model.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(new_game=Subquery(new_id))
+            last_pk = pks[-1]
+
+
+def rekey_game_references(apps, schema_editor):
+    Game = apps.get_model("gamerank", "Game")
+    LeaderboardEntry = apps.get_model("gamerank", "LeaderboardEntry")
+    Task = apps.get_model("gamerank", "Task")
+    new_ids = dict(Game.objects.values_list("game_id", "new_id"))
+
+    entries = LeaderboardEntry.objects.filter(board__in=GAME_BOARDS).order_by("pk")
+    last_pk = 0
+    while True:
+        chunk = list(entries.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        with transaction.atomic():
+            known = [entry for entry in chunk if entry.key in new_ids]
+            for entry in known:
+                entry.key = str(new_ids[entry.key])
+            LeaderboardEntry.objects.bulk_update(known, ["key"], batch_size=500)
+            # Counters of games that no longer exist, or already moved by an earlier run
+            LeaderboardEntry.objects.filter(
+                pk__in=[entry.pk for entry in chunk if entry.key not in new_ids and not entry.key.isdigit()]
+            ).delete()
+        last_pk = chunk[-1].pk
+
+    for task in Task.objects.filter(name="purge_game", status__in=["pending", "running"]):
+        game_id = task.kwargs.get("game_id")
+        if game_id in new_ids:
+            task.kwargs = {**task.kwargs, "game_id": new_ids[game_id]}
+            task.save(update_fields=["kwargs"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("gamerank", "0010_game_integer_id_expand"),
+    ]
+
+    operations = [
+        migrations.RunPython(number_games, migrations.RunPython.noop),
+        migrations.RunPython(link_rows, migrations.RunPython.noop),
+        migrations.RunPython(rekey_game_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:20
+#
+# Integer keys for Game, step 3 of 3: the numbers filled by 0011 become the
+# primary key of Game and the foreign keys to it, and game_id stays as a
+# unique slug. The histograms are rebuilt from the ratings.
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+GAME_CHILDREN = ["comment", "rating", "ratingevent", "ratingrollup", "follow", "activityevent"]
+
+backfill = import_module("gamerank.migrations.0011_game_integer_id_backfill")
+
+
+def catch_up(apps, schema_editor):
+    """
+    Numbers the games and links the rows created since 0011 ran. The site
+    kept writing the old columns only; this migration holds the write lock,
+    so nothing new arrives before the columns are swapped.
+    """
+    backfill.number_games(apps, schema_editor)
+    Game = apps.get_model("gamerank", "Game")
+    new_id = Game.objects.filter(game_id=OuterRef("game_id")).values("new_id")[:1]
+    for model_name in GAME_CHILDREN:
+        apps.get_model("gamerank", model_name).objects.filter(new_game__isnull=True).update(new_game=Subquery(new_id))
+    backfill.rekey_game_references(apps, schema_editor)
+
+
+def backfill_histograms(apps, schema_editor):
+    Rating = apps.get_model("gamerank", "Rating")
+    RatingHistogram = apps.get_model("gamerank", "RatingHistogram")
+
+    histograms = {}
+    counts = Rating.objects.order_by().values("game_id", "vote").annotate(n=Count("id"))
+    for row in counts:
+        histogram = histograms.setdefault(row["game_id"], RatingHistogram(game_id=row["game_id"]))
+        setattr(histogram, f"votes_{row['vote']}", row["n"])
+    RatingHistogram.objects.bulk_create(histograms.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0011_game_integer_id_backfill"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(catch_up, migrations.RunPython.noop),
+        # The string foreign keys, with their indexes
+        migrations.AlterUniqueTogether(name="rating", unique_together=set()),
+        migrations.AlterUniqueTogether(name="follow", unique_together=set()),
+        migrations.AlterUniqueTogether(name="ratingrollup", unique_together=set()),
+        *[migrations.RemoveField(model_name=model_name, name="game") for model_name in GAME_CHILDREN],
+        migrations.DeleteModel(name="RatingHistogram"),
+        # Game: the number becomes the primary key
+        migrations.RenameField(model_name="game", old_name="new_id", new_name="id"),
+        migrations.AlterField(
+            model_name="game",
+            name="id",
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID"),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="game_id",
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        # The integer foreign keys
+        *[migrations.RenameField(model_name=model_name, old_name="new_game", new_name="game") for model_name in GAME_CHILDREN],
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name="game",
+                field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="gamerank.game"),
+            )
+            for model_name in GAME_CHILDREN
+        ],
+        migrations.AlterUniqueTogether(name="rating", unique_together={("game", "user")}),
+        migrations.AlterUniqueTogether(name="follow", unique_together={("game", "user")}),
+        migrations.AlterUniqueTogether(name="ratingrollup", unique_together={("game", "period", "start")}),
+        migrations.CreateModel(
+            name="RatingHistogram",
+            fields=[
+                (
+                    "game",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="histogram",
+                        serialize=False,
+                        to="gamerank.game",
+                    ),
+                ),
+                ("votes_0", models.IntegerField(default=0)),
+                ("votes_1", models.IntegerField(default=0)),
+                ("votes_2", models.IntegerField(default=0)),
+                ("votes_3", models.IntegerField(default=0)),
+                ("votes_4", models.IntegerField(default=0)),
+                ("votes_5", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:24
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0012_game_integer_id_contract"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(
+                django.db.models.functions.comparison.Collate("title", "NOCASE"),
+                name="gamerank_game_title_nocase",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="gamealias",
+            index=models.Index(
+                django.db.models.functions.comparison.Collate("title", "NOCASE"),
+                name="gamerank_alias_title_nocase",
+            ),
+        ),
+    ]
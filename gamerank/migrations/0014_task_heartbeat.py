@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0013_title_nocase_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
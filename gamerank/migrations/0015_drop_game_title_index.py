@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:42
+
+# The plain index on Game.title duplicates gamerank_game_title_nocase (0013),
+# which serves the title lookups and the admin search. On SQLite, AlterField
+# would rebuild the whole game table to drop it, so the index is dropped
+# directly and only the model state goes through AlterField.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamerank", "0014_task_heartbeat"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="game",
+                    name="title",
+                    field=models.CharField(max_length=100),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX "gamerank_game_title_005657cd"',
+                    reverse_sql='CREATE INDEX "gamerank_game_title_005657cd" ON "gamerank_game" ("title")',
+                ),
+            ],
+        ),
+    ]
@@ -1,14 +1,51 @@
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
-from django.db.models import Avg
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, Collate, NullIf
+from django.utils import timezone
+
+VOTE_VALUES = range(0, 6)
+
+
+class GameQuerySet(models.QuerySet):
+
+    def with_rating_stats(self):
+        """
+        Annotates score (average), num_votes and five_star_pct from the
+        rating histograms, so listings can sort on them without aggregating
+        the Rating table.
+        """
+        votes = [F(f'histogram__votes_{n}') for n in VOTE_VALUES]
+        total = sum(votes[1:], votes[0])
+        weighted = sum((votes[n] * n for n in VOTE_VALUES[2:]), votes[1])
+        return self.select_related('histogram').annotate(
+            num_votes=Coalesce(total, Value(0)),
+            score=Cast(weighted, FloatField()) / NullIf(total, Value(0)),
+            five_star_pct=Cast(votes[5], FloatField()) * 100 / NullIf(total, Value(0)),
+        )
+
+
+class GameManager(models.Manager.from_queryset(GameQuerySet)):
+    """
+    Default manager: hides the games scheduled for deletion (see purge.py).
+    Game.all_objects includes them.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Game(models.Model):
-    game_id = models.CharField(max_length=100, primary_key=True)
+    """
+    The primary key is the automatic integer id, which is what every foreign
+    key (Rating.game_id, Follow.game_id...) holds. game_id is the slug of
+    the URLs and the JSON ("LIS1-345").
+    """
+    game_id = models.CharField(max_length=100, unique=True)
     title = models.CharField(max_length=100)
-    platform = models.CharField(max_length=100)
-    genre = models.CharField(max_length=100)
+    platform = models.CharField(max_length=100, db_index=True)
+    genre = models.CharField(max_length=100, db_index=True)
     developer = models.CharField(max_length=100, blank=True)
     publisher = models.CharField(max_length=100, blank=True)
     release_date = models.DateField(null=True, blank=True)
@@ -16,23 +53,70 @@ class Game(models.Model):
     thumbnail = models.URLField(blank=True)
     game_url = models.URLField(blank=True)
     profile_url = models.URLField(blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = GameManager()
+    all_objects = GameQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # SQLite's LIKE is case-insensitive, so istartswith (the admin's
+            # '^title' search) can only use an index in the NOCASE collation
+            models.Index(Collate('title', 'NOCASE'), name='gamerank_game_title_nocase'),
+        ]
 
     def __str__(self):
         return f"{self.title}: {self.game_id}"
 
+    def rating_histogram(self):
+        """
+        Returns the RatingHistogram of the game, or None if it has no ratings.
+        Use select_related('histogram') to avoid one query per game.
+        """
+        try:
+            return self.histogram
+        except RatingHistogram.DoesNotExist:
+            return None
+
     def average_rating(self):
-        result = self.rating_set.aggregate(average=Avg('vote'))
-        return round(result['average'], 2) if result['average'] is not None else None
+        histogram = self.rating_histogram()
+        return histogram.average() if histogram else None
 
     def total_votes(self):
-        return self.rating_set.count()
+        histogram = self.rating_histogram()
+        return histogram.total() if histogram else 0
+
+    def rating_distribution(self):
+        """
+        Returns a list of (vote, count, percent) for the votes 5 to 0.
+        """
+        histogram = self.rating_histogram()
+        counts = histogram.counts() if histogram else [0] * len(VOTE_VALUES)
+        total = sum(counts)
+        return [
+            (vote, counts[vote], round(counts[vote] * 100 / total) if total else 0)
+            for vote in reversed(VOTE_VALUES)
+        ]
+
+
+class AtomicSaveMixin:
+    """
+    Saves the row in one transaction with what the post_save handlers of
+    signals.py derive from it (activity, leaderboards, histogram, history),
+    so they are committed or rolled back together and SQLite takes its
+    write lock once. Deletes already run in one (Collector.delete).
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveMixin, models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ['-date']
@@ -56,10 +140,10 @@ class CommentVote(models.Model):
         unique_together = ('user', 'comment')
 
     def __str__(self):
-        return f"{self.user.username} - {self.type} on comment {self.comment.id}"
+        return f"{self.user.username} - {self.type} on comment {self.comment_id}"
 
 
-class Rating(models.Model):
+class Rating(AtomicSaveMixin, models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     vote = models.IntegerField(
@@ -72,8 +156,136 @@ class Rating(models.Model):
     def __str__(self):
         return f"{self.user.username} → {self.game.title}: {self.vote}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the stored vote, so that a changed vote can be moved in the histogram
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_vote = instance.__dict__.get('vote')
+        return instance
+
+
+class RatingHistogram(models.Model):
+    """
+    Number of ratings of each value (0-5) of a game. Updated atomically on every
+    Rating write (see signals.py), so averages and distributions never need
+    an aggregate over the Rating table.
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='histogram')
+    votes_0 = models.IntegerField(default=0)
+    votes_1 = models.IntegerField(default=0)
+    votes_2 = models.IntegerField(default=0)
+    votes_3 = models.IntegerField(default=0)
+    votes_4 = models.IntegerField(default=0)
+    votes_5 = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Histogram of {self.game_id}: {self.counts()}"
+
+    def counts(self):
+        return [getattr(self, f'votes_{vote}') for vote in VOTE_VALUES]
+
+    def total(self):
+        return sum(self.counts())
+
+    def average(self):
+        total = self.total()
+        if not total:
+            return None
+        return round(sum(vote * count for vote, count in enumerate(self.counts())) / total, 2)
+
+    @classmethod
+    def add_vote(cls, game_id, vote, delta=1):
+        """
+        Adds `delta` to the counter of one vote value with a single UPDATE,
+        creating the histogram on the first rating of the game.
+        """
+        field = f'votes_{vote}'
+        if cls.objects.filter(game_id=game_id).update(**{field: F(field) + delta}):
+            return
+        if delta < 0:
+            return  # Nothing to remove (e.g. the game is being deleted)
+        try:
+            with transaction.atomic():
+                cls.objects.create(game_id=game_id, **{field: delta})
+        except IntegrityError:
+            # Created by a concurrent request in the meantime
+            cls.objects.filter(game_id=game_id).update(**{field: F(field) + delta})
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recomputes every histogram from the Rating table. Returns the number of games.
+        """
+        histograms = {}
+        counts = Rating.objects.order_by().values('game_id', 'vote').annotate(n=Count('id'))
+        for row in counts:
+            histogram = histograms.setdefault(row['game_id'], cls(game_id=row['game_id']))
+            setattr(histogram, f"votes_{row['vote']}", row['n'])
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(histograms.values(), batch_size=500)
+        return len(histograms)
+
+
+class RatingEvent(models.Model):
+    """
+    A change of the ratings of a game: delta=1 when a vote is added, -1 when
+    it is removed (a changed vote is one of each). Rolled up into
+    RatingRollup buckets by history.rollup() and deleted after
+    RATING_EVENTS_RETENTION_DAYS.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    vote = models.SmallIntegerField()
+    delta = models.SmallIntegerField(default=1)
+    date = models.DateTimeField(default=timezone.now)
+    rolled_up = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Only the events still to roll up, which stay few
+            models.Index(fields=['id'], condition=Q(rolled_up=False), name='ratingevent_pending_idx'),
+            models.Index(fields=['date'], condition=Q(rolled_up=True), name='ratingevent_compact_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} {self.delta:+d} × {self.vote} at {self.date}"
+
+
+class RatingRollup(models.Model):
+    """
+    Net rating changes of a game in one day or week (starting on Monday), in
+    the local time zone: number of votes, sum of the votes and number of
+    votes of each value. Read in order by the (game, period, start) index.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+    ]
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateField()
+    count = models.IntegerField(default=0)
+    sum = models.IntegerField(default=0)
+    votes_0 = models.IntegerField(default=0)
+    votes_1 = models.IntegerField(default=0)
+    votes_2 = models.IntegerField(default=0)
+    votes_3 = models.IntegerField(default=0)
+    votes_4 = models.IntegerField(default=0)
+    votes_5 = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('game', 'period', 'start')
+
+    def __str__(self):
+        return f"{self.game_id} {self.period} {self.start}: {self.count}"
+
+    def counts(self):
+        return [getattr(self, f'votes_{vote}') for vote in VOTE_VALUES]
 
-class Follow(models.Model):
+
+class Follow(AtomicSaveMixin, models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateTimeField(auto_now_add=True)
@@ -111,4 +323,145 @@ class UserSettings(models.Model):
     )
 
     def __str__(self):
-        return f"Settings for {self.user.username}"
\ No newline at end of file
+        return f"Settings for {self.user.username}"
+
+
+class ActivityEvent(models.Model):
+    """
+    Append-only log of what users do (ratings, comments, follows).
+    Read by the activity feed with keyset pagination on the id.
+    """
+    KIND_CHOICES = [
+        ('rating', 'Rating'),
+        ('comment', 'Comment'),
+        ('follow', 'Follow'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    value = models.IntegerField(null=True, blank=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.game_id}"
+
+
+class FeedItem(models.Model):
+    """
+    Inbox of a user: the activity on the games they follow (see feed.py),
+    written by the fan_out_activity task. Read newest first by the
+    (user, event) index.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    event = models.ForeignKey(ActivityEvent, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('user', 'event')
+
+    def __str__(self):
+        return f"{self.user_id} ← {self.event_id}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Counter of one subject (a game or a user) on one leaderboard and scope
+    ('all', 'genre:<genre>' or 'platform:<platform>').
+    count_all is exact and kept up to date on every write; count_day and
+    count_week are incremented on writes and recomputed from the activity
+    log when the leaderboards are compacted.
+    """
+    BOARD_CHOICES = [
+        ('rated', 'Most rated'),
+        ('followed', 'Most followed'),
+        ('discussed', 'Most discussed'),
+        ('commenters', 'Top commenters'),
+    ]
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    scope = models.CharField(max_length=120, default='all')
+    key = models.CharField(max_length=100)
+    count_day = models.IntegerField(default=0)
+    count_week = models.IntegerField(default=0)
+    count_all = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('board', 'scope', 'key')
+        indexes = [
+            models.Index(fields=['board', 'scope', '-count_day'], name='leaderboard_day_idx'),
+            models.Index(fields=['board', 'scope', '-count_week'], name='leaderboard_week_idx'),
+            models.Index(fields=['board', 'scope', '-count_all'], name='leaderboard_all_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.board} [{self.scope}] {self.key}: {self.count_all}"
+
+
+class Task(models.Model):
+    """
+    Background job run by `manage.py run_tasks` (see tasks.py).
+    Only one pending or running task can have a given dedup_key.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    progress = models.PositiveSmallIntegerField(default=0)
+    progress_message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)  # last sign of life of its worker
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=Q(status__in=['pending', 'running']),
+                name='task_active_dedup_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status}, {self.progress}%)"
+
+
+class GameAlias(models.Model):
+    """
+    Canonical id of one game entry of a source ('local' for the Game table,
+    or one of the external APIs), computed by dedup.py. Entries with the same
+    canonical_id are the same game. The matching fields are kept so that the
+    blocking index can be rebuilt without reading the sources again.
+    """
+    source = models.CharField(max_length=20)
+    source_id = models.CharField(max_length=100)
+    canonical_id = models.CharField(max_length=120, db_index=True)
+    title = models.CharField(max_length=200)
+    developer = models.CharField(max_length=200, blank=True)
+    release_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('source', 'source_id')
+        indexes = [
+            # For the admin's '^title' search, see Game.Meta
+            models.Index(Collate('title', 'NOCASE'), name='gamerank_alias_title_nocase'),
+        ]
+
+    def __str__(self):
+        return f"{self.source}:{self.source_id} → {self.canonical_id}"
@@ -0,0 +1,166 @@
+"""
+Full-page cache for anonymous visitors.
+
+Anonymous users get the same HTML for the same URL and language, so those
+pages are stored in the default cache. Every page is tagged (e.g. 'games',
+'ratings'); the tag versions are part of the cache key, so purging a tag
+just gives it a new version and all the pages tagged with it become misses.
+
+On a miss only one request recomputes the page (single-flight). The others
+get the previous version of the page if there is one (kept for
+PAGE_CACHE_STALE_TIMEOUT seconds, whatever the tags), otherwise they wait
+for the result: async views for up to PAGE_CACHE_LOCK_TIMEOUT seconds, sync
+views, which hold a worker thread while they wait, for PAGE_CACHE_SYNC_WAIT
+seconds only before rendering the page themselves.
+"""
+import asyncio
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+WAIT_INTERVAL = 0.05
+
+
+def _tag_key(tag):
+    return f"pagecache:tag:{tag}"
+
+
+def purge_tags(*tags):
+    """
+    Invalidates every cached page tagged with any of the given tags.
+    """
+    cache.set_many({_tag_key(tag): time.time_ns() for tag in tags}, None)
+
+
+def _tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # A lost version must never match an older one, hence the timestamp
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [str(versions[key]) for key in keys]
+
+
+def _is_cacheable(request):
+    return request.method in ("GET", "HEAD") and not request.user.is_authenticated
+
+
+def _page_keys(request, tags):
+    """
+    Returns the key of the page for the current tag versions, and the key of
+    its latest version whatever the tags (the stale copy).
+    """
+    query = "&".join(sorted(request.GET.urlencode().split("&")))
+    raw = "|".join([request.path, query, getattr(request, "LANGUAGE_CODE", settings.LANGUAGE_CODE)])
+    stale_key = "pagecache:stale:" + hashlib.md5(raw.encode("utf-8")).hexdigest()
+    raw = "|".join([raw, *_tag_versions(tags)])
+    return "pagecache:page:" + hashlib.md5(raw.encode("utf-8")).hexdigest(), stale_key
+
+
+def _from_cache(entry, status):
+    content, content_type = entry
+    response = HttpResponse(content, content_type=content_type)
+    response["X-Page-Cache"] = status
+    return response
+
+
+def _to_cache(request, keys, response, timeout):
+    # Pages that set cookies or embed a CSRF token are specific to one visitor
+    if (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+    ):
+        key, stale_key = keys
+        entry = (response.content, response["Content-Type"])
+        cache.set(key, entry, timeout)
+        cache.set(stale_key, entry, max(timeout, settings.PAGE_CACHE_STALE_TIMEOUT))
+    response["X-Page-Cache"] = "miss"
+    return response
+
+
+def cache_anonymous_page(tags, timeout=None):
+    """
+    Decorator for views (sync or async) whose anonymous GET responses can be
+    shared by every anonymous visitor. Authenticated requests are not cached.
+    """
+    timeout = timeout or settings.PAGE_CACHE_TIMEOUT
+    lock_timeout = settings.PAGE_CACHE_LOCK_TIMEOUT
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+
+            @functools.wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                user = await request.auser()
+                if request.method not in ("GET", "HEAD") or user.is_authenticated:
+                    return await view_func(request, *args, **kwargs)
+
+                keys = await asyncio.to_thread(_page_keys, request, tags)
+                key, stale_key = keys
+                entry = await cache.aget(key)
+                if entry is not None:
+                    return _from_cache(entry, "hit")
+
+                locked = await cache.aadd(key + ":lock", 1, lock_timeout)
+                if not locked:
+                    entry = await cache.aget(stale_key)
+                    if entry is not None:
+                        return _from_cache(entry, "stale")
+                    deadline = time.monotonic() + lock_timeout
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(WAIT_INTERVAL)
+                        entry = await cache.aget(key)
+                        if entry is not None:
+                            return _from_cache(entry, "coalesced")
+
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                    return _to_cache(request, keys, response, timeout)
+                finally:
+                    if locked:
+                        await cache.adelete(key + ":lock")
+
+        else:
+
+            @functools.wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                if not _is_cacheable(request):
+                    return view_func(request, *args, **kwargs)
+
+                keys = _page_keys(request, tags)
+                key, stale_key = keys
+                entry = cache.get(key)
+                if entry is not None:
+                    return _from_cache(entry, "hit")
+
+                locked = cache.add(key + ":lock", 1, lock_timeout)
+                if not locked:
+                    entry = cache.get(stale_key)
+                    if entry is not None:
+                        return _from_cache(entry, "stale")
+                    # A short wait only: each waiting request holds a worker thread
+                    deadline = time.monotonic() + settings.PAGE_CACHE_SYNC_WAIT
+                    while time.monotonic() < deadline:
+                        time.sleep(WAIT_INTERVAL)
+                        entry = cache.get(key)
+                        if entry is not None:
+                            return _from_cache(entry, "coalesced")
+
+                try:
+                    response = view_func(request, *args, **kwargs)
+                    return _to_cache(request, keys, response, timeout)
+                finally:
+                    if locked:
+                        cache.delete(key + ":lock")
+
+        return _wrapped_view
+
+    return decorator
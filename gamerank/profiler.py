@@ -0,0 +1,276 @@
+"""
+On-demand profiling of single requests, for staff users (see
+gamerank.middleware.ProfilerMiddleware): add ?_profile=1 to the URL or send
+the header "X-Profile: 1".
+
+While the view runs, a background thread samples the stack of the request
+thread every PROFILER_INTERVAL seconds, and every SQL query is recorded with
+its duration and the project frames it came from. Both are written as one
+speedscope file (https://www.speedscope.app, "Import" the file) with two
+profiles: "CPU" (the sampled stacks, a flame graph of where the time goes)
+and "SQL" (each query under the code that ran it). The files are kept in
+PROFILER_DIR, the oldest deleted beyond PROFILER_MAX_BYTES, and served to
+staff users by the profile_file view.
+
+The queries are recorded by an execute wrapper that enable() adds to every
+database connection, which looks up the profile of the current context in a
+context variable: asgiref copies the context into the sync_to_async threads,
+so the queries of async views are recorded too. Only the request thread is
+sampled, though: for async views that is the event loop thread, and the
+CPU profile is named so (the sync code they run shows up as waiting).
+"""
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+PROFILE_NAME_RE = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}\.speedscope\.json$")
+MAX_SQL_NAME = 200  # characters of each query shown as its frame name
+
+
+def profile_dir():
+    return Path(settings.PROFILER_DIR)
+
+
+def is_requested(request):
+    """
+    Cheap check done on every request: no query string parsing.
+    """
+    return "_profile=" in request.META.get("QUERY_STRING", "") or "HTTP_X_PROFILE" in request.META
+
+
+class Frames:
+    """
+    The frames table of a speedscope file: one entry per (function, file, line).
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.frames = []
+
+    def get(self, name, file=None, line=None):
+        key = (name, file, line)
+        if key not in self.index:
+            frame = {"name": name}
+            if file:
+                frame.update(file=file, line=line)
+            self.index[key] = len(self.frames)
+            self.frames.append(frame)
+        return self.index[key]
+
+    def code(self, code):
+        return self.get(code.co_name, code.co_filename, code.co_firstlineno)
+
+
+class Sampler(threading.Thread):
+    """
+    Records the stack of one thread, from `stop_frame` down, at regular intervals.
+    """
+
+    def __init__(self, thread_id, stop_frame, interval, start_time):
+        super().__init__(name="gamerank-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.stop_frame = stop_frame
+        self.interval = interval
+        self.start_time = start_time
+        self.samples = []  # (seconds since start, tuple of code objects root first)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.stop_frame:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append((time.perf_counter() - self.start_time, tuple(stack)))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def _project_origin():
+    """
+    Returns the project frames (outside the virtualenv and this module) of the
+    current stack, root first, as (function, file, line).
+    """
+    base_dir = str(settings.BASE_DIR)
+    origin = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and "site-packages" not in filename and filename != __file__:
+            origin.append((frame.f_code.co_name, filename, frame.f_lineno))
+        frame = frame.f_back
+    origin.reverse()
+    return origin
+
+
+_recorder = contextvars.ContextVar("gamerank_profiler_recorder", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper of every connection: records the query in the profile of
+    the current context, if any.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def enable():
+    """
+    Adds record_query to the connections of this thread and to every
+    connection created from now on, in any thread.
+    """
+    connection_created.connect(install, dispatch_uid="gamerank.profiler")
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+class QueryRecorder:
+    """
+    Keeps every query of one profile (passed on by record_query) with its
+    start, duration and origin.
+    """
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                "sql": sql,
+                "start": start - self.start_time,
+                "seconds": end - start,
+                "origin": _project_origin(),
+            })
+
+
+class RequestProfile:
+    """
+    with RequestProfile(request) as profile: ...; then profile.save().
+    """
+
+    def __init__(self, request, is_async=False):
+        self.request = request
+        self.is_async = is_async
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        self.sampler = Sampler(threading.get_ident(), sys._getframe(1), settings.PROFILER_INTERVAL, self.start_time)
+        self.recorder = QueryRecorder(self.start_time)
+        self.token = _recorder.set(self.recorder)
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sampler.stop()
+        _recorder.reset(self.token)
+        self.seconds = time.perf_counter() - self.start_time
+        return False
+
+    @property
+    def sql_seconds(self):
+        return sum(query["seconds"] for query in self.recorder.queries)
+
+    def speedscope(self):
+        frames = Frames()
+        name = f"{self.request.method} {self.request.get_full_path()}"
+        to_ms = 1000
+
+        samples, weights = [], []
+        previous = 0.0
+        for at, stack in self.sampler.samples:
+            samples.append([frames.code(code) for code in stack])
+            weights.append((at - previous) * to_ms)
+            previous = at
+        thread = "event loop thread" if self.is_async else "request thread"
+        cpu = {
+            "type": "sampled", "name": f"CPU ({thread}) · {name}", "unit": "milliseconds",
+            "startValue": 0, "endValue": self.seconds * to_ms, "samples": samples, "weights": weights,
+        }
+
+        # The queries run one after the other, so their events nest trivially
+        events = []
+        for query in self.recorder.queries:
+            stack = [frames.get(*origin) for origin in query["origin"]]
+            stack.append(frames.get("SQL: " + " ".join(query["sql"].split())[:MAX_SQL_NAME]))
+            start = query["start"] * to_ms
+            end = (query["start"] + query["seconds"]) * to_ms
+            events.extend({"type": "O", "frame": frame, "at": start} for frame in stack)
+            events.extend({"type": "C", "frame": frame, "at": end} for frame in reversed(stack))
+        sql = {
+            "type": "evented", "name": f"SQL · {len(self.recorder.queries)} queries", "unit": "milliseconds",
+            "startValue": 0, "endValue": self.seconds * to_ms, "events": events,
+        }
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "gamerank.profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames.frames},
+            "profiles": [cpu, sql],
+        }
+
+    def save(self):
+        """
+        Writes the speedscope file, evicts the oldest ones beyond the size
+        limit and returns the file name.
+        """
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.urandom(4).hex()}.speedscope.json"
+        tmp_path = directory / (name + ".tmp")
+        tmp_path.write_text(json.dumps(self.speedscope(), separators=(",", ":")))
+        os.replace(tmp_path, directory / name)
+        evict_profiles()
+        return name
+
+
+def evict_profiles():
+    """
+    Deletes the oldest profiles until the directory fits in PROFILER_MAX_BYTES.
+    Returns the number of files deleted.
+    """
+    files = []
+    for path in profile_dir().glob("*.speedscope.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in files:
+        if total <= settings.PROFILER_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
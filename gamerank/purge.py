@@ -0,0 +1,195 @@
+"""
+Deletion of users and games with many related rows.
+
+A plain delete() collects and removes every comment, rating, follow and
+vote in one transaction, which keeps SQLite locked for seconds. Instead:
+
+  1. schedule_*_deletion() hides the object at once (the game gets
+     deleted_at, the user is deactivated) and enqueues a purge task;
+  2. purge_game() / purge_user() delete the related rows in batches of
+     PURGE_BATCH_SIZE, each batch in its own short transaction, and adjust
+     the denormalized counters (rating histograms, rating history and
+     leaderboards) for the rows they remove.
+
+The batches are deleted with raw DELETEs, so the per-row signals that
+maintain the counters do not run: the counters are updated here instead,
+with one UPDATE per game (or user) and batch.
+"""
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import history, leaderboards
+from .auth import invalidate_user
+from .models import (
+    ActivityEvent, Comment, CommentVote, FeedItem, Follow, Game, GameAlias, LeaderboardEntry, Rating,
+    RatingEvent, RatingHistogram, RatingRollup, UserSettings,
+)
+from .pagecache import purge_tags
+from .taskqueue import enqueue, set_progress
+from .utils import forget_followed_games
+
+
+def schedule_game_deletion(game):
+    """
+    Hides a game immediately and enqueues the purge of its data.
+    """
+    Game.all_objects.filter(pk=game.pk).update(deleted_at=timezone.now())
+    transaction.on_commit(lambda: purge_tags('games', 'ratings'))
+    return enqueue('purge_game', kwargs={'game_id': game.pk}, dedup_key=f'purge_game:{game.pk}')
+
+
+def schedule_user_deletion(user):
+    """
+    Deactivates a user (logging them out and hiding their comments) and
+    enqueues the purge of their data.
+    """
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    invalidate_user(user.pk)
+    transaction.on_commit(lambda: purge_tags('games', 'ratings'))
+    return enqueue('purge_user', kwargs={'user_id': user.pk}, dedup_key=f'purge_user:{user.pk}')
+
+
+def _delete_in_batches(queryset, on_batch=None, label='', percent=0):
+    """
+    Deletes the rows of a queryset in batches, calling on_batch(ids) inside
+    the transaction of each batch before its rows are deleted.
+    Returns the number of rows deleted.
+    """
+    model = queryset.model
+    batch_size = settings.PURGE_BATCH_SIZE
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            # No ORDER BY: any batch will do, and sorting would read every remaining row
+            ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            if on_batch:
+                on_batch(ids)
+            batch = model.objects.filter(pk__in=ids)
+            # Same raw DELETE Django uses for fast deletes; related rows are already gone
+            deleted += batch._raw_delete(batch.db)
+
+        set_progress(percent, f"{label}: {deleted} rows deleted")
+        # Let the requests waiting for the write lock go first
+        time.sleep(settings.PURGE_BATCH_PAUSE)
+
+
+def _run_steps(steps):
+    """
+    Runs _delete_in_batches for a list of (name, queryset, on_batch), leaves first.
+    Returns {name: rows deleted}.
+    """
+    deleted = {}
+    for index, (name, queryset, on_batch) in enumerate(steps):
+        deleted[name] = _delete_in_batches(queryset, on_batch, label=name, percent=100 * index / len(steps))
+    return deleted
+
+
+def _game_scopes(game_ids):
+    rows = Game.all_objects.filter(pk__in=game_ids).values_list('pk', 'genre', 'platform')
+    return {pk: leaderboards.game_scopes(genre, platform) for pk, genre, platform in rows}
+
+
+def _discount_games(board, model, ids):
+    """
+    Subtracts from a per-game leaderboard the rows of `model` about to be deleted.
+    """
+    counts = Counter(dict(
+        model.objects.filter(pk__in=ids).order_by().values_list('game_id').annotate(n=Count('pk'))
+    ))
+    changes = Counter()
+    for game_id, scopes in _game_scopes(counts).items():
+        for scope in scopes:
+            changes[(scope, str(game_id))] += counts[game_id]
+    leaderboards.discount(board, changes)
+
+
+def _discount_histograms(ids):
+    rows = Rating.objects.filter(pk__in=ids).order_by().values_list('game_id', 'vote').annotate(n=Count('pk'))
+    changes = {}
+    for game_id, vote, n in rows:
+        RatingHistogram.objects.filter(game_id=game_id).update(**{f'votes_{vote}': F(f'votes_{vote}') - n})
+        changes[(game_id, vote)] = -n
+    history.record_many(changes)
+
+
+def purge_game(game_id):
+    """
+    Deletes a game scheduled for deletion and everything that depends on it.
+    """
+    game = Game.all_objects.filter(pk=game_id, deleted_at__isnull=False).first()
+    if game is None:
+        return {}
+    scopes = leaderboards.game_scopes(game.genre, game.platform)
+
+    def discount_commenters(ids):
+        counts = Comment.objects.filter(pk__in=ids).order_by().values_list('user_id').annotate(n=Count('pk'))
+        leaderboards.discount('commenters', {
+            (scope, str(user_id)): n for user_id, n in counts for scope in scopes
+        })
+
+    def forget_followers(ids):
+        # After the commit, or a read in between would cache the deleted follows again
+        user_ids = list(Follow.objects.filter(pk__in=ids).values_list('user_id', flat=True))
+        transaction.on_commit(lambda: forget_followed_games(*user_ids))
+
+    deleted = _run_steps([
+        ('comment_votes', CommentVote.objects.filter(comment__game_id=game_id), None),
+        ('comments', Comment.objects.filter(game_id=game_id), discount_commenters),
+        ('ratings', Rating.objects.filter(game_id=game_id), None),
+        ('follows', Follow.objects.filter(game_id=game_id), forget_followers),
+        ('feed_items', FeedItem.objects.filter(event__game_id=game_id), None),
+        ('activity', ActivityEvent.objects.filter(game_id=game_id), None),
+        ('rating_events', RatingEvent.objects.filter(game_id=game_id), None),
+        ('rating_rollups', RatingRollup.objects.filter(game_id=game_id), None),
+    ])
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(board__in=['rated', 'followed', 'discussed'], key=str(game_id)).delete()
+        RatingHistogram.objects.filter(game_id=game_id).delete()
+        GameAlias.objects.filter(source='local', source_id=game.game_id).delete()
+        Game.all_objects.filter(pk=game_id).delete()
+
+    leaderboards.compact()
+    purge_tags('games', 'ratings')
+    return deleted
+
+
+def purge_user(user_id):
+    """
+    Deletes a deactivated user and everything that depends on them.
+    """
+    if not User.objects.filter(pk=user_id, is_active=False).exists():
+        return {}
+
+    def discount_ratings(ids):
+        _discount_histograms(ids)
+        _discount_games('rated', Rating, ids)
+
+    deleted = _run_steps([
+        ('comment_votes', CommentVote.objects.filter(user_id=user_id), None),
+        ('votes_on_comments', CommentVote.objects.filter(comment__user_id=user_id), None),
+        ('comments', Comment.objects.filter(user_id=user_id), lambda ids: _discount_games('discussed', Comment, ids)),
+        ('ratings', Rating.objects.filter(user_id=user_id), discount_ratings),
+        ('follows', Follow.objects.filter(user_id=user_id), lambda ids: _discount_games('followed', Follow, ids)),
+        ('feed_items', FeedItem.objects.filter(user_id=user_id), None),
+        ('feed_items_of_activity', FeedItem.objects.filter(event__user_id=user_id), None),
+        ('activity', ActivityEvent.objects.filter(user_id=user_id), None),
+    ])
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(board='commenters', key=str(user_id)).delete()
+        UserSettings.objects.filter(user_id=user_id).delete()
+        User.objects.filter(pk=user_id).delete()
+    forget_followed_games(user_id)
+
+    leaderboards.compact()
+    purge_tags('games', 'ratings')
+    return deleted
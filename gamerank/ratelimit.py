@@ -0,0 +1,147 @@
+"""
+Token-bucket rate limiting of views, with the buckets held in a cache.
+
+Every client has a bucket per limit: authenticated users are limited by user
+id and anonymous visitors by IP address. A bucket holds up to `burst`
+tokens and refills at `rate` tokens per second; each request takes one token
+and is answered 429 with Retry-After when the bucket is empty.
+
+A bucket is a single cache entry, (tokens, updated), that expires once it
+would be full again, so idle clients cost nothing. Reading and writing it
+are two cache operations without a lock: two simultaneous requests of the
+same client may both take the last token, which only lets a burst through
+one request early. With a cache shared by every process (Redis, Memcached)
+the limits are global; with the default LocMemCache they are per process.
+
+The limits are named and configured in RATE_LIMITS, e.g. "comment": "6/m
+burst 10" (rate per s, m or h; the burst defaults to one period of tokens).
+"""
+import asyncio
+import functools
+import math
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import fragments
+
+RATE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*([smh])\s*(?:burst\s+(\d+))?\s*$")
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+@functools.cache
+def parse_rate(spec):
+    """
+    Parses "10/m" or "10/m burst 20" into (tokens per second, burst).
+    """
+    match = RATE_RE.match(spec)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    count, period, burst = match.groups()
+    rate = float(count) / PERIODS[period]
+    return rate, int(burst) if burst else max(1, int(float(count)))
+
+
+def get_limit(name):
+    return parse_rate(settings.RATE_LIMITS[name])
+
+
+def client_key(request, user=None):
+    user = user if user is not None else request.user
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _bucket_key(name, client):
+    return f"ratelimit:{name}:{client}"
+
+
+def _take(bucket, rate, burst, now):
+    """
+    Takes a token from a bucket, (tokens, updated) or None for a full one.
+    Returns (new bucket, seconds to wait, seconds until the bucket is full);
+    the new bucket is None and the wait positive when it is empty.
+    """
+    tokens, updated = bucket if bucket is not None else (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return None, (1 - tokens) / rate, 0
+    tokens -= 1
+    return (tokens, now), 0, math.ceil((burst - tokens) / rate)
+
+
+def check(name, client):
+    """
+    Takes a token from the bucket of a client. Returns 0 if the request is
+    allowed, otherwise the seconds until it would be.
+    """
+    rate, burst = get_limit(name)
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    key = _bucket_key(name, client)
+    bucket, wait, timeout = _take(cache.get(key), rate, burst, time.time())
+    if bucket is not None:
+        cache.set(key, bucket, timeout)
+    return wait
+
+
+# One thread switch for the get and the set (cache.aget and cache.aset would take
+# one each). Not thread-sensitive: the cache backends are thread-safe, and the
+# check must not queue behind the ORM work on the shared sync thread.
+acheck = sync_to_async(check, thread_sensitive=False)
+
+
+def too_many_requests(request, wait):
+    """
+    429 response. HTMX requests get an out-of-band alert and no swap of
+    their target (see the htmx:beforeSwap handler of base.html).
+    """
+    retry_after = max(1, math.ceil(wait))
+    if request.headers.get("HX-Request") == "true":
+        content = fragments.render_fragment("gamerank/includes/rate_limited.html", {"retry_after": retry_after})
+        response = HttpResponse(content, status=429)
+        response["HX-Reswap"] = "none"
+    else:
+        response = HttpResponse(
+            f"Too many requests, please try again in {retry_after} seconds.",
+            status=429, content_type="text/plain",
+        )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def rate_limit(name, methods=("POST",)):
+    """
+    Decorator for views (sync or async) limited by the RATE_LIMITS[name]
+    bucket of each client. Only the requests with the given methods take
+    tokens (methods=None limits every request).
+    """
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+
+            @functools.wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                if settings.RATE_LIMIT_ENABLED and (methods is None or request.method in methods):
+                    wait = await acheck(name, client_key(request, await request.auser()))
+                    if wait:
+                        return too_many_requests(request, wait)
+                return await view_func(request, *args, **kwargs)
+
+        else:
+
+            @functools.wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                if settings.RATE_LIMIT_ENABLED and (methods is None or request.method in methods):
+                    wait = check(name, client_key(request))
+                    if wait:
+                        return too_many_requests(request, wait)
+                return view_func(request, *args, **kwargs)
+
+        return _wrapped_view
+
+    return decorator
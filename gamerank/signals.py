@@ -0,0 +1,101 @@
+"""
+Keeps the activity log, the followers' feeds, the leaderboard counters, the
+rating histograms and history, the anonymous page cache and the cached users
+up to date on every write, wherever it comes from (views, admin, management
+commands).
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import feed, history, leaderboards
+from .auth import invalidate_user
+from .models import ActivityEvent, Comment, Follow, Game, Rating, RatingHistogram, UserSettings
+from .pagecache import purge_tags
+from .utils import update_followed_games
+
+KINDS = {
+    Rating: 'rating',
+    Comment: 'comment',
+    Follow: 'follow',
+}
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Follow)
+def activity_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    kind = KINDS[sender]
+    event = ActivityEvent.objects.create(
+        kind=kind,
+        user_id=instance.user_id,
+        game_id=instance.game_id,
+        value=instance.vote if kind == 'rating' else None,
+    )
+    leaderboards.record(kind, instance.game_id, instance.user_id)
+    if kind in feed.FEED_KINDS:
+        transaction.on_commit(lambda: feed.schedule_fan_out(event))
+
+
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Follow)
+def activity_deleted(sender, instance, **kwargs):
+    leaderboards.record(KINDS[sender], instance.game_id, instance.user_id, delta=-1)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def purge_rating_pages(sender, **kwargs):
+    transaction.on_commit(lambda: purge_tags('ratings'))
+
+
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+def purge_game_pages(sender, **kwargs):
+    transaction.on_commit(lambda: purge_tags('games'))
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_vote', None)
+    if created:
+        RatingHistogram.add_vote(instance.game_id, instance.vote)
+        history.record(instance.game_id, instance.vote)
+    elif previous is not None and previous != instance.vote:
+        RatingHistogram.add_vote(instance.game_id, previous, -1)
+        RatingHistogram.add_vote(instance.game_id, instance.vote)
+        history.record_many({(instance.game_id, previous): -1, (instance.game_id, instance.vote): 1})
+    instance._loaded_vote = instance.vote
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    RatingHistogram.add_vote(instance.game_id, instance.vote, -1)
+    history.record(instance.game_id, instance.vote, -1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserSettings)
+@receiver(post_delete, sender=UserSettings)
+def invalidate_cached_user_settings(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: update_followed_games(instance.user_id, instance.game_id, True))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: update_followed_games(instance.user_id, instance.game_id, False))
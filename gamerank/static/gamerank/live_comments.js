@@ -0,0 +1,28 @@
+// Live comments of the HTMX game page (see gamerank/live.py): listens to the
+// Server-Sent Events stream of the game and applies its HTML fragments.
+//   comment: a new comment, added at the top of #comment-list
+//   vote:    the new like/dislike counters, elements replaced by id
+(function () {
+    document.querySelectorAll('[data-live-comments]').forEach((element) => {
+        const source = new EventSource(element.dataset.liveComments);
+
+        source.addEventListener('comment', (event) => {
+            const list = document.getElementById('comment-list');
+            if (!list) return;
+            list.insertAdjacentHTML('afterbegin', event.data);
+            htmx.process(list.firstElementChild);  // The vote form of the new comment
+        });
+
+        source.addEventListener('vote', (event) => {
+            const template = document.createElement('template');
+            template.innerHTML = event.data;
+            template.content.querySelectorAll('[id]').forEach((fragment) => {
+                const target = document.getElementById(fragment.id);
+                if (target) {
+                    fragment.removeAttribute('hx-swap-oob');
+                    target.replaceWith(fragment);
+                }
+            });
+        });
+    });
+})();
@@ -0,0 +1,157 @@
+"""
+Static files pipeline used by collectstatic.
+
+On top of Django's manifest storage (content hash in every file name), it:
+  - subsets the Font Awesome webfonts to the icons our templates use
+    (needs fontTools, skipped otherwise),
+  - writes .gz and .br (needs brotli) variants of every hashed text file,
+    which PrecompressedStaticMiddleware serves with immutable cache headers.
+"""
+import functools
+import gzip
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # Only gzip variants are written
+    brotli = None
+
+
+@functools.cache
+def _font_subset():
+    """
+    Returns fontTools.subset, or None without fontTools (the full webfonts are
+    collected). Imported by collectstatic only: it takes longer to import than
+    the rest of the project and the {% static %} tag loads this module.
+    """
+    try:
+        from fontTools import subset
+    except ImportError:
+        return None
+    return subset
+
+
+COMPRESS_EXTENSIONS = (".css", ".js", ".svg", ".ttf", ".otf", ".ico", ".json", ".map", ".txt", ".html")
+COMPRESS_MIN_SIZE = 256
+
+FONTAWESOME_CSS = "fontawesome/css/all.min.css"
+FONTAWESOME_FONTS = "fontawesome/webfonts/"
+
+ICON_CLASS_RE = re.compile(r"\bfa-([a-z0-9-]+)")
+ICON_RULE_RE = re.compile(r'((?:\.fa-[a-z0-9-]+,?)+)\{--fa:"\\([0-9a-f]+)"')
+
+
+def used_icon_names():
+    """
+    Returns the Font Awesome icon names referenced by the project templates,
+    plus FONTAWESOME_EXTRA_ICONS for icons built dynamically.
+    """
+    template_dirs = [Path(d) for engine in settings.TEMPLATES for d in engine.get("DIRS", [])]
+    template_dirs += [Path(app.path) / "templates" for app in apps.get_app_configs()]
+
+    names = set(getattr(settings, "FONTAWESOME_EXTRA_ICONS", []))
+    for directory in template_dirs:
+        if not directory.is_dir():
+            continue
+        for path in directory.rglob("*.html"):
+            names.update(ICON_CLASS_RE.findall(path.read_text(encoding="utf-8")))
+    return names
+
+
+def icon_codepoints(css, names):
+    """
+    Maps icon names (including aliases such as sign-in-alt) to the codepoints
+    defined in the Font Awesome stylesheet.
+    """
+    codepoints = set()
+    for selectors, codepoint in ICON_RULE_RE.findall(css):
+        if any(selector[4:] in names for selector in selectors.split(",")):
+            codepoints.add(int(codepoint, 16))
+    return codepoints
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Same as Django's without the sourceMappingURL patterns: the vendored
+    # bootstrap files point to source maps that are not shipped.
+    patterns = (
+        ("*.css", (
+            r"""(?P<matched>url\(['"]{0,1}\s*(?P<url>.*?)["']{0,1}\))""",
+            (
+                r"""(?P<matched>@import\s*["']\s*(?P<url>.*?)["'])""",
+                """@import url("%(url)s")""",
+            ),
+        )),
+    )
+
+    def stored_name(self, name):
+        # Without a manifest (collectstatic has not run: development with
+        # DEBUG off, CI) the files keep their own names instead of raising
+        # "Missing staticfiles manifest entry"
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            self.subset_fontawesome(paths)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            for name in set(self.hashed_files.values()):
+                self.compress(name)
+
+    def subset_fontawesome(self, paths):
+        font_subset = _font_subset()
+        if font_subset is None or not getattr(settings, "FONTAWESOME_SUBSET", True):
+            return
+        if FONTAWESOME_CSS not in paths:
+            return
+
+        css = Path(self.path(FONTAWESOME_CSS)).read_text(encoding="utf-8")
+        codepoints = icon_codepoints(css, used_icon_names())
+
+        for name in paths:
+            if not name.startswith(FONTAWESOME_FONTS) or not name.endswith((".woff2", ".ttf")):
+                continue
+            if name.endswith(".woff2") and brotli is None:
+                continue  # WOFF2 output needs brotli
+
+            options = font_subset.Options()
+            options.flavor = "woff2" if name.endswith(".woff2") else None
+            options.layout_features = ["*"]
+            options.notdef_outline = True
+            options.ignore_missing_unicodes = True
+
+            path = self.path(name)
+            font = font_subset.load_font(path, options)
+            subsetter = font_subset.Subsetter(options)
+            subsetter.populate(unicodes=codepoints)
+            subsetter.subset(font)
+            font_subset.save_font(font, path, options)
+
+            # Hash and copy the subset font, not the original from the finders
+            paths[name] = (self, name)
+
+    def compress(self, name):
+        if not name.endswith(COMPRESS_EXTENSIONS):
+            return
+
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+
+        for suffix, compressed in variants.items():
+            # Only worth keeping if it is actually smaller
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
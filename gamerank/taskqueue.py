@@ -0,0 +1,221 @@
+"""
+Small persistent job queue stored in the database (the Task model).
+
+Slow work (imports, upstream API fetches, rebuilds, cache warming) is
+enqueued here and run by `manage.py run_tasks`, which executes the tasks
+in a pool of processes so that several of them use different cores.
+
+    enqueue('load_games', dedup_key='load_games')
+    enqueue('warm_thumbnails', kwargs={'widths': [400]}, delay=60)
+
+Tasks are plain functions registered with @register (see tasks.py). They
+receive the Task kwargs and can call set_progress() to report how far they
+got. A task that raises is retried with an exponential backoff until it has
+used max_attempts, then it is marked as failed.
+
+While a task runs, its worker updates Task.heartbeat every
+TASKS_HEARTBEAT_INTERVAL seconds (and so does set_progress). Only the tasks
+whose heartbeat is older than TASKS_STALE_TIMEOUT are taken for lost and
+given back to the queue, however long they have been running.
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+REGISTRY = {}
+
+# Id of the task being executed by this process (one task per process at a time)
+_current_task_id = None
+
+
+class TaskError(Exception):
+    pass
+
+
+def register(name=None, max_attempts=3):
+    """
+    Decorator that makes a function available as a task.
+    """
+    def decorator(func):
+        func.task_name = name or func.__name__
+        func.max_attempts = max_attempts
+        REGISTRY[func.task_name] = func
+        return func
+    return decorator
+
+
+def get_task_function(name):
+    from . import tasks  # noqa: F401 (registers the tasks)
+
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise TaskError(f"Unknown task: {name}")
+
+
+def enqueue(name, kwargs=None, dedup_key=None, run_at=None, delay=None, max_attempts=None):
+    """
+    Adds a task to the queue and returns it. If a pending or running task
+    already has the same dedup_key, that task is returned instead.
+    """
+    func = get_task_function(name)
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+
+    if dedup_key:
+        existing = Task.objects.filter(dedup_key=dedup_key, status__in=['pending', 'running']).first()
+        if existing:
+            return existing
+
+    try:
+        with transaction.atomic():
+            return Task.objects.create(
+                name=name,
+                kwargs=kwargs or {},
+                dedup_key=dedup_key or None,
+                run_at=run_at,
+                max_attempts=max_attempts or func.max_attempts,
+            )
+    except IntegrityError:
+        # Same dedup_key enqueued by a concurrent request in the meantime
+        return Task.objects.filter(dedup_key=dedup_key, status__in=['pending', 'running']).first()
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, limit):
+    """
+    Marks up to `limit` due tasks as running for this worker and returns them.
+    Every task is claimed with a conditional UPDATE, so two workers never
+    get the same task.
+    """
+    now = timezone.now()
+    candidates = (
+        Task.objects
+        .filter(status='pending', run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+    claimed = []
+    for task_id in list(candidates):
+        updated = Task.objects.filter(pk=task_id, status='pending').update(
+            status='running',
+            worker=worker,
+            started=now,
+            heartbeat=now,
+            progress=0,
+            progress_message='',
+            attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(task_id)
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def set_progress(percent, message=''):
+    """
+    Reports the progress (0-100) of the task being executed. Does nothing
+    when the function is not running as a task (e.g. called from a command).
+    """
+    if _current_task_id is None:
+        return
+    Task.objects.filter(pk=_current_task_id).update(
+        progress=max(0, min(100, int(percent))),
+        progress_message=message[:200],
+        heartbeat=timezone.now(),
+    )
+
+
+def heartbeat(worker, task_ids):
+    """
+    Records that the worker is still running these tasks.
+    """
+    return Task.objects.filter(pk__in=task_ids, status='running', worker=worker).update(
+        heartbeat=timezone.now(),
+    )
+
+
+def execute(task_id):
+    """
+    Runs a claimed task and records the result. Returns the final status
+    ('done', 'pending' when it will be retried, or 'failed').
+    """
+    global _current_task_id
+
+    task = Task.objects.get(pk=task_id)
+    _current_task_id = task.pk
+    try:
+        result = get_task_function(task.name)(**task.kwargs)
+    except Exception:
+        return fail(task, traceback.format_exc())
+    finally:
+        _current_task_id = None
+
+    Task.objects.filter(pk=task.pk).update(
+        status='done',
+        progress=100,
+        result=result,
+        finished=timezone.now(),
+    )
+    return 'done'
+
+
+def fail(task, error):
+    """
+    Schedules a retry of a failed task (after RETRY_DELAY * 2^(attempts-1)
+    seconds) or marks it as failed once it has used all its attempts.
+    """
+    if task.attempts < task.max_attempts:
+        delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+        Task.objects.filter(pk=task.pk).update(
+            status='pending',
+            run_at=timezone.now() + timedelta(seconds=delay),
+            last_error=error,
+        )
+        return 'pending'
+
+    Task.objects.filter(pk=task.pk).update(
+        status='failed',
+        last_error=error,
+        finished=timezone.now(),
+    )
+    return 'failed'
+
+
+def requeue_stale(timeout=None):
+    """
+    Gives back to the queue the tasks left running by a worker that died:
+    those without a heartbeat for `timeout` seconds.
+    """
+    timeout = timeout or settings.TASKS_STALE_TIMEOUT
+    limit = timezone.now() - timedelta(seconds=timeout)
+    stale = Task.objects.filter(
+        Q(heartbeat__lt=limit) | Q(heartbeat__isnull=True, started__lt=limit),
+        status='running',
+    )
+    count = 0
+    for task in stale:
+        fail(task, f"No heartbeat for {timeout}s (worker {task.worker} lost)")
+        count += 1
+    return count
+
+
+def purge_finished(days=None):
+    """
+    Deletes the tasks that finished (done or failed) more than `days` ago.
+    """
+    days = days if days is not None else settings.TASKS_KEEP_DAYS
+    limit = timezone.now() - timedelta(days=days)
+    deleted, _ = Task.objects.filter(status__in=['done', 'failed'], finished__lt=limit).delete()
+    return deleted
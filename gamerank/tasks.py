@@ -0,0 +1,157 @@
+"""
+Background tasks run by `manage.py run_tasks` (see taskqueue.py).
+Return values are stored as the task result, so they must be JSON-serializable.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from . import backups, dedup, feed, history, leaderboards, purge
+from .gamesapi import GAME_SOURCES, fetch_source, load_source
+from .importer import download_games_xml, import_game
+from .models import Game, RatingHistogram
+from .pagecache import purge_tags
+from .taskqueue import enqueue, register, set_progress
+from .thumbnails import ThumbnailError, evict_if_needed, get_thumbnail, is_allowed_source
+
+THUMBNAIL_BATCH_SIZE = 50
+
+
+@register()
+def load_games():
+    set_progress(0, "Downloading XML")
+    elements = download_games_xml()
+
+    dedup_index = dedup.DedupIndex.from_db()
+    created_count = 0
+    errors = []
+    for index, game_elem in enumerate(elements):
+        game, created, error = import_game(game_elem, index, dedup_index)
+        created_count += created
+        if error:
+            errors.append(error)
+        if index % 20 == 0:
+            set_progress(100 * index / len(elements), f"{index}/{len(elements)} games")
+
+    dedup_index.save()
+    purge_tags("games")
+    return {"processed": len(elements), "created": created_count, "errors": errors}
+
+
+@register()
+def refresh_games_api():
+    counts = {}
+    for index, source in enumerate(GAME_SOURCES):
+        set_progress(100 * index / len(GAME_SOURCES), f"Fetching {source}")
+        counts[source] = fetch_source(source)
+
+    set_progress(90, "Matching duplicates")
+    counts["new_aliases"] = dedup.update_aliases(
+        entry for source in GAME_SOURCES for entry in dedup.api_entries(source, load_source(source, refresh=False))
+    )
+    purge_tags("games")
+    return counts
+
+
+@register(max_attempts=1)
+def resolve_duplicates():
+    api_games = {source: load_source(source, refresh=False) for source in GAME_SOURCES}
+    entries, canonical = dedup.rebuild_aliases(api_games)
+    purge_tags("games")
+    return {"entries": entries, "games": canonical}
+
+
+@register(max_attempts=1)
+def rebuild_histograms():
+    return {"games": RatingHistogram.rebuild()}
+
+
+@register(max_attempts=1)
+def rebuild_leaderboards():
+    return {"counters": leaderboards.rebuild()}
+
+
+@register()
+def compact_leaderboards():
+    counters = leaderboards.compact()
+    leaderboards.schedule_compaction()
+    return {"counters": counters}
+
+
+@register()
+def rollup_rating_history():
+    rolled_up = history.rollup()
+    events, buckets = history.compact()
+    return {"events": rolled_up, "compacted_events": events, "compacted_buckets": buckets}
+
+
+@register()
+def fan_out_activity(event_id):
+    return {"inboxes": feed.fan_out(event_id)}
+
+
+@register()
+def purge_game(game_id):
+    return purge.purge_game(game_id)
+
+
+@register()
+def purge_user(user_id):
+    return purge.purge_user(user_id)
+
+
+@register(max_attempts=2)
+def snapshot_database(repeat=True):
+    """
+    Takes a snapshot of the database. With repeat, enqueues the next one
+    BACKUP_INTERVAL seconds later: enqueue it once to take them periodically.
+    """
+    if repeat:
+        # Enqueued first, so that a failed snapshot does not stop the next ones.
+        # Runs are aligned to the interval (e.g. on the hour), so retries and
+        # duplicate chains enqueue the same next run, which the dedup_key merges.
+        next_run = (int(time.time()) // settings.BACKUP_INTERVAL + 1) * settings.BACKUP_INTERVAL
+        enqueue(
+            "snapshot_database", kwargs={"repeat": True},
+            run_at=datetime.fromtimestamp(next_run, tz=dt_timezone.utc),
+            dedup_key=f"snapshot_database:{next_run}",
+        )
+
+    set_progress(0, "Copying the database")
+    manifest = backups.snapshot()
+    return {"id": manifest["id"], "size": manifest["size"], "new_bytes": manifest["new_bytes"]}
+
+
+@register()
+def warm_thumbnails(widths=None):
+    """
+    Splits the thumbnails of every game into batches, each one enqueued as
+    its own task so that the workers resize them in parallel.
+    """
+    urls = sorted(
+        url for url in Game.objects.exclude(thumbnail="").values_list("thumbnail", flat=True).distinct()
+        if is_allowed_source(url)
+    )
+    widths = [w for w in (widths or settings.THUMBNAIL_WIDTHS) if w in settings.THUMBNAIL_WIDTHS]
+
+    batches = 0
+    for start in range(0, len(urls), THUMBNAIL_BATCH_SIZE):
+        enqueue("warm_thumbnail_batch", kwargs={"urls": urls[start:start + THUMBNAIL_BATCH_SIZE], "widths": widths})
+        batches += 1
+    return {"images": len(urls), "batches": batches}
+
+
+@register()
+def warm_thumbnail_batch(urls, widths):
+    jobs = [(url, width, fmt) for url in urls for width in widths for fmt in ("webp", "jpeg")]
+    errors = []
+    for index, job in enumerate(jobs):
+        try:
+            get_thumbnail(*job)
+        except ThumbnailError as e:
+            errors.append(str(e))
+        set_progress(100 * (index + 1) / len(jobs), f"{index + 1}/{len(jobs)} thumbnails")
+
+    evict_if_needed()
+    return {"thumbnails": len(jobs) - len(errors), "errors": errors}
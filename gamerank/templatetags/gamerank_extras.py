@@ -0,0 +1,58 @@
+from urllib.parse import urlencode
+
+from django import template
+from django.urls import reverse
+
+from gamerank.fragments import SHARED_VARIABLES, get_fragment
+from gamerank.thumbnails import is_allowed_source, normalize_width
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(url, width=None):
+    """
+    Returns the local thumbnail URL for an external image, e.g.
+    {{ game.thumbnail|thumbnail_url:400 }}. Unknown hosts are left unchanged.
+    """
+    if not is_allowed_source(url):
+        return url
+    return f"{reverse('thumbnail')}?{urlencode({'src': url, 'w': normalize_width(width)})}"
+
+
+class FragmentNode(template.Node):
+
+    def __init__(self, template_name, extra_context):
+        self.template_name = template_name
+        self.extra_context = extra_context
+
+    def render(self, context):
+        values = {name: var.resolve(context) for name, var in self.extra_context.items()}
+
+        # Looked up once per page render, not once per card
+        cache = context.render_context.dicts[0].setdefault(self, {})
+        fragment = cache.get(self.template_name)
+        if fragment is None:
+            fragment = cache[self.template_name] = get_fragment(self.template_name)
+
+        if isinstance(fragment.template, template.Template):
+            with context.push(**values):
+                return fragment.template.render(context)
+        for name in SHARED_VARIABLES:
+            values.setdefault(name, context.get(name))
+        return fragment.render(values)
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Renders a fragment with Jinja2 or Django (see gamerank/fragments.py), e.g.
+    {% fragment "gamerank/includes/game_card.html" game=game %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2 or bits[1][0] not in "\"'" or bits[1][0] != bits[1][-1]:
+        raise template.TemplateSyntaxError(f"{bits[0]} takes a quoted template name")
+    extra_context = template.base.token_kwargs(bits[2:], parser, support_legacy=False)
+    if len(extra_context) != len(bits) - 2:
+        raise template.TemplateSyntaxError(f"{bits[0]} only takes name=value arguments after the template name")
+    return FragmentNode(bits[1][1:-1], extra_context)
@@ -1,3 +1,607 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import backups, compression, dedup, leaderboards, pagecache, profiler, purge, ratelimit, taskqueue, thumbnails
+from .middleware import CompressionMiddleware
+from .models import ActivityEvent, Comment, Follow, Game, LeaderboardEntry, Rating, RatingHistogram, Task
+from .utils import _followed_key, forget_followed_games, get_followed_games_ids
+
+
+def create_database(path, value):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE marker (value TEXT)")
+    connection.execute("INSERT INTO marker VALUES (?)", [value])
+    connection.commit()
+    connection.close()
+
+
+def read_marker(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT value FROM marker").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class BackupRotationTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        settings_override = override_settings(
+            BACKUP_DIR=self.tmp / "backups", BACKUP_KEEP_HOURLY=1, BACKUP_KEEP_DAILY=0,
+            BACKUP_CHUNK_SIZE=1024, BACKUP_STEP_PAUSE=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def old_snapshot(self, snapshot_id="20200101T000000Z"):
+        """
+        Stores a snapshot of a database holding "old", as snapshot() would.
+        """
+        path = self.tmp / f"{snapshot_id}.sqlite3"
+        create_database(path, "old")
+        chunks, sha256, _ = backups._store_chunks(path)
+        manifest = {"id": snapshot_id, "created": "", "size": path.stat().st_size, "sha256": sha256, "chunks": chunks}
+        backups._snapshots_dir().mkdir(parents=True, exist_ok=True)
+        (backups._snapshots_dir() / f"{snapshot_id}.json").write_text(json.dumps(manifest))
+        return manifest
+
+    def test_rotate_keeps_protected_snapshots(self):
+        old = self.old_snapshot()
+        self.old_snapshot("20200102T000000Z")
+
+        deleted, _ = backups.rotate(protect=[old["id"]])
+
+        self.assertEqual(deleted, 0)
+        self.assertEqual([m["id"] for m in backups.list_snapshots()], [old["id"], "20200102T000000Z"])
+
+    def test_rotate_deletes_unused_chunks(self):
+        old = self.old_snapshot()
+        self.old_snapshot("20200102T000000Z")
+        live = self.tmp / "live.sqlite3"
+        create_database(live, "other")
+        with mock.patch.object(backups, "database_path", return_value=live):
+            newest = backups.snapshot()
+
+        self.assertEqual([m["id"] for m in backups.list_snapshots()], [newest["id"]])
+        for digest in set(old["chunks"]) - set(newest["chunks"]):
+            self.assertFalse(backups._chunk_path(digest).exists())
+
+    def test_restore_keeps_the_restored_snapshot(self):
+        old = self.old_snapshot()
+        live = self.tmp / "live.sqlite3"
+        create_database(live, "new")
+
+        # The safety snapshot of the live database is the newest one, and
+        # with BACKUP_KEEP_HOURLY=1 the only one the retention keeps
+        with mock.patch.object(backups, "database_path", return_value=live):
+            call_command("restore_db", old["id"], "--noinput", stdout=mock.MagicMock())
+
+        self.assertEqual(read_marker(live), "old")
+        self.assertEqual(len(backups.list_snapshots()), 2)
+        for digest in old["chunks"]:
+            backups.check_chunk(digest)
+
+
+class FollowedGamesCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("follower")
+        cls.game = Game.objects.create(game_id="GAME-1", title="Game 1", genre="MMORPG", platform="PC (Windows)")
+        cls.other = Game.objects.create(game_id="GAME-2", title="Game 2", genre="Shooter", platform="Web Browser")
+
+    def setUp(self):
+        cache.clear()
+
+    def follow(self, game):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Follow.objects.create(user=self.user, game=game)
+
+    def test_follow_updates_the_cached_set(self):
+        self.assertEqual(list(get_followed_games_ids(self.user)), [])
+        self.follow(self.other)
+        self.follow(self.game)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(get_followed_games_ids(self.user)), [self.game.pk, self.other.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.get(game=self.game).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(list(get_followed_games_ids(self.user)), [self.other.pk])
+
+    def test_set_read_before_a_follow_is_not_used(self):
+        key = _followed_key(self.user.pk)
+        get_followed_games_ids(self.user)
+        generation, ids = cache.get(key)
+
+        # A request read the Follow table before the follow and stores the
+        # set after update_followed_games ran
+        self.follow(self.game)
+        cache.set(key, (generation, ids))
+
+        self.assertIn(self.game.pk, get_followed_games_ids(self.user))
+
+    def test_forget_drops_the_cached_set(self):
+        get_followed_games_ids(self.user)
+        Follow.objects.bulk_create([Follow(user=self.user, game=self.game)])
+        forget_followed_games(self.user.pk)
+
+        self.assertIn(self.game.pk, get_followed_games_ids(self.user))
+
+
+class CompressionPaddingTests(SimpleTestCase):
+    body = b"<p>Lorem ipsum dolor sit amet</p>" * 100
+
+    def test_gzip_is_padded(self):
+        bodies = [compression.compress(self.body, "gzip") for _ in range(10)]
+        self.assertGreater(len({len(body) for body in bodies}), 1)
+        for body in bodies:
+            self.assertEqual(gzip.decompress(body), self.body)
+
+    def test_gzip_stream_is_padded(self):
+        stream = compression.StreamCompressor("gzip")
+        data = stream.compress(self.body) + stream.compress(self.body) + stream.finish()
+        self.assertEqual(data[3], gzip.FNAME)
+        self.assertEqual(gzip.decompress(data), self.body * 2)
+
+    @override_settings(COMPRESSION_ENCODINGS=["br", "gzip"])
+    def test_pages_with_csrf_token_are_not_compressed_with_brotli(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="br, gzip")
+        get_token(request)
+        response = CompressionMiddleware(lambda request: HttpResponse(self.body))(request)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+
+@override_settings(STORAGES={
+    **settings.STORAGES, "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class UserPageTests(TestCase):
+    def test_ratings_of_deleted_games_are_not_counted(self):
+        user = User.objects.create_user("rater")
+        game = Game.objects.create(game_id="GAME-1", title="Game 1", genre="MMORPG", platform="PC (Windows)")
+        deleted = Game.objects.create(game_id="GAME-2", title="Game 2", genre="MMORPG", platform="PC (Windows)")
+        Rating.objects.create(user=user, game=game, vote=4)
+        Rating.objects.create(user=user, game=deleted, vote=0)
+        Game.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("user_page"))
+
+        self.assertEqual(response.context["num_ratings"], 1)
+        self.assertEqual(response.context["user_average"], 4)
+        self.assertEqual(response.context["rated_games"], [(game, 4)])
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("player")
+        cls.other_user = User.objects.create_user("other")
+        cls.game = Game.objects.create(game_id="GAME-1", title="Game 1", genre="MMORPG", platform="PC (Windows)")
+        cls.other = Game.objects.create(game_id="GAME-2", title="Game 2", genre="Shooter", platform="Web Browser")
+
+    def counters(self):
+        return {
+            (entry.board, entry.scope, entry.key): (entry.count_all, entry.count_day, entry.count_week)
+            for entry in LeaderboardEntry.objects.all()
+        }
+
+    def test_writes_count_in_every_scope(self):
+        Comment.objects.create(user=self.user, game=self.game, text="First")
+        Comment.objects.create(user=self.other_user, game=self.game, text="Second")
+        Rating.objects.create(user=self.user, game=self.other, vote=3)
+
+        for scope in ["all", "genre:MMORPG", "platform:PC (Windows)"]:
+            self.assertEqual(leaderboards.top("discussed", scope=scope), [(self.game, 2)])
+            self.assertEqual(leaderboards.top("discussed", "day", scope), [(self.game, 2)])
+        self.assertEqual(leaderboards.top("discussed", scope="genre:Shooter"), [])
+        self.assertEqual(leaderboards.top("rated", "week", "platform:Web Browser"), [(self.other, 1)])
+        self.assertEqual(
+            sorted(leaderboards.top("commenters"), key=lambda item: item[0].pk),
+            [(self.user, 1), (self.other_user, 1)],
+        )
+
+    def test_deletes_only_discount_the_all_time_counter(self):
+        comment = Comment.objects.create(user=self.user, game=self.game, text="First")
+        comment.delete()
+
+        self.assertEqual(self.counters()[("discussed", "all", str(self.game.pk))], (0, 1, 1))
+        self.assertEqual(leaderboards.top("discussed"), [])
+
+    def test_deletes_of_hidden_games_discount_their_scopes(self):
+        comment = Comment.objects.create(user=self.user, game=self.game, text="First")
+        Comment.objects.create(user=self.user, game=self.other, text="Second")
+        purge.schedule_game_deletion(self.game)
+
+        comment.delete()
+
+        counters = self.counters()
+        self.assertEqual(counters[("commenters", "genre:MMORPG", str(self.user.pk))][0], 0)
+        self.assertEqual(counters[("commenters", "platform:PC (Windows)", str(self.user.pk))][0], 0)
+        self.assertNotIn(("commenters", "genre:", str(self.user.pk)), counters)
+
+    def test_hidden_games_are_skipped(self):
+        for user in (self.user, self.other_user):
+            Follow.objects.create(user=user, game=self.game)
+        Follow.objects.create(user=self.user, game=self.other)
+        purge.schedule_game_deletion(self.game)
+
+        self.assertEqual(leaderboards.top("followed", limit=1), [(self.other, 1)])
+
+    def test_compact_drops_old_activity_from_the_windows(self):
+        Follow.objects.create(user=self.user, game=self.game)
+        Follow.objects.create(user=self.other_user, game=self.game)
+        ActivityEvent.objects.filter(user=self.user).update(date=timezone.now() - timedelta(days=2))
+
+        leaderboards.compact()
+
+        self.assertEqual(self.counters()[("followed", "all", str(self.game.pk))], (2, 1, 2))
+
+    def test_counters_match_a_rebuild(self):
+        rating = Rating.objects.create(user=self.user, game=self.game, vote=5)
+        Rating.objects.create(user=self.other_user, game=self.game, vote=1)
+        Follow.objects.create(user=self.user, game=self.other)
+        Comment.objects.create(user=self.user, game=self.other, text="First")
+        rating.delete()
+        leaderboards.compact()
+        counters = {key: value for key, value in self.counters().items() if any(value)}
+
+        leaderboards.rebuild()
+
+        self.assertEqual(counters, self.counters())
+
+    def test_compaction_is_scheduled_once_per_interval(self):
+        first = leaderboards.schedule_compaction()
+        second = leaderboards.schedule_compaction()
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Task.objects.filter(name="compact_leaderboards").count(), 1)
+        self.assertGreater(first.run_at, timezone.now())
+
+
+@override_settings(PURGE_BATCH_SIZE=2, PURGE_BATCH_PAUSE=0)
+class PurgeTests(TestCase):
+    """
+    The purge deletes in batches without signals and discounts the counters
+    itself: they must end up as if every row had been deleted one by one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"user{n}") for n in range(3)]
+        cls.games = [
+            Game.objects.create(game_id=f"GAME-{n}", title=f"Game {n}", genre="MMORPG", platform="PC (Windows)")
+            for n in range(3)
+        ]
+        for n, user in enumerate(cls.users):
+            for game in cls.games:
+                Rating.objects.create(user=user, game=game, vote=(n + game.pk) % 6)
+                Follow.objects.create(user=user, game=game)
+                Comment.objects.create(user=user, game=game, text="First")
+                Comment.objects.create(user=user, game=game, text="Second")
+
+    def counters(self):
+        return {
+            (entry.board, entry.scope, entry.key): entry.count_all
+            for entry in LeaderboardEntry.objects.filter(count_all__gt=0)
+        }
+
+    def histograms(self):
+        return {histogram.game_id: histogram.counts() for histogram in RatingHistogram.objects.all()}
+
+    def assertCountersMatchRebuild(self):
+        counters, histograms = self.counters(), self.histograms()
+        leaderboards.rebuild()
+        self.assertEqual(counters, self.counters())
+        self.assertEqual(histograms, {
+            game.pk: [Rating.objects.filter(game=game, vote=vote).count() for vote in range(6)]
+            for game in Game.objects.all()
+        })
+
+    def test_purge_user(self):
+        user = self.users[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.schedule_user_deletion(user)
+            deleted = purge.purge_user(user.pk)
+
+        self.assertEqual(deleted["comments"], 6)
+        self.assertEqual(deleted["ratings"], 3)
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(leaderboards.top("followed")[0][1], 2)
+        self.assertCountersMatchRebuild()
+
+    def test_purge_game(self):
+        game = self.games[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.schedule_game_deletion(game)
+            deleted = purge.purge_game(game.pk)
+
+        self.assertEqual(deleted["comments"], 6)
+        self.assertFalse(Game.all_objects.filter(pk=game.pk).exists())
+        self.assertEqual([count for _, count in leaderboards.top("commenters")], [4, 4, 4])
+        self.assertCountersMatchRebuild()
+
+
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate("6/m burst 10"), (0.1, 10))
+        self.assertEqual(ratelimit.parse_rate("2/s"), (2, 2))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate("6 per minute")
+
+    def test_bucket_allows_the_burst_then_refills(self):
+        bucket, now = None, 1000.0
+        for _ in range(3):
+            bucket, wait, timeout = ratelimit._take(bucket, 1, 3, now)
+            self.assertEqual(wait, 0)
+        self.assertEqual(timeout, 3)
+
+        empty, wait, _ = ratelimit._take(bucket, 1, 3, now + 0.25)
+        self.assertIsNone(empty)
+        self.assertEqual(wait, 0.75)
+
+        bucket, wait, _ = ratelimit._take(bucket, 1, 3, now + 1)
+        self.assertEqual((bucket, wait), ((0, now + 1), 0))
+        # Idle clients only get back up to the burst
+        bucket, _, _ = ratelimit._take(bucket, 1, 3, now + 100)
+        self.assertEqual(bucket, (2, now + 100))
+
+    @override_settings(RATE_LIMITS={"test": "1/s burst 2"})
+    def test_check_keeps_one_bucket_per_client(self):
+        with mock.patch.object(ratelimit.time, "time", return_value=1000.0):
+            self.assertEqual([ratelimit.check("test", "user:1") for _ in range(3)], [0, 0, 1])
+            self.assertEqual(ratelimit.check("test", "user:2"), 0)
+
+    @override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={"test": "1/m burst 1"})
+    def test_view_answers_429_with_retry_after(self):
+        view = ratelimit.rate_limit("test")(lambda request: HttpResponse("OK"))
+        request = RequestFactory().post("/", REMOTE_ADDR="10.0.0.1")
+        request.user = AnonymousUser()
+
+        self.assertEqual(view(request).status_code, 200)
+        response = view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        request.user = AnonymousUser()
+        self.assertEqual(view(request).status_code, 200)
+
+
+class DedupTests(TestCase):
+    def test_normalize_title(self):
+        self.assertEqual(dedup.normalize_title("The Lord of the Rings™: Online "), "lord of rings online")
+        self.assertEqual(dedup.normalize_title("Pokémon Unite"), "pokemon unite")
+        self.assertEqual(dedup.normalize_title("Guild Wars II"), "guild wars 2")
+
+    def test_variants_of_a_title_match(self):
+        index = dedup.DedupIndex()
+        index.add(dedup.Entry("local", "POE-1", "Path of Exile", "Grinding Gear Games", "2013-10-23"))
+
+        self.assertEqual(index.add(dedup.Entry("freetogame", 7, "PATH OF EXILE", "Grinding Gear Games")), "POE-1")
+        self.assertEqual(index.add(dedup.Entry("mmobomb", 12, "Path-of-Exile", "", "2013-10-23")), "POE-1")
+
+    def test_numbered_sequels_do_not_match(self):
+        index = dedup.DedupIndex()
+        index.add(dedup.Entry("local", "POE-1", "Path of Exile"))
+
+        self.assertEqual(index.add(dedup.Entry("freetogame", 8, "Path of Exile 2")), "freetogame:8")
+
+    def test_different_release_dates_keep_similar_titles_apart(self):
+        index = dedup.DedupIndex()
+        index.add(dedup.Entry("local", "WAR-1", "Warframe", "Digital Extremes", "2013-03-25"))
+
+        self.assertEqual(index.add(dedup.Entry("mmobomb", 3, "Warfare", "Other Studio", "2019-01-01")), "mmobomb:3")
+
+    def test_local_game_becomes_the_canonical_id(self):
+        dedup.update_aliases([dedup.Entry("freetogame", 7, "Path of Exile"), dedup.Entry("mmobomb", 12, "Path of Exile")])
+        self.assertEqual(set(dedup.canonical_ids(["freetogame", "mmobomb"]).values()), {"freetogame:7"})
+
+        dedup.update_aliases([dedup.Entry("local", "POE-1", "Path of Exile")])
+
+        self.assertEqual(dedup.canonical_ids(["freetogame", "mmobomb", "local"]), {
+            ("freetogame", "7"): "POE-1",
+            ("mmobomb", "12"): "POE-1",
+            ("local", "POE-1"): "POE-1",
+        })
+
+
+class GameIntegerKeyMigrationTests(TransactionTestCase):
+    """
+    Migrations 0010-0012: games keyed by their game_id slug get integer
+    keys, and every row that points to them follows.
+    """
+    before = [("gamerank", "0009_feed_items")]
+    after = [("gamerank", "0012_game_integer_id_contract")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_rows_follow_the_new_keys(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model("auth", "User").objects.create(username="player")
+        Game = apps.get_model("gamerank", "Game")
+        zeta = Game.objects.create(game_id="ZETA-1", title="Zeta", genre="MMORPG", platform="PC (Windows)")
+        alpha = Game.objects.create(game_id="ALPHA-1", title="Alpha", genre="Shooter", platform="Web Browser")
+        apps.get_model("gamerank", "Rating").objects.create(game=zeta, user=user, vote=4)
+        apps.get_model("gamerank", "Follow").objects.create(game=alpha, user=user)
+        apps.get_model("gamerank", "Comment").objects.create(game=zeta, user=user, text="First")
+        LeaderboardEntry = apps.get_model("gamerank", "LeaderboardEntry")
+        LeaderboardEntry.objects.create(board="rated", scope="all", key="ZETA-1", count_all=1)
+        LeaderboardEntry.objects.create(board="rated", scope="all", key="GONE-1", count_all=1)
+        LeaderboardEntry.objects.create(board="commenters", scope="all", key=str(user.pk), count_all=1)
+        apps.get_model("gamerank", "Task").objects.create(name="purge_game", kwargs={"game_id": "ALPHA-1"})
+
+        apps = self.migrate(self.after)
+
+        # Numbered in game_id order
+        ids = dict(apps.get_model("gamerank", "Game").objects.values_list("game_id", "pk"))
+        self.assertEqual(ids, {"ALPHA-1": 1, "ZETA-1": 2})
+        self.assertEqual(
+            list(apps.get_model("gamerank", "Rating").objects.values_list("game_id", "vote")), [(ids["ZETA-1"], 4)],
+        )
+        self.assertEqual(list(apps.get_model("gamerank", "Follow").objects.values_list("game_id", flat=True)), [ids["ALPHA-1"]])
+        self.assertEqual(list(apps.get_model("gamerank", "Comment").objects.values_list("game_id", flat=True)), [ids["ZETA-1"]])
+        self.assertEqual(
+            set(apps.get_model("gamerank", "LeaderboardEntry").objects.values_list("board", "key")),
+            {("rated", str(ids["ZETA-1"])), ("commenters", str(user.pk))},
+        )
+        self.assertEqual(apps.get_model("gamerank", "Task").objects.get().kwargs, {"game_id": ids["ALPHA-1"]})
+        histogram = apps.get_model("gamerank", "RatingHistogram").objects.get()
+        self.assertEqual((histogram.game_id, histogram.votes_4), (ids["ZETA-1"], 1))
+
+    def test_rows_written_after_the_backfill_are_caught_up(self):
+        apps = self.migrate([("gamerank", "0011_game_integer_id_backfill")])
+        user = apps.get_model("auth", "User").objects.create(username="player")
+        Game = apps.get_model("gamerank", "Game")
+        # The site still writes the old columns only
+        game = Game.objects.create(game_id="LATE-1", title="Late", genre="MMORPG", platform="PC (Windows)")
+        apps.get_model("gamerank", "Rating").objects.create(game=game, user=user, vote=2)
+        apps.get_model("gamerank", "LeaderboardEntry").objects.create(board="rated", scope="all", key="LATE-1")
+
+        apps = self.migrate(self.after)
+
+        game = apps.get_model("gamerank", "Game").objects.get()
+        self.assertEqual(apps.get_model("gamerank", "Rating").objects.get().game_id, game.pk)
+        self.assertEqual(apps.get_model("gamerank", "LeaderboardEntry").objects.get().key, str(game.pk))
+
+
+class ProfilerTests(TestCase):
+    async def test_queries_of_other_threads_are_recorded(self):
+        def count_games():
+            try:
+                return threading.get_ident(), Game.objects.count()
+            finally:
+                close_old_connections()
+
+        profiler.enable()
+        with profiler.RequestProfile(RequestFactory().get("/"), is_async=True) as profile:
+            thread_id, _ = await sync_to_async(count_games, thread_sensitive=False)()
+        await sync_to_async(count_games, thread_sensitive=False)()
+
+        self.assertNotEqual(thread_id, threading.get_ident())
+        self.assertEqual(len(profile.recorder.queries), 1)
+        self.assertIn("COUNT", profile.recorder.queries[0]["sql"])
+
+
+@override_settings(PAGE_CACHE_SYNC_WAIT=0.1)
+class PageCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+
+        @pagecache.cache_anonymous_page(tags=("games",))
+        def view(request):
+            self.renders += 1
+            return HttpResponse(f"render {self.renders}")
+
+        self.view = view
+
+    def get(self):
+        request = RequestFactory().get("/games/")
+        request.user = AnonymousUser()
+        return request
+
+    def hold_lock(self):
+        # Another request is rendering the page
+        key, _ = pagecache._page_keys(self.get(), ("games",))
+        cache.add(key + ":lock", 1)
+
+    def test_hit_after_miss(self):
+        self.assertEqual(self.view(self.get())["X-Page-Cache"], "miss")
+        response = self.view(self.get())
+        self.assertEqual((response["X-Page-Cache"], response.content), ("hit", b"render 1"))
+
+    def test_stale_copy_is_served_while_another_request_renders(self):
+        self.view(self.get())
+        pagecache.purge_tags("games")
+        self.hold_lock()
+
+        response = self.view(self.get())
+
+        self.assertEqual((response["X-Page-Cache"], response.content), ("stale", b"render 1"))
+        self.assertEqual(self.renders, 1)
+
+    def test_sync_wait_is_short(self):
+        self.hold_lock()
+
+        start = time.monotonic()
+        response = self.view(self.get())
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((response["X-Page-Cache"], response.content), ("miss", b"render 1"))
+
+
+class ThumbnailTests(SimpleTestCase):
+    @override_settings(THUMBNAIL_MAX_SOURCE_BYTES=100)
+    def test_sources_over_the_limit_are_not_downloaded(self):
+        response = mock.Mock(headers={})
+        response.iter_content.return_value = [b"x" * 60, b"x" * 40]
+        self.assertEqual(thumbnails._read_limited(response, "url"), b"x" * 100)
+
+        response.iter_content.return_value = [b"x" * 60, b"x" * 60, b"x" * 60]
+        with self.assertRaises(thumbnails.ThumbnailError):
+            thumbnails._read_limited(response, "url")
+
+        # Refused from the headers, before reading anything
+        response = mock.Mock(headers={"Content-Length": "101"})
+        with self.assertRaises(thumbnails.ThumbnailError):
+            thumbnails._read_limited(response, "url")
+        response.iter_content.assert_not_called()
+
+    def test_decompression_bombs_are_rejected(self):
+        Image = thumbnails._pil_image()
+        if Image is None:
+            self.skipTest("Pillow is not installed")
+        out = io.BytesIO()
+        Image.new("L", (100, 100)).save(out, "PNG")
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            with self.assertRaises(thumbnails.ThumbnailError):
+                thumbnails._resize(out.getvalue(), 200, "jpeg")
+
+
+class TaskQueueTests(TestCase):
+    def test_only_tasks_without_a_recent_heartbeat_are_requeued(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        alive = Task.objects.create(name="load_games", status="running", attempts=1, started=long_ago,
+                                    worker="host:1")
+        lost = Task.objects.create(name="load_games", status="running", attempts=1, started=long_ago,
+                                   worker="host:2", heartbeat=long_ago)
+        self.assertEqual(taskqueue.heartbeat("host:1", [alive.pk, lost.pk]), 1)
+
+        self.assertEqual(taskqueue.requeue_stale(timeout=60), 1)
+        self.assertEqual(Task.objects.get(pk=alive.pk).status, "running")
+        self.assertEqual(Task.objects.get(pk=lost.pk).status, "pending")
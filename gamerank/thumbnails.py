@@ -0,0 +1,268 @@
+"""
+Local cache for game thumbnails.
+
+Every remote thumbnail is downloaded once, resized to one of the widths in
+THUMBNAIL_WIDTHS and stored on disk under a name derived from a SHA-256 hash
+of (source URL, width, format). The cache is bounded by
+THUMBNAIL_CACHE_MAX_BYTES: files are touched on every hit and the least
+recently used ones are removed when the limit is exceeded.
+
+Concurrent requests for the same variant, or for variants of the same
+original, wait for each other instead of doing the work twice: each hash
+maps to one of a fixed pool of locks (one pool for the variants, one for
+the originals, always taken in that order).
+"""
+import functools
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+
+CONTENT_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+}
+
+LOCK_STRIPES = 64
+_variant_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_original_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_cache_size = None
+_cache_size_guard = threading.Lock()
+
+
+class ThumbnailError(Exception):
+    """Raised when a thumbnail cannot be downloaded or decoded."""
+
+
+@functools.cache
+def _pil_image():
+    """
+    Returns PIL.Image, or None without Pillow (originals are then served
+    unchanged). Imported on the first cache miss, not when the worker starts.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def cache_dir():
+    return Path(settings.THUMBNAIL_CACHE_DIR)
+
+
+def is_allowed_source(url):
+    """
+    Only thumbnails from the known game APIs are proxied, so the endpoint
+    cannot be used as an open proxy.
+    """
+    parsed = urlparse(url or "")
+    return parsed.scheme in ("http", "https") and parsed.hostname in settings.THUMBNAIL_ALLOWED_HOSTS
+
+
+def normalize_width(value):
+    """
+    Returns the requested width if it is one of the configured sizes,
+    otherwise the default (middle) size.
+    """
+    widths = settings.THUMBNAIL_WIDTHS
+    try:
+        width = int(value)
+    except (TypeError, ValueError):
+        width = None
+    return width if width in widths else widths[len(widths) // 2]
+
+
+def cache_key(url, width, fmt):
+    return hashlib.sha256(f"{url}|{width}|{fmt}".encode("utf-8")).hexdigest()
+
+
+def _striped_lock(locks, digest):
+    return locks[int(digest[:8], 16) % len(locks)]
+
+
+def _url_digest(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _original_path(url):
+    digest = _url_digest(url)
+    return cache_dir() / "originals" / digest[:2] / digest
+
+
+def _variant_path(key, fmt):
+    return cache_dir() / "variants" / key[:2] / f"{key}.{fmt}"
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    _add_to_cache_size(len(data))
+
+
+def _fetch_original(url):
+    """
+    Returns the bytes of the original image, downloading it only if it is not
+    already stored in the cache.
+    """
+    path = _original_path(url)
+    with _striped_lock(_original_locks, _url_digest(url)):
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            pass
+
+        import requests  # Heavy and only needed on a cache miss
+
+        try:
+            with requests.get(url, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                data = _read_limited(response, url)
+        except requests.RequestException as e:
+            raise ThumbnailError(f"Error downloading {url}: {e}") from e
+
+        _write_atomic(path, data)
+        return data
+
+
+def _read_limited(response, url):
+    """
+    Reads the body of a streamed response, giving up as soon as it goes over
+    THUMBNAIL_MAX_SOURCE_BYTES (whatever the Content-Length says).
+    """
+    limit = settings.THUMBNAIL_MAX_SOURCE_BYTES
+    if int(response.headers.get("Content-Length") or 0) > limit:
+        raise ThumbnailError(f"Image too large: {url}")
+    chunks, size = [], 0
+    for chunk in response.iter_content(64 * 1024):
+        size += len(chunk)
+        if size > limit:
+            raise ThumbnailError(f"Image too large: {url}")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _sniff_format(data):
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"GIF8"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "jpeg"
+
+
+def _resize(data, width, fmt):
+    Image = _pil_image()
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail((width, width * 4))
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            if fmt == "jpeg" and img.mode == "RGBA":
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            if fmt == "webp":
+                img.save(out, "WEBP", quality=80, method=4)
+            else:
+                img.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+            return out.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # DecompressionBombError: more pixels than Image.MAX_IMAGE_PIXELS,
+        # a small file that would take gigabytes once decoded
+        raise ThumbnailError(f"Error resizing image: {e}") from e
+
+
+def get_thumbnail(url, width, fmt="jpeg"):
+    """
+    Returns (path, content_type, key) of the cached variant for the given
+    source URL, creating it on a cache miss.
+
+    Without Pillow the original image is stored and served as it is.
+    """
+    if _pil_image() is None:
+        fmt = "orig"
+
+    key = cache_key(url, width, fmt)
+
+    with _striped_lock(_variant_locks, key):
+        for path in _variant_path(key, fmt).parent.glob(f"{key}.*"):
+            os.utime(path)
+            return path, CONTENT_TYPES[path.suffix[1:]], key
+
+        original = _fetch_original(url)
+        if _pil_image() is None:
+            data, ext = original, _sniff_format(original)
+        else:
+            data, ext = _resize(original, width, fmt), fmt
+
+        path = _variant_path(key, ext)
+        _write_atomic(path, data)
+
+    evict_if_needed()
+    return path, CONTENT_TYPES[ext], key
+
+
+def _cached_files():
+    root = cache_dir()
+    if not root.exists():
+        return []
+    files = []
+    for path in root.rglob("*"):
+        if path.is_file() and not path.name.startswith("."):
+            st = path.stat()
+            files.append((st.st_mtime, st.st_size, path))
+    return files
+
+
+def _add_to_cache_size(nbytes):
+    global _cache_size
+    with _cache_size_guard:
+        if _cache_size is None:
+            _cache_size = sum(size for _, size, _ in _cached_files())
+        else:
+            _cache_size += nbytes
+
+
+def evict_if_needed():
+    """
+    Removes the least recently used files until the cache is back under 90% of
+    THUMBNAIL_CACHE_MAX_BYTES. The directory is only scanned when the running
+    size estimate goes over the limit.
+    """
+    global _cache_size
+    limit = settings.THUMBNAIL_CACHE_MAX_BYTES
+
+    with _cache_size_guard:
+        if _cache_size is not None and _cache_size <= limit:
+            return 0
+
+        files = sorted(_cached_files(), key=lambda f: f[0])
+        total = sum(size for _, size, _ in files)
+        target = int(limit * 0.9)
+        removed = 0
+
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        _cache_size = total
+        return removed
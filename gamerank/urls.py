@@ -22,13 +22,22 @@ urlpatterns = [
 
     # JSON
     path("game/<str:game_id>.json", views.game_json, name="game_json"),
+    path("game/<str:game_id>/history.json", views.game_history, name="game_history"),
 
     # HTMX
     path("game/<str:game_id>/htmx/", views.game_detail_htmx, name="game_detail_htmx"),
     path("game/<str:game_id>/htmx/comments/", views.comments_htmx, name="comments_htmx"),
     path("game/<str:game_id>/htmx/comment/", views.post_comment_htmx, name="post_comment_htmx"),
     path("game/<str:game_id>/htmx/follow/", views.follow_game_htmx, name="follow_game_htmx"),
+    path("game/<str:game_id>/htmx/stream/", views.comments_stream, name="comments_stream"),
+
+    # RANKINGS AND ACTIVITY
+    path("leaderboards/", views.leaderboards_page, name="leaderboards"),
+    path("activity/", views.activity_feed, name="activity_feed"),
+    path("feed/", views.updates_feed, name="updates_feed"),
 
     # EXTRAS
     path("games/api/", views.unified_games_api, name="games_api"),
+    path("thumbnail/", views.thumbnail, name="thumbnail"),
+    path("profiles/<str:name>", views.profile_file, name="profile_file"),
 ]
\ No newline at end of file
@@ -1,37 +1,156 @@
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
 from django.shortcuts import redirect
-from .models import Follow, Comment
+from .models import Follow, Comment, Game
 
-def process_following(request, games, redirect_to):
+def process_following(request, redirect_to):
     """
-    Processes the actions of following or unfollowing games for a user.
+    Processes the actions of following or unfollowing games for a user
+    (the Follow_<game_id> and Unfollow_<game_id> buttons of the listings,
+    with the slug of the game)
     Returns a redirect if any button was clicked, or None if nothing was done.
     """
     if request.method == 'POST':
-        for game in games:
-            if f"Follow_{game.game_id}" in request.POST:
-                Follow.objects.get_or_create(user=request.user, game=game)
+        for name in request.POST:
+            action, _, game_id = name.partition('_')
+            if action == 'Follow' and game_id:
+                game = Game.objects.filter(game_id=game_id).first()
+                if game:
+                    Follow.objects.get_or_create(user=request.user, game=game)
                 return redirect(redirect_to)
-            elif f"Unfollow_{game.game_id}" in request.POST:
-                Follow.objects.filter(user=request.user, game=game).delete()
+            elif action == 'Unfollow' and game_id:
+                Follow.objects.filter(user=request.user, game__game_id=game_id).delete()
                 return redirect(redirect_to)
     return None
 
 
+class FollowedGames:
+    """
+    Read-only set of the ids (primary keys) of the games followed by a user,
+    stored as a sorted tuple
+    (compact to cache and pickle) and checked with a binary search.
+    """
+    __slots__ = ('ids',)
+
+    def __init__(self, ids):
+        self.ids = tuple(ids)
+
+    def __contains__(self, game_id):
+        i = bisect_left(self.ids, game_id)
+        return i < len(self.ids) and self.ids[i] == game_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _followed_key(user_id):
+    # v3: (generation, primary keys); v2 had no generation, v1 the game_id slugs
+    return f"follows:v3:{user_id}"
+
+
+def _new_generation(key):
+    # Starts from the clock, so that a generation counter evicted from the
+    # cache does not count again through the values of the cached entries
+    cache.add(key + ':gen', time.time_ns(), settings.FOLLOWED_GAMES_CACHE_TIMEOUT)
+
+
+def _bump_generation(key):
+    """
+    Increments the generation of a cached set and returns the new one.
+    """
+    try:
+        return cache.incr(key + ':gen')
+    except ValueError:
+        _new_generation(key)
+        return cache.incr(key + ':gen')
+
+
 def get_followed_games_ids(user):
     """
-    Returns a set of game IDs that the user is currently following.
+    Returns the set of game ids (primary keys) that the user is currently following.
+    The set is cached per user and kept up to date by update_followed_games,
+    so listing pages do not read the Follow table.
+
+    The cache entry is (generation, ids). Every change of the follows bumps
+    the generation, so an entry built from the Follow table before a change,
+    and stored after it, is never used.
+    """
+    key = _followed_key(user.pk)
+    cached = cache.get_many([key, key + ':gen'])
+    generation = cached.get(key + ':gen')
+    if generation is None:
+        _new_generation(key)
+        generation = cache.get(key + ':gen')
+    entry = cached.get(key)
+    if entry is not None and entry[0] == generation:
+        return FollowedGames(entry[1])
+
+    # The generation is read before the query: a change committed after it
+    # bumps it and makes this entry stale
+    ids = tuple(Follow.objects.filter(user=user).order_by('game_id').values_list('game_id', flat=True))
+    cache.set(key, (generation, ids), settings.FOLLOWED_GAMES_CACHE_TIMEOUT)
+    return FollowedGames(ids)
+
+
+def update_followed_games(user_id, game_id, followed):
+    """
+    Adds or removes one game in the cached set of a user, after the change
+    is committed. The entry is only patched if it is the one of the previous
+    generation; otherwise another change came first (or the entry is stale)
+    and it is rebuilt from the Follow table on the next read.
+    """
+    key = _followed_key(user_id)
+    generation = _bump_generation(key)
+    entry = cache.get(key)
+    if entry is None or entry[0] != generation - 1:
+        return
+    ids = list(entry[1])
+    i = bisect_left(ids, game_id)
+    present = i < len(ids) and ids[i] == game_id
+    if followed and not present:
+        insort(ids, game_id)
+    elif not followed and present:
+        del ids[i]
+    # Written after a newer change, this entry has an old generation and is ignored
+    cache.set(key, (generation, tuple(ids)), settings.FOLLOWED_GAMES_CACHE_TIMEOUT)
+
+
+def forget_followed_games(*user_ids):
+    """
+    Invalidates the cached sets of users, after their follows are changed in bulk.
     """
-    return set(
-        Follow.objects.filter(user=user).values_list('game_id', flat=True)
+    for user_id in set(user_ids):
+        _bump_generation(_followed_key(user_id))
+
+
+def _comments_with_votes_queryset(game):
+    return (
+        Comment.objects.filter(game=game, user__is_active=True)
+        .select_related('user')
+        .annotate(
+            num_likes=Count('votes', filter=Q(votes__type='like')),
+            num_dislikes=Count('votes', filter=Q(votes__type='dislike')),
+        )
     )
 
 
 def comments_with_votes(game):
     """
     Returns a list of comments for the game with num_likes and num_dislikes preprocessed.
+    The counters are annotated so the whole list is loaded in a single query.
+    """
+    return list(_comments_with_votes_queryset(game))
+
+
+async def acomments_with_votes(game):
+    """
+    Async version of comments_with_votes, used by the async HTMX views.
     """
-    comments = Comment.objects.filter(game=game)
-    for c in comments:
-        c.num_likes = c.num_likes()
-        c.num_dislikes = c.num_dislikes()
-    return comments
+    return [c async for c in _comments_with_votes_queryset(game)]
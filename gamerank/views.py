@@ -1,21 +1,29 @@
-import os
-import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, get_object_or_404, redirect
-from django.template.loader import render_to_string
+from django.middleware.csrf import get_token
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.utils import timezone
-from django.db.models import Avg
-from django.http import JsonResponse, HttpResponse
+from django.db.models import Avg, Count, F, Q
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, Http404, FileResponse, StreamingHttpResponse
 from django.views.decorators.http import require_GET, require_POST
-from .utils import process_following, get_followed_games_ids, comments_with_votes
+from .utils import process_following, get_followed_games_ids, comments_with_votes, acomments_with_votes
+from .pagecache import cache_anonymous_page
+from .ratelimit import rate_limit
+from .live import subscribe, publish_comment, publish_votes, apublish_comment, apublish_votes, format_event
+from .dedup import canonical_ids, normalize_title
+from .gamesapi import load_source
+from .profiler import PROFILE_NAME_RE, profile_dir
+from .thumbnails import get_thumbnail, is_allowed_source, normalize_width, ThumbnailError
 from finalgamerank import settings
-from .models import Game, Comment, Rating, Follow, UserSettings, CommentVote
-
-import requests
+from .models import Game, Comment, Rating, Follow, UserSettings, CommentVote, ActivityEvent, LeaderboardEntry
+from . import feed, fragments, history, leaderboards, listing, live
 
 
 def register(request):
@@ -34,43 +42,55 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
+# Sort options of the home ranking -> annotation of Game.objects.with_rating_stats()
+HOME_SORTS = {
+    "score": "score",
+    "votes": "num_votes",
+    "five_star": "five_star_pct",
+}
+
+
+@cache_anonymous_page(tags=("games", "ratings"))
 def home(request):
     """
-    Main page that shows games ordered by average rating (descending).
+    Main page that shows games ordered by average rating (descending), or by
+    number of votes / percentage of 5-star votes with ?sort=votes|five_star.
     If there is a POST from follow/unfollow buttons, it is processed and redirected.
     If the user is authenticated, it marks which games are currently followed.
     """
-    games = list(Game.objects.all())
-    games.sort(key=lambda g: g.average_rating() or 0, reverse=True)
+    sort = request.GET.get("sort", "score")
+    if sort not in HOME_SORTS:
+        sort = "score"
 
     followed_ids = set()
 
     if request.user.is_authenticated:
         # Process follow/unfollow action if there is POST
-        response = process_following(request, games, "home")
+        response = process_following(request, "home")
         if response:
             return response
 
         # Retrieve followed games to mark active buttons
         followed_ids = get_followed_games_ids(request.user)
 
-        for game in games:
-            game.followed = game.game_id in followed_ids
+    games = listing.home_cards((F(HOME_SORTS[sort]).desc(nulls_last=True), "game_id"), followed_ids)
 
     return render(request, 'gamerank/home.html', {
         'games': games,
         'followed_ids': followed_ids,
+        'sort': sort,
     })
 
 
 @login_required()
+@rate_limit("game_detail")
 def game_detail(request, game_id):
     """
     Shows the detail page for a game with its detailed information, comments and form
     to rate, comment and follow/unfollow. Only available for authenticated users.
     """
     # Find the game by its ID or raise 404 if it does not exist
-    game = get_object_or_404(Game, game_id=game_id)
+    game = get_object_or_404(Game.objects.select_related('histogram'), game_id=game_id)
 
     # Load comments for the game with like/dislike counters already calculated
     comments = comments_with_votes(game)
@@ -90,12 +110,13 @@ def game_detail(request, game_id):
             # 1. Add a comment
             text = request.POST.get("comment_text", "").strip()
             if text:
-                Comment.objects.create(
+                comment = Comment.objects.create(
                     game=game,
                     user=request.user,
                     text=text,
                     date=timezone.now()
                 )
+                publish_comment(comment)
                 return redirect("game_detail", game_id=game_id)
 
             # 2. Rate (only if the user has not rated before)
@@ -142,14 +163,14 @@ def user_page(request):
     """
     user = request.user
 
-    # User ratings
-    user_ratings = Rating.objects.filter(user=user)
+    # User ratings, without the games scheduled for deletion (hidden by Game.objects)
+    user_ratings = Rating.objects.filter(user=user, game__deleted_at__isnull=True)
     num_ratings = user_ratings.count()
     user_average = user_ratings.aggregate(average=Avg('vote'))['average']
     user_average = round(user_average, 2) if user_average is not None else None
 
     # User comments
-    user_comments = Comment.objects.filter(user=user).select_related('game')
+    user_comments = Comment.objects.filter(user=user, game__deleted_at__isnull=True).select_related('game')
     num_user_comments = user_comments.count()
 
     # Rated games with score
@@ -175,28 +196,14 @@ def rated_games(request):
     Shows the games rated by the user, ordered by the rating.
     Allows follow/unfollow directly from this view.
     """
-    ratings = Rating.objects.filter(user=request.user).select_related('game')
-    games = []
-
-    for r in ratings:
-        game = r.game
-        game.my_vote = r.vote
-        game.score = game.average_rating()
-        game.total_votes = game.total_votes()
-        games.append(game)
-
-    games.sort(key=lambda g: g.my_vote, reverse=True)
-
     # Process follow/unfollow action if there is POST
-    response = process_following(request, games, "home")
+    response = process_following(request, "home")
     if response:
         return response
 
     # Retrieve followed games to mark active buttons
     followed_ids = get_followed_games_ids(request.user)
-
-    for game in games:
-        game.followed = game.game_id in followed_ids
+    games = listing.rated_cards(request.user, followed_ids)
 
     return render(request, 'gamerank/rated_games.html', {
         'games': games,
@@ -210,20 +217,14 @@ def followed_games(request):
     Shows the games that the user follows, ordered by average rating.
     Allows unfollow directly from this view.
     """
-    follows = Follow.objects.filter(user=request.user).select_related('game')
-    games = [f.game for f in follows]
-    games.sort(key=lambda g: g.average_rating() or 0, reverse=True)
-
     # Process follow/unfollow action if there is POST
-    response = process_following(request, games, "followed_games")
+    response = process_following(request, "followed_games")
     if response:
         return response  # Nothing else should go here
 
     # Retrieve followed games to mark active buttons
     followed_ids = get_followed_games_ids(request.user)
-
-    for game in games:
-        game.followed = game.game_id in followed_ids
+    games = listing.followed_cards(request.user, followed_ids)
 
     return render(request, 'gamerank/followed_games.html', {
         'games': games,
@@ -255,6 +256,7 @@ def settings_page(request):
 
 
 @login_required
+@rate_limit("vote")
 def vote_comment(request, comment_id):
     """
     Allows a user to like or dislike a comment.
@@ -269,6 +271,11 @@ def vote_comment(request, comment_id):
             comment=comment,
             defaults={'type': vote_type}
         )
+        counts = comment.votes.aggregate(
+            num_likes=Count('id', filter=Q(type='like')),
+            num_dislikes=Count('id', filter=Q(type='dislike')),
+        )
+        publish_votes(comment, counts['num_likes'], counts['num_dislikes'])
 
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
@@ -276,11 +283,13 @@ def vote_comment(request, comment_id):
 @require_GET
 def game_json(request, game_id):
     """
-    Returns the data of a game in JSON format, including number of comments.
+    Returns the data of a game in JSON format, including number of comments
+    and the number of votes of each value (0-5).
     """
-    game = get_object_or_404(Game, game_id=game_id)
+    game = get_object_or_404(Game.objects.select_related('histogram'), game_id=game_id)
     comments_count = Comment.objects.filter(game=game).count()
     average_rating = game.average_rating()
+    distribution = game.rating_distribution()
 
     data = {
         "game_id": game.game_id,
@@ -294,18 +303,114 @@ def game_json(request, game_id):
         "game_url": game.game_url,
         "thumbnail": game.thumbnail,
         "average_rating": round(average_rating, 2) if average_rating is not None else None,
+        "total_votes": sum(count for _, count, _ in distribution),
+        "rating_histogram": {str(vote): count for vote, count, _ in reversed(distribution)},
         "comments_count": comments_count
     }
 
     return JsonResponse(data)
 
 
+@require_GET
+def game_history(request, game_id):
+    """
+    Returns the rating history of a game for charts: one point per day or
+    week (?period=day|week, ?days=N for the last N days only) with the votes
+    added in it and the total votes and average rating at its end.
+    """
+    game = get_object_or_404(Game.objects.select_related('histogram'), game_id=game_id)
+    period = request.GET.get("period", "day")
+    if period not in history.PERIODS:
+        return JsonResponse({"error": "period must be 'day' or 'week'"}, status=400)
+
+    since = None
+    days = request.GET.get("days", "")
+    if days.isdigit():
+        since = timezone.localdate() - timedelta(days=int(days))
+
+    return JsonResponse({
+        "game_id": game.game_id,
+        "period": period,
+        "series": history.series(game, period, since),
+    })
+
+
+def leaderboards_page(request):
+    """
+    Shows the leaderboards for a time window (24h, 7 days or all time),
+    optionally restricted to a genre or a platform.
+    """
+    window = request.GET.get("window", "all")
+    if window not in leaderboards.WINDOWS:
+        window = "all"
+
+    genre = request.GET.get("genre", "").strip()
+    platform = request.GET.get("platform", "").strip()
+    scope = f"genre:{genre}" if genre else f"platform:{platform}" if platform else "all"
+
+    boards = [
+        (label, board, leaderboards.top(board, window, scope))
+        for board, label in LeaderboardEntry.BOARD_CHOICES
+    ]
+
+    return render(request, "gamerank/leaderboards.html", {
+        "boards": boards,
+        "window": window,
+        "genre": genre,
+        "platform": platform,
+        "genres": Game.objects.order_by("genre").values_list("genre", flat=True).distinct(),
+        "platforms": Game.objects.order_by("platform").values_list("platform", flat=True).distinct(),
+    })
+
+
+def activity_feed(request):
+    """
+    Global feed of the latest ratings, comments and follows.
+    Uses keyset pagination: ?before=<id> returns the events older than that one.
+    """
+    page_size = 30
+    events = (
+        ActivityEvent.objects
+        .filter(user__is_active=True, game__deleted_at__isnull=True)
+        .select_related("user", "game")
+        .order_by("-id")
+    )
+
+    before = request.GET.get("before")
+    if before and before.isdigit():
+        events = events.filter(id__lt=int(before))
+
+    events = list(events[:page_size + 1])
+    next_before = events[page_size - 1].id if len(events) > page_size else None
+
+    return render(request, "gamerank/activity.html", {
+        "events": events[:page_size],
+        "next_before": next_before,
+    })
+
+
+@login_required
+def updates_feed(request):
+    """
+    New comments and ratings on the games the user follows (see feed.py).
+    Uses keyset pagination: ?before=<id> returns the events older than that one.
+    """
+    before = request.GET.get("before")
+    before = int(before) if before and before.isdigit() else None
+    events, next_before = feed.updates(request.user, before, settings.FEED_PAGE_SIZE)
+
+    return render(request, "gamerank/feed.html", {
+        "events": events,
+        "next_before": next_before,
+    })
+
+
 @login_required
 def game_detail_htmx(request, game_id):
     """
     Main page with HTMX. Loads dynamic sections (comments + form).
     """
-    game = get_object_or_404(Game, game_id=game_id)
+    game = get_object_or_404(Game.objects.select_related('histogram'), game_id=game_id)
     followed = game.follow_set.filter(user=request.user).exists()
     user_rating = Rating.objects.filter(game=game, user=request.user).first()
 
@@ -318,139 +423,198 @@ def game_detail_htmx(request, game_id):
         "user_rating": user_rating,
         "rating_range": range(1, 6),
         "comments": comments,
+        "live_updates": live.is_supported(request),
     })
 
 
+def render_fragment(request, template_name, context):
+    """
+    Renders an HTMX fragment without running the context processors, so the
+    async views do not touch the database while rendering. The CSRF token is
+    passed explicitly for the forms inside the fragment.
+    """
+    context = {**context, "csrf_token": get_token(request)}
+    return HttpResponse(fragments.render_fragment(template_name, context))
+
+
 @require_GET
 @login_required
-def comments_htmx(request, game_id):
+async def comments_htmx(request, game_id):
     """
     Returns only the comments of the game in HTML for HTMX.
     """
-    game = get_object_or_404(Game, game_id=game_id)
-    comments = comments_with_votes(game)
-    return render(request, "gamerank/includes/comments_htmx.html", {
-        "comments": comments
+    game = await aget_object_or_404(Game, game_id=game_id)
+    comments = await acomments_with_votes(game)
+    return render_fragment(request, "gamerank/includes/comments_htmx.html", {
+        "comments": comments,
+        "user": await request.auser(),
     })
 
 
 @require_POST
 @login_required
-def post_comment_htmx(request, game_id):
+@rate_limit("comment")
+async def post_comment_htmx(request, game_id):
     """
-    Publishes a new comment and returns the updated HTML list.
+    Publishes a new comment and returns only that comment, as an out-of-band
+    swap at the top of the comment list. The response does not depend on how
+    many comments the game already has.
     """
-    game = get_object_or_404(Game, game_id=game_id)
+    user = await request.auser()
+    game = await aget_object_or_404(Game.objects.only('game_id'), game_id=game_id)
     text = request.POST.get("comment_text", "").strip()
 
-    if text:
-        Comment.objects.create(
-            game=game,
-            user=request.user,
-            text=text,
-            date=timezone.now()
-        )
+    if not text:
+        return HttpResponse('')
 
-    comments = comments_with_votes(game)
-    return render(request, "gamerank/includes/comments_htmx.html", {
-        "comments": comments,
-        "game": game
+    comment = await Comment.objects.acreate(
+        game=game,
+        user=user,
+        text=text,
+        date=timezone.now()
+    )
+    await apublish_comment(comment)
+
+    return render_fragment(request, "gamerank/includes/new_comment_oob.html", {
+        "comment": comment,
+        "user": user,
     })
 
 
 @login_required
-def vote_comment_htmx(request, comment_id):
+@rate_limit("vote")
+async def vote_comment_htmx(request, comment_id):
     """
     Allows voting a comment dynamically with HTMX.
     Registers 'like' or 'dislike' from the current user, updates counters
     and returns the updated HTML of the comment to replace it on the page.
     """
-    comment = get_object_or_404(Comment, id=comment_id)
+    user = await request.auser()
+    comment = await aget_object_or_404(Comment.objects.select_related('user'), id=comment_id)
     vote_type = request.POST.get("vote_type")
 
     if vote_type in ['like', 'dislike']:
-        CommentVote.objects.update_or_create(
-            user=request.user,
+        await CommentVote.objects.aupdate_or_create(
+            user=user,
             comment=comment,
             defaults={'type': vote_type}
         )
 
-    # Manual calculation of counters
-    comment.num_likes = comment.num_likes()
-    comment.num_dislikes = comment.num_dislikes()
+    # Both counters in a single aggregate query
+    counts = await comment.votes.aaggregate(
+        num_likes=Count('id', filter=Q(type='like')),
+        num_dislikes=Count('id', filter=Q(type='dislike')),
+    )
+    comment.num_likes = counts['num_likes']
+    comment.num_dislikes = counts['num_dislikes']
+    if vote_type in ['like', 'dislike']:
+        await apublish_votes(comment, comment.num_likes, comment.num_dislikes)
 
     # Detect the current user's vote
-    comment.user_vote = CommentVote.objects.filter(user=request.user, comment=comment).first()
+    comment.user_vote = await CommentVote.objects.filter(user=user, comment=comment).afirst()
 
-    html = render_to_string(
-        "gamerank/includes/comment_item.html",
-        {"comment": comment, "user": request.user}
-    )
-    return HttpResponse(html)
+    return render_fragment(request, "gamerank/includes/comment_item.html", {
+        "comment": comment,
+        "user": user,
+    })
+
+
+@require_GET
+@login_required
+async def comments_stream(request, game_id):
+    """
+    Server-Sent Events stream of a game: pushes the new comments and the
+    updated vote counters as HTML fragments. The user's own comments are
+    skipped, they already come in the response of post_comment_htmx.
+    """
+    if not live.is_supported(request):
+        # 204 tells EventSource not to reconnect; the page polls instead
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    game = await aget_object_or_404(Game, game_id=game_id)
+
+    async def events():
+        yield "retry: 5000\n\n"
+        async for message in subscribe(game.pk):
+            if message is None:
+                yield ": keep-alive\n\n"
+            elif message["author"] != user.id:
+                yield format_event(message["event"], message["data"])
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @require_POST
 @login_required
-def follow_game_htmx(request, game_id):
+@rate_limit("follow")
+async def follow_game_htmx(request, game_id):
     """
     Follows or unfollows a game dynamically with HTMX.
-    Returns the updated game card HTML to replace it on the page.
-    If unfollowing on followed_games page, returns empty to remove the card.
+    Returns only the updated follow button as an out-of-band swap.
+    If unfollowing on followed_games page, the whole card is removed instead.
     """
-    game = get_object_or_404(Game, game_id=game_id)
+    user = await request.auser()
+    game = await aget_object_or_404(Game.objects.only('game_id'), game_id=game_id)
     action = request.POST.get("action")
     referer = request.META.get('HTTP_REFERER', '')
+    followed = None
+    remove_card = False
 
     if action == "follow":
-        Follow.objects.get_or_create(user=request.user, game=game)
-        game.followed = True
+        await Follow.objects.aget_or_create(user=user, game=game)
+        followed = True
     elif action == "unfollow":
-        Follow.objects.filter(user=request.user, game=game).delete()
-        game.followed = False
-        
-        # If on followed_games page, remove the card by returning empty
-        if 'followed' in referer:
-            return HttpResponse('')
-
-    html = render_to_string(
-        "gamerank/includes/game_card.html",
-        {"game": game, "user": request.user}
-    )
-    return HttpResponse(html)
+        await Follow.objects.filter(user=user, game=game).adelete()
+        followed = False
+
+        # If on followed_games page, remove the card
+        remove_card = 'followed' in referer
 
+    if followed is None:
+        followed = game.pk in await sync_to_async(get_followed_games_ids)(user)
 
-def unified_games_api(request):
+    return render_fragment(request, "gamerank/includes/follow_oob.html", {
+        "game": game,
+        "followed": followed,
+        "remove_card": remove_card,
+    })
+
+
+def _load_sources():
+    return load_source("freetogame"), load_source("mmobomb"), canonical_ids(("freetogame", "mmobomb"))
+
+
+@cache_anonymous_page(tags=("games",))
+@rate_limit("games_api", methods=None)
+async def unified_games_api(request):
+    """
+    Shows the games of FreeToGame and MMOBomb filtered by platform.
+    The games are read from the local copies kept by the refresh_games_api task,
+    and the same game in both sources is shown once (see dedup.py).
+    """
     platform_filter = request.GET.get("platform", "").lower().strip()
     final_games = []
 
     if platform_filter:
         games_dict = {}
 
-        def get_games(api_url, backup_filename):
-            if settings.DEBUG:
-                try:
-                    response = requests.get(api_url, timeout=10)
-                    response.raise_for_status()
-                    return response.json()
-                except Exception as e:
-                    print(f"❌ Error connecting to {api_url}:", e)
-                    return []
-            else:
-                try:
-                    path = os.path.join(settings.BASE_DIR, "data", backup_filename)
-                    with open(path, "r", encoding="utf-8") as f:
-                        return json.load(f)
-                except Exception as e:
-                    print(f"❌ Error reading {backup_filename}:", e)
-                    return []
+        # ORM work (load_source may enqueue a refresh, canonical_ids reads
+        # GameAlias): on the thread-sensitive executor, whose connection Django
+        # closes like a request's, in one switch
+        games_freetogame, games_mmobomb, canonical = await sync_to_async(_load_sources)()
 
-        games_freetogame = get_games("https://www.freetogame.com/api/games", "freetogame_games_backup.json")
-        games_mmobomb = get_games("https://www.mmobomb.com/api1/games", "mmobomb_games_backup.json")
-
-        for game in games_freetogame + games_mmobomb:
-            title = game.get("title", "").strip().lower()
-            if title and title not in games_dict:
-                games_dict[title] = game
+        for source, games in (("freetogame", games_freetogame), ("mmobomb", games_mmobomb)):
+            for game in games:
+                if not game.get("title"):
+                    continue
+                # Games not resolved yet (new since the last refresh) are matched by title
+                key = canonical.get((source, str(game.get("id")))) or "title:" + normalize_title(game["title"])
+                if key not in games_dict:
+                    games_dict[key] = game
 
         final_games = list(games_dict.values())
         final_games = [
@@ -458,7 +622,60 @@ def unified_games_api(request):
             if platform_filter in g.get("platform", "").lower()
         ]
 
-    return render(request, "gamerank/games_api.html", {
+    # The page uses the context processors (footer counters), which query the database
+    return await sync_to_async(render)(request, "gamerank/games_api.html", {
         "games": final_games,
         "selected_platform": platform_filter
-    })
\ No newline at end of file
+    })
+
+
+@require_GET
+@staff_member_required
+def profile_file(request, name):
+    """
+    Serves a request profile written by ProfilerMiddleware (a speedscope file).
+    """
+    if not PROFILE_NAME_RE.match(name):
+        raise Http404("Unknown profile")
+    path = profile_dir() / name
+    if not path.is_file():
+        raise Http404("Unknown profile")
+    return FileResponse(open(path, "rb"), content_type="application/json", as_attachment=True, filename=name)
+
+
+@require_GET
+def thumbnail(request):
+    """
+    Serves a resized local copy of an external game thumbnail.
+    WebP is returned to browsers that accept it, JPEG otherwise.
+    If the image cannot be fetched, the browser is redirected to the original.
+    """
+    src = request.GET.get("src", "").strip()
+    if not is_allowed_source(src):
+        raise Http404("Unknown thumbnail source")
+
+    width = normalize_width(request.GET.get("w"))
+    fmt = "webp" if "image/webp" in request.META.get("HTTP_ACCEPT", "") else "jpeg"
+
+    for attempt in range(2):
+        try:
+            path, content_type, key = get_thumbnail(src, width, fmt)
+            etag = f'"{key}"'
+            if request.META.get("HTTP_IF_NONE_MATCH") == etag:
+                response = HttpResponseNotModified()
+            else:
+                response = FileResponse(open(path, "rb"), content_type=content_type)
+            break
+        except FileNotFoundError:
+            # Evicted by another request after get_thumbnail(): created again on the next attempt
+            continue
+        except ThumbnailError as e:
+            print("❌ Error creating thumbnail:", e)
+            return redirect(src)
+    else:
+        return redirect(src)
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["Vary"] = "Accept"
+    return response
@@ -0,0 +1,88 @@
+"""
+Work done once when a process starts instead of on its first requests (see
+GamerankConfig.ready): compiling the templates of the project, importing and
+compiling the URL patterns (which imports the views) for every language, and
+loading what the first request would load lazily: translations, context
+processors, the session engine, the cache backend and the static files
+storage used by {% static %}.
+
+With the cached template loader (the default) the compiled templates stay in
+memory, and with a preforking server (gunicorn --preload) every worker
+inherits them.
+"""
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import storages
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import get_resolver
+from django.utils import translation
+
+
+def project_templates():
+    """
+    Returns the names of the templates under BASE_DIR (the project templates
+    and the ones of gamerank), not the ones of Django's own apps.
+    """
+    base_dir = Path(settings.BASE_DIR).resolve()
+    names = set()
+    for engine in engines.all():
+        for directory in getattr(engine, "template_dirs", ()):
+            directory = Path(directory).resolve()
+            if not directory.is_relative_to(base_dir) or not directory.is_dir():
+                continue
+            names.update(path.relative_to(directory).as_posix() for path in directory.rglob("*.html"))
+    return sorted(names)
+
+
+def compile_templates():
+    compiled = 0
+    for engine in engines.all():
+        if hasattr(engine, "engine"):
+            engine.engine.template_context_processors  # Imports the context processors
+        for name in project_templates():
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except TemplateDoesNotExist:
+                continue
+            except TemplateSyntaxError as e:
+                # Reported here, the page fails later as it would have anyway
+                print(f"❌ Error compiling template {name}:", e)
+    return compiled
+
+
+def resolve_urls():
+    """
+    Imports the URLconf and builds the reverse lookup tables (one per
+    language, also loading its translations), which compiles the regular
+    expression of every pattern. Returns the number of URL names.
+    """
+    from django.contrib import admin
+
+    # gamerank is loaded before django.contrib.admin: registering the admin
+    # models now keeps admin.site.urls from being built empty. Running
+    # autodiscover twice is harmless, the admin modules are only imported once.
+    admin.autodiscover()
+
+    resolver = get_resolver()
+    for language, _ in settings.LANGUAGES:
+        with translation.override(language):
+            resolver.reverse_dict
+    return len(resolver.reverse_dict)
+
+
+def warm_up():
+    """
+    Returns {'templates': n, 'urls': n, 'seconds': s}.
+    """
+    start = time.perf_counter()
+    templates = compile_templates()
+    urls = resolve_urls()
+    storages["staticfiles"]  # Reads the manifest of the hashed names
+    caches["default"]
+    import_module(settings.SESSION_ENGINE)
+    return {"templates": templates, "urls": urls, "seconds": time.perf_counter() - start}
@@ -0,0 +1,144 @@
+"""
+Compares the throughput of the HTMX fragment endpoints served by WSGI and ASGI.
+
+Start the same project twice, for example:
+
+    gunicorn finalgamerank.wsgi -w 4 --threads 8 -b 127.0.0.1:8001
+    uvicorn finalgamerank.asgi:application --workers 4 --port 8002
+
+and run:
+
+    python scripts/bench_asgi.py --wsgi http://127.0.0.1:8001 --asgi http://127.0.0.1:8002 --concurrency 200
+
+Each target is logged in with the given user and then hammered with GET
+requests to comments_htmx from N concurrent keep-alive connections.
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import re
+import time
+import urllib.parse
+import urllib.request
+
+
+def login(base_url, username, password):
+    """
+    Logs in through the normal login form and returns the Cookie header to use.
+    """
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    page = opener.open(f"{base_url}/login/").read().decode("utf-8")
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+    data = urllib.parse.urlencode({
+        "username": username,
+        "password": password,
+        "csrfmiddlewaretoken": token,
+    }).encode()
+    opener.open(urllib.request.Request(f"{base_url}/login/", data=data, headers={"Referer": f"{base_url}/login/"}))
+    return "; ".join(f"{c.name}={c.value}" for c in jar)
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+
+    return status, headers.get("connection", "").lower() == "close"
+
+
+async def worker(host, port, path, cookie, deadline, latencies, errors):
+    reader = writer = None
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nCookie: {cookie}\r\n"
+        f"HX-Request: true\r\nConnection: keep-alive\r\n\r\n"
+    ).encode()
+
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(request)
+            status, closed = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            if closed:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+async def run(base_url, path, cookie, concurrency, duration):
+    parsed = urllib.parse.urlparse(base_url)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        worker(parsed.hostname, parsed.port or 80, path, cookie, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def report(name, latencies, errors, duration):
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    print(
+        f"{name:5} {len(latencies) / duration:9.1f} req/s   "
+        f"p50 {pct(0.50):7.1f} ms   p95 {pct(0.95):7.1f} ms   p99 {pct(0.99):7.1f} ms   "
+        f"errors {len(errors)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wsgi", help="Base URL of the WSGI server")
+    parser.add_argument("--asgi", help="Base URL of the ASGI server")
+    parser.add_argument("--game", default="LIS1-345", help="Game whose comments are requested")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per target")
+    parser.add_argument("--username", default="testuser")
+    parser.add_argument("--password", default="test123")
+    args = parser.parse_args()
+
+    path = f"/game/{args.game}/htmx/comments/"
+    for name, base_url in (("wsgi", args.wsgi), ("asgi", args.asgi)):
+        if not base_url:
+            continue
+        base_url = base_url.rstrip("/")
+        cookie = login(base_url, args.username, args.password)
+        latencies, errors = asyncio.run(run(base_url, path, cookie, args.concurrency, args.duration))
+        report(name, latencies, errors, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Shows the bytes / time trade-off of compressing the real pages: for the home
+page (as a logged-in user, so the page cache does not answer) and the JSON
+of a game, the size and compression time of every available encoding at a
+few levels, then the whole request through CompressionMiddleware with each
+Accept-Encoding.
+
+    python scripts/bench_compression.py --user testuser --password test123 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "finalgamerank.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from gamerank import compression  # noqa: E402
+from gamerank.models import Game  # noqa: E402
+
+LEVELS = {"br": [1, 4, 5, 8, 11], "zstd": [1, 3, 9, 19], "gzip": [1, 6, 9]}
+
+
+def median_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def compare_levels(label, body, repeat):
+    print(f"\n{label}: {len(body) / 1024:.1f} KiB uncompressed")
+    configured = settings.COMPRESSION_LEVELS
+    for encoding in compression.available_encodings():
+        for level in LEVELS[encoding]:
+            settings.COMPRESSION_LEVELS = {**configured, encoding: level}
+            compression._local.__dict__.clear()  # New zstd compressor for the new level
+            size = len(compression.compress(body, encoding))
+            seconds = median_time(lambda: compression.compress(body, encoding), repeat)
+            marker = "  <- configured" if configured[encoding] == level else ""
+            print(
+                f"  {encoding:5} level {level:2}   {size / 1024:8.1f} KiB  {100 * size / len(body):5.1f} %"
+                f"   {seconds * 1000:7.2f} ms{marker}"
+            )
+    settings.COMPRESSION_LEVELS = configured
+    compression._local.__dict__.clear()
+
+
+def compare_requests(client, path, repeat):
+    print(f"\nGET {path} through the middleware (median of {repeat})")
+    for accept in ["", *compression.available_encodings()]:
+        response = client.get(path, HTTP_ACCEPT_ENCODING=accept)
+        size = len(response.content)
+        seconds = median_time(lambda: client.get(path, HTTP_ACCEPT_ENCODING=accept), repeat)
+        print(
+            f"  {accept or 'identity':8} {response.get('Content-Encoding', '-'):5} "
+            f"{size / 1024:8.1f} KiB   {seconds * 1000:7.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", default="testuser")
+    parser.add_argument("--password", default="test123")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of each measure (the median is reported)")
+    args = parser.parse_args()
+
+    client = Client()
+    if not client.login(username=args.user, password=args.password):
+        sys.exit(f"❌ Cannot log in as {args.user}")
+
+    game = Game.objects.order_by("game_id").first()
+    pages = ["/"]
+    if game:
+        pages.append(f"/game/{game.game_id}.json")
+
+    print("Encodings available:", ", ".join(compression.available_encodings()))
+    for path in pages:
+        body = client.get(path).content
+        compare_levels(f"GET {path}", body, args.repeat)
+        compare_requests(client, path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Measures what the key of Game costs to the tables that point to it: size of
+the Rating, Follow and Comment tables and of their indexes, and the time of
+the joins and unique checks of the hot pages. Run it before and after the
+migration to integer keys (0010-0012) to compare.
+
+    python scripts/bench_game_keys.py --games 2000 --users 2000 --ratings 50 --repeat 5
+
+The rows are created inside a transaction that is rolled back at the end, so
+the database is left as it was. Sizes come from SQLite's dbstat table.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "finalgamerank.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Count  # noqa: E402
+
+from gamerank import listing  # noqa: E402
+from gamerank.models import Comment, Follow, Game, Rating  # noqa: E402
+
+TABLES = ["gamerank_rating", "gamerank_follow", "gamerank_comment"]
+
+
+class Rollback(Exception):
+    pass
+
+
+def create_rows(num_games, num_users, ratings_per_user, rng):
+    Game.objects.bulk_create([
+        Game(game_id=f"BENCH-KEYS-{n}", title=f"Bench Game {n}", genre="MMORPG", platform="PC (Windows)")
+        for n in range(num_games)
+    ], batch_size=500)
+    games = list(Game.objects.filter(game_id__startswith="BENCH-KEYS-"))
+    User.objects.bulk_create([User(username=f"bench-keys-{n}") for n in range(num_users)], batch_size=500)
+    users = list(User.objects.filter(username__startswith="bench-keys-"))
+
+    # Without signals: only the sizes and the joins are measured
+    ratings, follows, comments = [], [], []
+    for user in users:
+        for game in rng.sample(games, ratings_per_user):
+            ratings.append(Rating(game=game, user=user, vote=rng.randint(0, 5)))
+        for game in rng.sample(games, ratings_per_user // 2):
+            follows.append(Follow(game=game, user=user))
+        for game in rng.sample(games, ratings_per_user // 5):
+            comments.append(Comment(game=game, user=user, text="Benchmark comment"))
+    Rating.objects.bulk_create(ratings, batch_size=1000)
+    Follow.objects.bulk_create(follows, batch_size=1000)
+    Comment.objects.bulk_create(comments, batch_size=1000)
+    return games, users
+
+
+def sizes():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tbl_name, name, type FROM sqlite_master WHERE tbl_name IN (%s) AND type IN ('table', 'index')"
+            % ", ".join("%s" for _ in TABLES),
+            TABLES,
+        )
+        objects = cursor.fetchall()
+        cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+        pages = dict(cursor.fetchall())
+    return sorted((table, name, kind, pages.get(name, 0)) for table, name, kind in objects)
+
+
+def median_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def unique_lookups(pairs):
+    # What get_or_create() and the follow buttons do, on the (game, user) index
+    for game, user in pairs:
+        Follow.objects.filter(game=game, user=user).exists()
+
+
+def duplicate_inserts(follows):
+    # Every row is rejected by the unique (game, user) index
+    Follow.objects.bulk_create([Follow(game_id=f.game_id, user_id=f.user_id) for f in follows], ignore_conflicts=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--ratings", type=int, default=50, help="Ratings per user (half as many follows)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each measure (the median is reported)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    key = Game._meta.pk
+    print(f"Game key: {key.name} ({key.get_internal_type()})")
+    try:
+        with transaction.atomic():
+            games, users = create_rows(args.games, args.users, args.ratings, rng)
+            print(f"{Rating.objects.count()} ratings, {Follow.objects.count()} follows, {Comment.objects.count()} comments\n")
+
+            total = 0
+            for table, name, kind, size in sizes():
+                total += size
+                print(f"  {kind:5} {name:55} {size / 1024:8.0f} KiB")
+            print(f"  {'total':61} {total / 1024:8.0f} KiB\n")
+
+            user, game = users[0], games[0]
+            followed_ids = {f.game_id for f in Follow.objects.filter(user=user)}
+            pairs = [(rng.choice(games), rng.choice(users)) for _ in range(1000)]
+            existing = list(Follow.objects.order_by("?")[:2000])
+            measures = [
+                ("rated cards of a user", lambda: listing.rated_cards(user, followed_ids)),
+                ("followed cards of a user", lambda: listing.followed_cards(user, followed_ids)),
+                ("ratings of a game with users", lambda: list(Rating.objects.filter(game=game).select_related("user"))),
+                ("votes of every game (join)", lambda: list(
+                    Game.objects.annotate(n=Count("rating")).values_list("game_id", "n")
+                )),
+                ("followers of the genre (join)", lambda: Follow.objects.filter(game__genre="MMORPG").count()),
+                ("1000 (game, user) lookups", lambda: unique_lookups(pairs)),
+                ("2000 duplicate follows", lambda: duplicate_inserts(existing)),
+            ]
+            for label, func in measures:
+                print(f"  {label:32} {median_time(func, args.repeat) * 1000:8.1f} ms")
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
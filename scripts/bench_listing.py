@@ -0,0 +1,136 @@
+"""
+Compares the game listings built from full Game instances (as the views did
+before gamerank/listing.py) with the GameCard rows of gamerank/listing.py:
+time to build the list and memory it keeps, for the home page and the rated
+games page of a user who rated every game.
+
+    python scripts/bench_listing.py --games 5000 --repeat 5
+
+The games, histograms and ratings are created inside a transaction that is
+rolled back at the end, so the database is left as it was.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "finalgamerank.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.db.models import F  # noqa: E402
+
+from gamerank import listing  # noqa: E402
+from gamerank.models import Game, Rating, RatingHistogram  # noqa: E402
+
+DESCRIPTION = "A free-to-play game with a long description that the cards never show. " * 6
+
+
+class Rollback(Exception):
+    pass
+
+
+def create_catalog(count, user):
+    Game.objects.bulk_create([
+        Game(
+            game_id=f"BENCH-{n}", title=f"Bench Game {n}", genre="MMORPG", platform="PC (Windows)",
+            developer="Bench Studio", publisher="Bench Publishing", short_description=DESCRIPTION,
+            thumbnail=f"https://www.freetogame.com/g/{n}/thumbnail.jpg",
+            game_url=f"https://www.freetogame.com/open/bench-game-{n}",
+            profile_url=f"https://www.freetogame.com/bench-game-{n}",
+        )
+        for n in range(count)
+    ], batch_size=500)
+    game_ids = dict(Game.objects.filter(game_id__startswith="BENCH-").values_list("game_id", "id"))
+    RatingHistogram.objects.bulk_create([
+        RatingHistogram(game_id=game_ids[f"BENCH-{n}"], votes_1=n % 7, votes_3=n % 11, votes_5=n % 13)
+        for n in range(count)
+    ], batch_size=500)
+    # Without signals: the histograms above already count them
+    Rating.objects.bulk_create([
+        Rating(game_id=game_ids[f"BENCH-{n}"], user=user, vote=n % 6) for n in range(count)
+    ], batch_size=500)
+    return game_ids
+
+
+def home_models(followed_ids):
+    games = list(Game.objects.with_rating_stats().order_by(F("score").desc(nulls_last=True), "game_id"))
+    for game in games:
+        game.followed = game.pk in followed_ids
+    return games
+
+
+def home_cards(followed_ids):
+    return listing.home_cards((F("score").desc(nulls_last=True), "game_id"), followed_ids)
+
+
+def rated_models(user, followed_ids):
+    games = []
+    for rating in Rating.objects.filter(user=user, game__deleted_at__isnull=True).select_related("game__histogram"):
+        game = rating.game
+        game.my_vote = rating.vote
+        game.score = game.average_rating()
+        game.num_votes = game.total_votes()
+        game.followed = game.pk in followed_ids
+        games.append(game)
+    games.sort(key=lambda g: g.my_vote, reverse=True)
+    return games
+
+
+def rated_cards(user, followed_ids):
+    return listing.rated_cards(user, followed_ids)
+
+
+def measure(build, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), statistics.median(times), retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=5000, help="Games in the catalog")
+    parser.add_argument("--repeat", type=int, default=5, help="Builds of each list (the median is reported)")
+    args = parser.parse_args()
+
+    try:
+        with transaction.atomic():
+            user = User.objects.create(username="bench-listing")
+            game_ids = create_catalog(args.games, user)
+            followed_ids = {game_ids[f"BENCH-{n}"] for n in range(0, args.games, 3)}
+
+            pages = [
+                ("home", lambda: home_models(followed_ids), lambda: home_cards(followed_ids)),
+                ("rated", lambda: rated_models(user, followed_ids), lambda: rated_cards(user, followed_ids)),
+            ]
+            for label, models, cards in pages:
+                count, models_time, models_memory = measure(models, args.repeat)
+                _, cards_time, cards_memory = measure(cards, args.repeat)
+                print(
+                    f"{label:6} {count} games   "
+                    f"models {models_time * 1000:7.1f} ms {models_memory / 1024:8.0f} KiB   "
+                    f"cards {cards_time * 1000:7.1f} ms {cards_memory / 1024:8.0f} KiB   "
+                    f"x{models_time / cards_time:4.1f} faster, {models_memory / cards_memory:4.1f}x less memory"
+                )
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Compares deleting a game with ~1M related rows in one cascade delete() and
+with the soft delete + batched purge of gamerank/purge.py.
+
+    python scripts/bench_purge.py --rows 1000000 --compare
+
+A throwaway SQLite database is created (--db) and filled with one game,
+--users users, their ratings and follows, comments and comment votes.
+While the game is being deleted, a second thread keeps writing small rows
+(like the requests of other users would) and records how long each write
+waited for the database lock.
+
+After the purge, the rating histograms and leaderboard counters are
+compared with the ones recomputed from scratch.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "finalgamerank.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import OperationalError, connection, connections  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from gamerank import leaderboards, purge  # noqa: E402
+from gamerank.models import (  # noqa: E402
+    ActivityEvent, Comment, CommentVote, Follow, Game, LeaderboardEntry, Rating, RatingHistogram,
+)
+
+BATCH = 10000
+# Primary keys of the games, created first in an empty database
+GAME_ID = 1
+OTHER_GAME_ID = 2
+
+
+def create_database(path):
+    if os.path.exists(path):
+        os.remove(path)
+    connection.settings_dict["TEST"]["NAME"] = path
+    # Concurrent writes wait for the lock instead of failing after 5 s
+    connection.settings_dict["OPTIONS"]["timeout"] = 120
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+
+
+def bulk(model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def populate(rows, num_users):
+    """
+    Fills the database with `rows` rows related to GAME_ID, plus a few rows
+    on OTHER_GAME_ID by the same users (to check that its counters survive).
+    """
+    for game_id in (GAME_ID, OTHER_GAME_ID):
+        Game.all_objects.create(
+            id=game_id, game_id=f"BENCH-{game_id}", title=f"BENCH-{game_id}", genre="MMORPG", platform="PC (Windows)"
+        )
+    User.objects.bulk_create(User(username=f"bench{n}") for n in range(num_users))
+    user_ids = list(User.objects.values_list("id", flat=True))
+
+    bulk(Rating, (Rating(game_id=g, user_id=u, vote=u % 6) for g in (GAME_ID, OTHER_GAME_ID) for u in user_ids))
+    bulk(Follow, (Follow(game_id=g, user_id=u) for g in (GAME_ID, OTHER_GAME_ID) for u in user_ids))
+
+    num_comments = max(1, (rows - 2 * num_users) * 3 // 5)
+    num_votes = max(0, rows - 2 * num_users - num_comments)
+    now = timezone.now()
+    bulk(Comment, (
+        Comment(game_id=GAME_ID, user_id=user_ids[n % num_users], text="Benchmark comment", date=now)
+        for n in range(num_comments)
+    ))
+    Comment.objects.bulk_create(
+        Comment(game_id=OTHER_GAME_ID, user_id=u, text="Other game", date=now) for u in user_ids
+    )
+
+    comment_ids = list(Comment.objects.filter(game_id=GAME_ID).order_by().values_list("id", flat=True))
+    bulk(CommentVote, (
+        CommentVote(
+            comment_id=comment_ids[n % len(comment_ids)],
+            user_id=user_ids[n // len(comment_ids)],
+            type="like" if n % 3 else "dislike",
+        )
+        for n in range(min(num_votes, len(comment_ids) * num_users))
+    ))
+
+    RatingHistogram.rebuild()
+    leaderboards.rebuild()
+
+
+def count_related():
+    return (
+        Rating.objects.filter(game_id=GAME_ID).count()
+        + Follow.objects.filter(game_id=GAME_ID).count()
+        + Comment.objects.filter(game_id=GAME_ID).count()
+        + CommentVote.objects.filter(comment__game_id=GAME_ID).count()
+    )
+
+
+class Writer(threading.Thread):
+    """
+    Writes one small row after another and records how long each one took.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stop = threading.Event()
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        user_id = User.objects.values_list("id", flat=True).first()
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            try:
+                ActivityEvent.objects.create(kind="follow", user_id=user_id, game_id=OTHER_GAME_ID)
+                self.latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                self.errors += 1
+            time.sleep(0.01)
+        connections.close_all()
+
+
+def measure(name, delete):
+    writer = Writer()
+    writer.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    hidden_after = delete()
+    elapsed = time.perf_counter() - start
+    writer.stop.set()
+    writer.join()
+
+    latencies = sorted(writer.latencies) or [0]
+    print(
+        f"{name:8} total {elapsed:8.2f} s   hidden after {hidden_after * 1000:8.1f} ms   "
+        f"concurrent writes: {len(writer.latencies)} ok, {writer.errors} errors, "
+        f"p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms, max {latencies[-1] * 1000:8.1f} ms"
+    )
+
+
+def cascade_delete():
+    Game.objects.filter(pk=GAME_ID).delete()
+    return 0  # Nothing is hidden until the whole transaction commits
+
+
+def batched_delete():
+    start = time.perf_counter()
+    purge.schedule_game_deletion(Game.objects.get(pk=GAME_ID))
+    hidden_after = time.perf_counter() - start
+    purge.purge_game(GAME_ID)
+    return hidden_after
+
+
+def check_counters():
+    histograms = {h.pk: h.counts() for h in RatingHistogram.objects.all() if h.total()}
+    entries = set(LeaderboardEntry.objects.filter(count_all__gt=0).values_list("board", "scope", "key", "count_all"))
+    RatingHistogram.rebuild()
+    leaderboards.rebuild()
+    expected_histograms = {h.pk: h.counts() for h in RatingHistogram.objects.all() if h.total()}
+    expected_entries = set(
+        LeaderboardEntry.objects.filter(count_all__gt=0).values_list("board", "scope", "key", "count_all")
+    )
+    ok = histograms == expected_histograms and entries == expected_entries
+    print(f"counters {'consistent' if ok else 'INCONSISTENT'} after the purge")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows related to the deleted game")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=settings.PURGE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=settings.PURGE_BATCH_PAUSE)
+    parser.add_argument("--compare", action="store_true", help="Also time a plain cascade delete()")
+    parser.add_argument("--db", default="/tmp/gamerank_bench_purge.sqlite3")
+    args = parser.parse_args()
+
+    settings.PURGE_BATCH_SIZE = args.batch_size
+    settings.PURGE_BATCH_PAUSE = args.pause
+    create_database(args.db)
+
+    runs = [("cascade", cascade_delete)] if args.compare else []
+    runs.append(("batched", batched_delete))
+    for name, delete in runs:
+        start = time.perf_counter()
+        populate(args.rows, args.users)
+        print(f"{name:8} populated {count_related()} related rows in {time.perf_counter() - start:.1f} s")
+        measure(name, delete)
+        if name == "batched":
+            check_counters()
+        # Start the next run from an empty database
+        for model in (CommentVote, Comment, Rating, Follow, ActivityEvent, LeaderboardEntry, RatingHistogram):
+            model.objects.all()._raw_delete(connection.alias)
+        Game.all_objects.all().delete()
+        User.objects.all().delete()
+
+
+if __name__ == "__main__":
+    main()
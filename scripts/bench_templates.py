@@ -0,0 +1,108 @@
+"""
+Compares the render time of the home page with 500 game cards (and of a
+list of 500 comments) when the fragments of JINJA2_FRAGMENTS are rendered by
+Jinja2 and when every fragment is rendered by the Django template engine.
+
+    python scripts/bench_templates.py --cards 500 --repeat 20
+
+The games and comments are built in memory, so no database is needed. The
+output of both engines is compared (ignoring whitespace, CSRF tokens and the
+escaping of apostrophes, &#39; for Jinja2 and &#x27; for Django).
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "finalgamerank.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.template import engines  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from gamerank.models import Comment, CommentVote, Game  # noqa: E402
+
+CSRF_TOKEN = "x" * 64
+
+
+def build_games(count):
+    games = []
+    for n in range(count):
+        game = Game(
+            game_id=f"BENCH-{n}", title=f"Bench Game {n} & Friends' Edition", genre="MMORPG",
+            platform="PC (Windows)", thumbnail=f"https://www.freetogame.com/g/{n}/thumbnail.jpg",
+        )
+        game.score = (n % 50) / 10
+        game.num_votes = n % 300
+        game.followed = n % 3 == 0
+        games.append(game)
+    return games
+
+
+def build_comments(count, user):
+    now = timezone.now()
+    comments = []
+    for n in range(count):
+        comment = Comment(id=n + 1, game_id=1, user=user, text=f"Comment <{n}> isn't bad", date=now)
+        comment.num_likes = n % 7
+        comment.num_dislikes = n % 3
+        comment.user_vote = CommentVote(type="like") if n % 4 == 0 else None
+        comments.append(comment)
+    return comments
+
+
+def normalize(html):
+    html = html.replace(CSRF_TOKEN, "TOKEN").replace("&#39;", "&#x27;")
+    return re.sub(r"\s+", " ", html).replace("> <", "><").strip()
+
+
+def measure(template_name, context, fragments, repeat):
+    settings.JINJA2_FRAGMENTS = fragments
+    html = render_to_string(template_name, context)  # Compiles the templates
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_to_string(template_name, context)
+        times.append(time.perf_counter() - start)
+    return html, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=500, help="Game cards and comments rendered")
+    parser.add_argument("--repeat", type=int, default=20, help="Renders of each page (the median is reported)")
+    args = parser.parse_args()
+
+    if "jinja2" not in engines.templates:
+        sys.exit("❌ The jinja2 engine is not configured (is jinja2 installed?)")
+
+    user = User(id=1, username="bench")
+    jinja2_fragments = list(settings.JINJA2_FRAGMENTS)
+    pages = [
+        ("home", "gamerank/home.html", {"games": build_games(args.cards), "user": user, "sort": "score"}),
+        ("comments", "gamerank/includes/comments_htmx.html", {"comments": build_comments(args.cards, user)}),
+    ]
+
+    for label, template_name, context in pages:
+        context = {**context, "user": user, "csrf_token": CSRF_TOKEN}
+        django_html, django_time = measure(template_name, context, [], args.repeat)
+        jinja2_html, jinja2_time = measure(template_name, context, jinja2_fragments, args.repeat)
+        same = normalize(django_html) == normalize(jinja2_html)
+        print(
+            f"{label:9} {args.cards} items   django {django_time * 1000:8.1f} ms   "
+            f"jinja2 {jinja2_time * 1000:8.1f} ms   x{django_time / jinja2_time:4.1f}   "
+            f"output {'identical' if same else 'DIFFERENT'}"
+        )
+
+
+if __name__ == "__main__":
+    main()